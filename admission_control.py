@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传处理准入控制服务
+根据文件大小和表头行数估算内存/CPU开销，限制同一主机上并发处理的大任务数量
+"""
+
+import os
+import json
+import math
+import time
+import zipfile
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows开发环境：退化为进程内限流
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """处理能力已饱和，请求被拒绝"""
+
+    def __init__(self, retry_after: int, cost: Dict):
+        super().__init__(f'服务器繁忙，请 {retry_after} 秒后重试')
+        self.retry_after = retry_after
+        self.cost = cost
+
+
+class AdmissionControlService:
+    """上传处理准入控制服务"""
+
+    def __init__(self, max_heavy_jobs=None, heavy_threshold_mb=None, queue_timeout=None,
+                 max_queue=None, slot_dir=None):
+        """
+        初始化准入控制
+
+        Args:
+            max_heavy_jobs (int): 同一主机上允许并发处理的大任务数
+            heavy_threshold_mb (int): 估算内存超过该值（MB）视为大任务
+            queue_timeout (float): 饱和时最多排队等待的秒数，0表示直接拒绝
+            max_queue (int): 每个worker进程内允许排队的请求数
+            slot_dir (str): 主机级槽位锁文件目录（所有gunicorn worker共享）
+        """
+        self.enabled = Config.ADMISSION_ENABLED
+        self.max_heavy_jobs = max_heavy_jobs or Config.ADMISSION_MAX_HEAVY_JOBS
+        self.heavy_threshold_mb = heavy_threshold_mb or Config.ADMISSION_HEAVY_THRESHOLD_MB
+        self.queue_timeout = Config.ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.max_queue = Config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.slot_dir = Path(slot_dir or Config.ADMISSION_SLOT_DIR)
+
+        self._lock = threading.Lock()
+        self._local_slots = threading.BoundedSemaphore(self.max_heavy_jobs)
+        self._queue_depth = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._running_heavy = 0
+        # 最近大任务的平均耗时，用于计算Retry-After
+        self._avg_heavy_seconds = None
+
+    # ------------------------------------------------------------------
+    # 开销估算
+    # ------------------------------------------------------------------
+    def estimate_cost(self, file_path: str) -> Dict:
+        """根据文件大小和表头声明的行数估算处理开销"""
+        file_size = os.path.getsize(file_path)
+        rows = self._read_row_count(file_path)
+        if rows is None:
+            # 无法读取行数时按经验值（xlsx约每行60字节）由文件大小推算
+            rows = file_size // 60
+
+        return self._cost(file_size, rows, expansion=10)
+
+    def estimate_payload_cost(self, payload_size: int, bytes_per_row: int = 150) -> Dict:
+        """
+        结构化数据请求（/api/process）按请求体大小估算开销
+
+        JSON按每行约150字节推算行数；请求体逐行解析、不整体保留，内存按请求体的2倍计入
+        """
+        return self._cost(payload_size, payload_size // bytes_per_row, expansion=2)
+
+    def _cost(self, file_size: int, rows: int, expansion: int) -> Dict:
+        memory_mb = (rows * Config.ADMISSION_BYTES_PER_ROW + file_size * expansion) / 1024 / 1024
+        cpu_seconds = rows / 1000 * Config.ADMISSION_SECONDS_PER_1K_ROWS
+        return {
+            'file_size': file_size,
+            'rows': int(rows),
+            'memory_mb': round(memory_mb, 1),
+            'cpu_seconds': round(cpu_seconds, 1),
+            'heavy': memory_mb >= self.heavy_threshold_mb,
+        }
+
+    @staticmethod
+    def _read_row_count(file_path: str) -> Optional[int]:
+        """从xlsx第一个工作表的dimension声明读取行数，只读取文件开头几KB"""
+        if not file_path.lower().endswith('.xlsx'):
+            return None
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                sheet_names = sorted(n for n in zf.namelist() if n.startswith('xl/worksheets/sheet'))
+                if not sheet_names:
+                    return None
+                with zf.open(sheet_names[0]) as f:
+                    head = f.read(4096).decode('utf-8', errors='ignore')
+            marker = head.find('<dimension ref="')
+            if marker == -1:
+                return None
+            ref = head[marker + len('<dimension ref="'):head.find('"', marker + len('<dimension ref="'))]
+            last_cell = ref.split(':')[-1]
+            digits = ''.join(ch for ch in last_cell if ch.isdigit())
+            return int(digits) if digits else None
+        except (zipfile.BadZipFile, OSError, ValueError):
+            return None
+
+    # ------------------------------------------------------------------
+    # 主机级槽位（文件锁，worker被杀时由内核自动释放）
+    # 持有者在槽位文件中写入自己的pid、释放前清空，统计时只读文件内容，不尝试加锁，
+    # 避免统计探测恰好占住空闲槽位，使同时申请的上传被误判为饱和
+    # ------------------------------------------------------------------
+    def _try_acquire_slot(self):
+        if fcntl is None:
+            return 'local' if self._local_slots.acquire(blocking=False) else None
+
+        self.slot_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(self.max_heavy_jobs):
+            fd = os.open(self.slot_dir / f'heavy_{i}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, str(os.getpid()).encode(), 0)
+            return fd
+        return None
+
+    def _release_slot(self, slot):
+        if slot == 'local':
+            self._local_slots.release()
+        elif slot is not None:
+            os.ftruncate(slot, 0)
+            fcntl.flock(slot, fcntl.LOCK_UN)
+            os.close(slot)
+
+    def _count_busy_slots(self) -> int:
+        """统计主机上已被占用的槽位数：槽位文件中记录的持有进程仍存活（进程被杀后内核已释放锁，文件中的pid失效）"""
+        if fcntl is None:
+            return self._running_heavy
+        busy = 0
+        for i in range(self.max_heavy_jobs):
+            try:
+                content = (self.slot_dir / f'heavy_{i}.lock').read_text().strip()
+            except OSError:
+                continue
+            if content.isdigit() and self._pid_alive(int(content)):
+                busy += 1
+        return busy
+
+    # ------------------------------------------------------------------
+    # 准入
+    # ------------------------------------------------------------------
+    def _retry_after(self, cost: Dict) -> int:
+        expected = self._avg_heavy_seconds or cost['cpu_seconds']
+        return max(1, int(math.ceil(expected)))
+
+    @contextmanager
+    def admit(self, cost: Dict):
+        """
+        申请处理许可，饱和时在队列中等待，超时或队列已满时抛出AdmissionRejected
+
+        小任务不占用槽位，直接放行
+        """
+        if not self.enabled or not cost['heavy']:
+            with self._lock:
+                self._admitted += 1
+            yield
+            return
+
+        slot = self._try_acquire_slot()
+        if slot is None:
+            with self._lock:
+                can_queue = self.queue_timeout > 0 and self._queue_depth < self.max_queue
+                if can_queue:
+                    self._queue_depth += 1
+            self._publish_stats()
+
+            if can_queue:
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while slot is None and time.monotonic() < deadline:
+                        time.sleep(0.2)
+                        slot = self._try_acquire_slot()
+                finally:
+                    with self._lock:
+                        self._queue_depth -= 1
+
+            if slot is None:
+                with self._lock:
+                    self._rejected += 1
+                self._publish_stats()
+                logger.warning(f"🚦 处理能力已饱和，拒绝请求（估算 {cost['rows']} 行 / {cost['memory_mb']}MB）")
+                raise AdmissionRejected(self._retry_after(cost), cost)
+
+        with self._lock:
+            self._admitted += 1
+            self._running_heavy += 1
+        self._publish_stats()
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._release_slot(slot)
+            with self._lock:
+                self._running_heavy -= 1
+                if self._avg_heavy_seconds is None:
+                    self._avg_heavy_seconds = elapsed
+                else:
+                    self._avg_heavy_seconds = self._avg_heavy_seconds * 0.7 + elapsed * 0.3
+            self._publish_stats()
+
+    # ------------------------------------------------------------------
+    # 统计（每个worker写入自己的状态文件，汇总得到主机级数据）
+    # ------------------------------------------------------------------
+    def _publish_stats(self):
+        if not self.enabled:
+            return
+        try:
+            self.slot_dir.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                stats = {
+                    'queue_depth': self._queue_depth,
+                    'admitted': self._admitted,
+                    'rejected': self._rejected,
+                    'running_heavy': self._running_heavy,
+                }
+            path = self.slot_dir / f'worker_{os.getpid()}.json'
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️  写入准入统计失败: {e}")
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def get_stats(self) -> Dict:
+        """获取主机级准入统计（用于 /health）"""
+        totals = {'queue_depth': 0, 'admitted': 0, 'rejected': 0}
+        if self.slot_dir.exists():
+            for path in self.slot_dir.glob('worker_*.json'):
+                try:
+                    pid = int(path.stem.split('_', 1)[1])
+                    if not self._pid_alive(pid):
+                        path.unlink()
+                        continue
+                    with open(path) as f:
+                        worker_stats = json.load(f)
+                    for key in totals:
+                        totals[key] += worker_stats.get(key, 0)
+                except (OSError, ValueError):
+                    continue
+
+        busy = self._count_busy_slots() if self.enabled else 0
+        return {
+            'enabled': self.enabled,
+            'heavy_slots': self.max_heavy_jobs,
+            'heavy_slots_busy': busy,
+            'saturation': round(busy / self.max_heavy_jobs, 2) if self.max_heavy_jobs else 0,
+            'saturated': busy >= self.max_heavy_jobs,
+            'heavy_threshold_mb': self.heavy_threshold_mb,
+            **totals,
+        }
+
+
+# 全局准入控制实例
+admission_control = AdmissionControlService()
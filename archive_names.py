@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+压缩包内文件名
+分中心工作簿压缩包和表格图片压缩包共用：直营中心名称来自上传数据，可能包含路径分隔符等字符，
+不同名称清理后可能相同，按同一套规则生成安全且不重复的文件名。本模块不导入pandas。
+"""
+
+import re
+
+
+def safe_archive_name(name) -> str:
+    """生成可用于压缩包内文件名的直营中心名称"""
+    return re.sub(r'[\\/:*?"<>|]', '_', str(name)).strip() or '未命名'
+
+
+def unique_archive_name(name, used: set, suffix: str) -> str:
+    """
+    压缩包内不重复的文件名：不同名称清理后相同（如 A/B 与 A:B）时追加序号
+    zipfile遇到重名只会警告，解压时后写入的文件会覆盖前一个；按不区分大小写比较，兼容Windows解压
+
+    Args:
+        name: 直营中心名称
+        used (set): 已使用的文件名（小写），调用后加入本次的文件名
+        suffix (str): 文件名后缀（含扩展名）
+    """
+    base = safe_archive_name(name)
+    candidate = f"{base}{suffix}"
+    index = 2
+    while candidate.casefold() in used:
+        candidate = f"{base}_{index}{suffix}"
+        index += 1
+    used.add(candidate.casefold())
+    return candidate
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试工具包
+- synthetic: 生成模拟的扣款失败导出数据
+- run_benchmarks: 分阶段计时和内存峰值统计，保存/对比JSON基线
+"""
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分级保留（冷存储）基准测试
+
+用模拟数据生成一个输出工作簿，复制为 --files 份并把修改时间调到热存储期限之前，
+在临时目录中按 --budget-mb 的读写预算反复清理直到全部转入冷存储，报告每轮的读写量和耗时、
+各压缩算法的压缩率，以及流式恢复（下载）的吞吐量，并校验恢复后的工作簿单元格与原文件一致。
+
+用法:
+    python -m benchmarks.cold_retention --rows 20000 --files 6 --budget-mb 2
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from cold_archive import COLD_CODECS, cold_archive, _zstd
+
+
+def workbook_values(source):
+    import openpyxl
+    workbook = openpyxl.load_workbook(source, read_only=True)
+    return {sheet.title: [row for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets}
+
+
+def run_codec(codec: str, report: Path, args) -> dict:
+    from file_cleaner import FileCleanerService
+
+    Config.COLD_CODEC = codec
+    with tempfile.TemporaryDirectory(prefix='pay-fail-cold-') as work_dir:
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            output_dir = Path(Config.OUTPUT_FOLDER)
+            output_dir.mkdir()
+            aged = time.time() - 48 * 3600
+            for i in range(args.files):
+                target = output_dir / f"扣款失败信息处理_cold_{i:02d}.xlsx"
+                shutil.copyfile(report, target)
+                os.utime(target, (aged + i, aged + i))
+
+            cleaner = FileCleanerService(cleanup_days=1, hot_hours=24, cold_days=30, io_budget_mb=args.budget_mb)
+            sweeps = []
+            while True:
+                cleaner._cleanup_old_files()
+                sweep = cleaner._last_sweep
+                sweeps.append(sweep)
+                if not sweep['deferred'] or not sweep['archived']:
+                    break
+
+            stats = cold_archive.get_stats()
+            entries = cold_archive.list_entries()
+            start = time.perf_counter()
+            restored_bytes = 0
+            restored = None
+            for entry in entries:
+                with cold_archive.open_restored(entry['filename']) as stream:
+                    data = stream.read()
+                restored_bytes += len(data)
+                restored = data
+            restore_seconds = time.perf_counter() - start
+            identical = workbook_values(io.BytesIO(restored)) == workbook_values(report)
+        finally:
+            os.chdir(previous_dir)
+
+    return {
+        'codec': codec,
+        'sweeps': sweeps,
+        'stats': stats,
+        'restore_seconds': restore_seconds,
+        'restored_mb': restored_bytes / 1024 / 1024,
+        'identical': identical,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分级保留（冷存储）基准测试')
+    parser.add_argument('--rows', type=int, default=20000, help='模拟数据行数')
+    parser.add_argument('--files', type=int, default=6, help='待转入冷存储的报告份数')
+    parser.add_argument('--budget-mb', type=int, default=2, help='每轮清理的读写预算（MB）')
+    parser.add_argument('--codec', choices=COLD_CODECS, action='append', help='压缩算法（可重复），默认测试所有可用算法')
+    args = parser.parse_args()
+    codecs = args.codec or [codec for codec in COLD_CODECS if codec != 'zstd' or _zstd() is not None]
+
+    from benchmarks.synthetic import SyntheticSpec, generate_dataframe
+    from excel_processor import ExcelProcessorService
+
+    with tempfile.TemporaryDirectory(prefix='pay-fail-report-') as report_dir:
+        print(f"🔄 正在用 {args.rows} 行模拟数据生成输出工作簿...")
+        service = ExcelProcessorService()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            df = service._preprocess_data(generate_dataframe(SyntheticSpec(rows=args.rows)))
+            pivot_table = service._create_pivot_table_full_logic(df)
+            report = Path(service._save_to_excel_full_style(df, pivot_table, report_dir))
+        size_mb = report.stat().st_size / 1024 / 1024
+        print(f"📄 工作簿 {size_mb:.2f}MB × {args.files} 份，每轮读写预算 {args.budget_mb}MB")
+
+        for codec in codecs:
+            result = run_codec(codec, report, args)
+            stats = result['stats']
+            print(f"\n🧊 {codec}：{stats['files']} 个报告 {stats['original_bytes'] / 1024 / 1024:.2f}MB -> "
+                  f"{stats['archived_bytes'] / 1024 / 1024:.2f}MB（{stats['ratio']:.1%}）")
+            print(f"   {'轮次':<6}{'转入':>6}{'留到下一轮':>12}{'读写(MB)':>10}{'耗时(s)':>10}")
+            for i, sweep in enumerate(result['sweeps'], 1):
+                print(f"   {i:<6}{sweep['archived']:>6}{sweep['deferred']:>12}"
+                      f"{sweep['io_bytes'] / 1024 / 1024:>10.1f}{sweep['seconds']:>10.2f}")
+            throughput = result['restored_mb'] / result['restore_seconds'] if result['restore_seconds'] else 0
+            print(f"   📥 流式恢复 {result['restored_mb']:.1f}MB，{result['restore_seconds']:.2f}s（{throughput:.1f}MB/s）")
+            print(f"   {'✅ 恢复后单元格与原文件一致' if result['identical'] else '❌ 恢复后单元格与原文件不一致'}")
+            if not result['identical']:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据质量检查开销基准测试
+
+用模拟数据（可按 --anomaly-ratio 注入金额非数字/为空、团队为空、团队属于多个直营中心、客户UID对应多个姓名等问题），
+分别在不检查和检查数据质量的情况下重复执行预处理，取中位数之差作为检查开销，
+再与一次完整处理（读取xlsx、预处理、透视表、生成工作簿）和只生成预览（读取xlsx、预处理、透视表、预览数据）的耗时对比，
+报告开销占比，并校验两种情况下的透视表一致。
+
+用法:
+    python -m benchmarks.data_quality --rows 100000 --anomaly-ratio 0.01
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import add_spec_arguments, spec_from_args, generate_dataframe
+
+
+def inject_anomalies(df: pd.DataFrame, ratio: float, seed: int) -> pd.DataFrame:
+    """按比例注入各类数据问题（ratio为0时原样返回）"""
+    if ratio <= 0:
+        return df
+    rng = random.Random(seed)
+    df = df.copy()
+    count = max(1, int(len(df) * ratio))
+
+    def pick():
+        return rng.sample(range(len(df)), count)
+
+    amounts = df['应还款金额'].astype(object)
+    amounts.iloc[pick()] = '待核实'
+    amounts.iloc[pick()] = None
+    df['应还款金额'] = amounts
+    df.loc[df.index[pick()], '所属团队'] = np.nan
+    # 把部分行的直营中心换成另一个中心，这些团队就同时属于两个直营中心
+    centers = df['所属直营中心'].unique()
+    rows = df.index[pick()]
+    df.loc[rows, '所属直营中心'] = [centers[(list(centers).index(c) + 1) % len(centers)] for c in df.loc[rows, '所属直营中心']]
+    if '客户UID' in df.columns:
+        rows = df.index[pick()]
+        df.loc[rows, '客户姓名'] = df.loc[rows, '客户姓名'] + '（重名）'
+    return df
+
+
+def median_seconds(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据质量检查开销基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--anomaly-ratio', type=float, default=0.01, help='每类问题注入的行数比例')
+    parser.add_argument('--repeat', type=int, default=7, help='预处理重复次数（取中位数）')
+    args = parser.parse_args()
+
+    from data_quality import DataQualityProfile
+    from excel_processor import ExcelProcessorService
+
+    spec = spec_from_args(args)
+    df = inject_anomalies(generate_dataframe(spec), args.anomaly_ratio, args.seed)
+    service = ExcelProcessorService()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        plain = median_seconds(lambda: service._preprocess_data(df), args.repeat)
+        checked = median_seconds(lambda: service._preprocess_data(df, DataQualityProfile()), args.repeat)
+        quality = DataQualityProfile()
+        pivot_plain = service._create_pivot_table_full_logic(service._preprocess_data(df))
+        pivot_checked = service._create_pivot_table_full_logic(service._preprocess_data(df, quality))
+
+        # 一次完整处理（与 /upload 生成下载文件的流程相同），历史库和搜索索引写入临时工作目录
+        previous_dir = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix='pay-fail-quality-') as work_dir:
+            os.chdir(work_dir)
+            try:
+                df.to_excel('input.xlsx', index=False)
+                start = time.perf_counter()
+                result = service.process_excel_file('input.xlsx', output_dir=work_dir)
+                total = time.perf_counter() - start
+                start = time.perf_counter()
+                service.process_excel_for_preview('input.xlsx')
+                preview_total = time.perf_counter() - start
+            finally:
+                os.chdir(previous_dir)
+    if not result['success']:
+        raise RuntimeError(result['message'])
+
+    overhead = checked - plain
+    print(f"📊 {args.rows} 行，每类问题注入比例 {args.anomaly_ratio:.1%}，预处理重复 {args.repeat} 次取中位数")
+    print(f"   预处理（不检查）      {plain:>8.3f}s")
+    print(f"   预处理（检查数据质量）{checked:>8.3f}s")
+    print(f"   检查开销              {overhead:>8.3f}s（预处理的 {overhead / plain:.1%}）")
+    print(f"   完整处理              {total:>8.2f}s（检查开销占 {overhead / total:.2%}）")
+    print(f"   只生成预览            {preview_total:>8.2f}s（检查开销占 {overhead / preview_total:.2%}）")
+    for issue in quality.to_stats()['检查项']:
+        print(f"     - {issue['说明']}: {issue['数量']}")
+
+    same = pivot_plain.equals(pivot_checked)
+    print(f"   {'✅ 检查前后透视表一致' if same else '❌ 检查前后透视表不一致'}")
+    if not same or overhead / preview_total >= 0.05:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
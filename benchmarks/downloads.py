@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大文件下载对worker线程占用的基准测试
+
+以1个worker、--threads 个线程启动应用，让 --clients 个慢速客户端（限速 --client-kbps）同时下载一个大文件，
+期间持续请求 /health，比较不同下载模式下健康检查的延迟和超时数：
+- send_file: worker直接发送，慢速下载占满worker线程，健康检查排队或超时
+- x-accel + nginx: 按 deploy/nginx.conf 在本地启动nginx，由nginx发送文件，worker线程立即释放
+- x-accel（无前置代理）: 只测量应用返回 X-Accel-Redirect 响应头的耗时（未安装nginx时）
+
+用法:
+    python -m benchmarks.downloads --size-mb 200 --clients 2 --threads 2 --duration 10
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 应用和本进程使用同一密钥，才能在这里生成有效的下载令牌
+os.environ.setdefault('SECRET_KEY', 'pay-fail-web-download-benchmark')
+
+from benchmarks.loadtest import AppServer, free_port, percentile
+import downloads
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+NGINX_CONF = PROJECT_ROOT / 'deploy' / 'nginx.conf'
+FILE_NAME = '下载测试_处理结果.xlsx'
+
+
+class LocalNginx:
+    """把 deploy/nginx.conf 中的上游地址、监听端口和输出目录替换为本地值后启动nginx"""
+
+    def __init__(self, binary: str, app_port: int, output_dir: Path):
+        self.binary = binary
+        self.port = free_port()
+        self.workdir = tempfile.TemporaryDirectory(prefix='pay-fail-nginx-')
+        server_conf = (
+            NGINX_CONF.read_text(encoding='utf-8')
+            .replace('pay-fail-web:4009', f'127.0.0.1:{app_port}')
+            .replace('listen 80;', f'listen 127.0.0.1:{self.port};')
+            .replace('/app/output/', f'{output_dir.resolve()}/')
+        )
+        temp = self.workdir.name
+        self.conf_path = Path(temp) / 'nginx.conf'
+        self.conf_path.write_text(
+            'daemon off;\n'
+            'worker_processes 1;\n'
+            f'pid {temp}/nginx.pid;\n'
+            f'error_log {temp}/error.log;\n'
+            'events { worker_connections 256; }\n'
+            'http {\n'
+            '    access_log off;\n'
+            f'    client_body_temp_path {temp}/client_body;\n'
+            f'    proxy_temp_path {temp}/proxy;\n'
+            f'    fastcgi_temp_path {temp}/fastcgi;\n'
+            f'    uwsgi_temp_path {temp}/uwsgi;\n'
+            f'    scgi_temp_path {temp}/scgi;\n'
+            f'{server_conf}\n'
+            '}\n',
+            encoding='utf-8'
+        )
+        self.process = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, startup_timeout: float = 10):
+        self.process = subprocess.Popen([self.binary, '-p', self.workdir.name, '-c', str(self.conf_path)],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        deadline = time.time() + startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"nginx启动失败，日志: {self.workdir.name}/error.log")
+            try:
+                with urllib.request.urlopen(f'{self.base_url}/health', timeout=2):
+                    return
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        raise RuntimeError('等待nginx启动超时')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.workdir.cleanup()
+
+
+def slow_download(host: str, port: int, path: str, kbps: int, stop: threading.Event, result: Dict):
+    """限速读取响应：接收缓冲区很小，服务端写满socket后阻塞，模拟慢速网络上的客户端"""
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+    sock.settimeout(30)
+    chunk = 16 * 1024
+    interval = chunk / (kbps * 1024)
+    try:
+        sock.connect((host, port))
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode('ascii'))
+        while not stop.is_set():
+            data = sock.recv(chunk)
+            if not data:
+                break
+            if not result['received']:
+                result['status_line'] = data.split(b'\r\n', 1)[0].decode('latin-1')
+            result['received'] += len(data)
+            time.sleep(interval)
+    except OSError as e:
+        result['error'] = str(e)
+    finally:
+        sock.close()
+
+
+def probe_health(base_url: str, stop: threading.Event, samples: List[Optional[float]], timeout: float):
+    """持续请求 /health，超时记为None"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=timeout) as response:
+                response.read()
+            samples.append((time.perf_counter() - start) * 1000)
+        except (urllib.error.URLError, ConnectionError, socket.timeout, TimeoutError):
+            samples.append(None)
+        time.sleep(0.2)
+
+
+def run_scenario(name: str, mode: str, args, nginx_binary: str = None) -> Dict:
+    server = AppServer({'workers': 1, 'threads': args.threads, 'worker_class': 'gthread'}, timeout=120,
+                       max_requests=100000,
+                       env={'DOWNLOAD_MODE': mode, 'WARMUP_ENABLED': 'false', 'ADMISSION_ENABLED': 'false'})
+    proxy = None
+    try:
+        server.start()
+        output_dir = Path(server.workdir.name) / 'output'
+        output_dir.mkdir(exist_ok=True)
+        with open(output_dir / FILE_NAME, 'wb') as f:
+            f.truncate(args.size_mb * 1024 * 1024)
+
+        base_url = server.base_url
+        port = server.port
+        if nginx_binary:
+            proxy = LocalNginx(nginx_binary, server.port, output_dir)
+            proxy.start()
+            base_url = proxy.base_url
+            port = proxy.port
+
+        path = f"/download/{downloads.make_download_token(FILE_NAME)}"
+        # 单次请求在应用侧的耗时（x-accel时应用只返回响应头，Content-Length由前置代理使用）
+        start = time.perf_counter()
+        with urllib.request.urlopen(f'{server.base_url}{path}', timeout=120) as response:
+            headers = dict(response.headers)
+            if mode == 'send_file':
+                response.read()
+        app_seconds = time.perf_counter() - start
+
+        stop = threading.Event()
+        results = [{'received': 0, 'status_line': None} for _ in range(args.clients)]
+        threads = [
+            threading.Thread(target=slow_download, args=('127.0.0.1', port, path, args.client_kbps, stop, result))
+            for result in results
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)
+        samples: List[Optional[float]] = []
+        prober = threading.Thread(target=probe_health, args=(base_url, stop, samples, args.probe_timeout))
+        prober.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads + [prober]:
+            thread.join()
+
+        latencies = [value for value in samples if value is not None]
+        return {
+            'name': name,
+            'mode': mode,
+            'app_seconds': app_seconds,
+            'accel_header': headers.get('X-Accel-Redirect') or headers.get('X-Sendfile'),
+            'probes': len(samples),
+            'timeouts': len(samples) - len(latencies),
+            'p50_ms': statistics.median(latencies) if latencies else None,
+            'p95_ms': percentile(latencies, 95) if latencies else None,
+            'downloaded_mb': sum(result['received'] for result in results) / 1024 / 1024,
+            'status': sorted({result['status_line'] for result in results if result['status_line']}),
+        }
+    finally:
+        if proxy:
+            proxy.stop()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大文件下载对worker线程占用的基准测试')
+    parser.add_argument('--size-mb', type=int, default=200, help='下载文件大小（MB）')
+    parser.add_argument('--clients', type=int, default=2, help='同时下载的慢速客户端数')
+    parser.add_argument('--client-kbps', type=int, default=256, help='每个客户端的读取速度（KB/s）')
+    parser.add_argument('--threads', type=int, default=2, help='gunicorn线程数（1个worker）')
+    parser.add_argument('--duration', type=float, default=10, help='下载期间探测 /health 的时长（秒）')
+    parser.add_argument('--probe-timeout', type=float, default=2, help='/health 请求超时（秒）')
+    parser.add_argument('--nginx', default=shutil.which('nginx'), help='nginx可执行文件路径')
+    args = parser.parse_args()
+
+    scenarios = [('send_file（直连）', 'send_file', None)]
+    if args.nginx:
+        scenarios.append(('x-accel + nginx', 'x-accel', args.nginx))
+    else:
+        print('⚠️  未找到nginx，x-accel只测量应用侧响应（客户端收到空响应体）')
+        scenarios.append(('x-accel（直连，仅响应头）', 'x-accel', None))
+
+    print(f"📊 {args.clients} 个客户端以 {args.client_kbps}KB/s 下载 {args.size_mb}MB 文件，"
+          f"1个worker {args.threads} 个线程，期间每0.2秒请求 /health（超时 {args.probe_timeout}s）")
+    print(f"   {'场景':<24}{'应用侧(ms)':>12}{'探测':>6}{'超时':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'已下载(MB)':>12}")
+    for name, mode, nginx_binary in scenarios:
+        row = run_scenario(name, mode, args, nginx_binary)
+        p50 = f"{row['p50_ms']:.1f}" if row['p50_ms'] is not None else '-'
+        p95 = f"{row['p95_ms']:.1f}" if row['p95_ms'] is not None else '-'
+        print(f"   {name:<24}{row['app_seconds'] * 1000:>12.1f}{row['probes']:>6}{row['timeouts']:>6}"
+              f"{p50:>10}{p95:>10}{row['downloaded_mb']:>12.1f}")
+        if row['accel_header']:
+            print(f"      响应头: {row['accel_header']}")
+        print(f"      客户端状态: {', '.join(row['status']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
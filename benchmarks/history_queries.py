@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史汇总查询基准测试
+
+在临时SQLite库中写入一年（可配置）的每日运行汇总，按直营中心/团队/业务经理规模生成各层级记录，
+然后测量 /api/history/trend 对应查询的 p50/p95 延迟。
+
+用法:
+    python -m benchmarks.history_queries --days 365 --centers 80
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from history_store import HistoryStore
+
+
+def synthetic_aggregates(rng: random.Random, centers: int, teams_per_center: int, managers_per_team: int):
+    rows = []
+    for c in range(centers):
+        center = f"直营中心{c:03d}"
+        rows.append((center, 'center', center))
+        for t in range(teams_per_center):
+            team = f"{center}团队{t}"
+            rows.append((center, 'team', team))
+            for m in range(managers_per_team):
+                rows.append((center, 'manager', f"{team}经理{m}"))
+    result = []
+    for center, level, name in rows:
+        customers = rng.randint(5, 500)
+        result.append({
+            'level': level,
+            'name': name,
+            'center': center,
+            'total_amount': round(customers * rng.uniform(2000, 12000), 2),
+            'row_count': customers + rng.randint(0, 20),
+            'customer_count': customers,
+            'high_amount_count': rng.randint(0, customers // 3),
+        })
+    return {
+        'run': {
+            'row_count': sum(r['row_count'] for r in result if r['level'] == 'center'),
+            'customer_count': sum(r['customer_count'] for r in result if r['level'] == 'center'),
+            'total_amount': sum(r['total_amount'] for r in result if r['level'] == 'center'),
+            'high_amount_count': sum(r['high_amount_count'] for r in result if r['level'] == 'center'),
+            'center_count': centers,
+        },
+        'rows': result,
+    }
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='历史汇总查询基准测试')
+    parser.add_argument('--days', type=int, default=365, help='每日运行天数')
+    parser.add_argument('--runs-per-day', type=int, default=1, help='每天运行次数')
+    parser.add_argument('--centers', type=int, default=80, help='直营中心数量')
+    parser.add_argument('--teams-per-center', type=int, default=5, help='每个直营中心的团队数')
+    parser.add_argument('--managers-per-team', type=int, default=4, help='每个团队的业务经理数')
+    parser.add_argument('--queries', type=int, default=200, help='每类查询次数')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = HistoryStore(str(Path(tmp_dir) / 'history.db'))
+        store.retention_days = 0
+        first_day = datetime(2025, 1, 1, 9, 0)
+
+        start = time.perf_counter()
+        for day in range(args.days):
+            for run in range(args.runs_per_day):
+                aggregates = synthetic_aggregates(rng, args.centers, args.teams_per_center, args.managers_per_team)
+                store.insert_run(aggregates, source='synthetic.xlsx',
+                                 run_at=first_day + timedelta(days=day, hours=run))
+        insert_seconds = time.perf_counter() - start
+        runs = args.days * args.runs_per_day
+        per_run = len(aggregates['rows'])
+        print(f"💾 写入 {runs} 次运行（每次 {per_run} 条层级汇总），平均 {insert_seconds / runs * 1000:.1f}ms/次，"
+              f"数据库 {store.get_stats()['db_size'] / 1024 / 1024:.1f}MB")
+
+        last_day = first_day + timedelta(days=args.days - 1)
+        month_start = (last_day - timedelta(days=30)).date().isoformat()
+        cases = {
+            '总体（全年，每天）': lambda: store.trend(start=first_day.date().isoformat(), end=last_day.date().isoformat()),
+            '直营中心（全年，每天）': lambda: store.trend('center', f"直营中心{rng.randrange(args.centers):03d}"),
+            '直营中心（近30天）': lambda: store.trend('center', f"直营中心{rng.randrange(args.centers):03d}", start=month_start),
+            '团队（全年，每次运行）': lambda: store.trend(
+                'team', f"直营中心{rng.randrange(args.centers):03d}团队{rng.randrange(args.teams_per_center)}", bucket='run'),
+            '业务经理（全年，每天）': lambda: store.trend(
+                'manager', f"直营中心{rng.randrange(args.centers):03d}团队{rng.randrange(args.teams_per_center)}"
+                           f"经理{rng.randrange(args.managers_per_team)}"),
+        }
+
+        print(f"\n📊 趋势查询延迟（{args.queries} 次）")
+        print(f"   {'查询':<24}{'点数':>8}{'p50(ms)':>10}{'p95(ms)':>10}")
+        for name, query in cases.items():
+            samples = []
+            points = 0
+            for _ in range(args.queries):
+                start = time.perf_counter()
+                points = len(query())
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"   {name:<24}{points:>8}{statistics.median(samples):>10.2f}{percentile(samples, 0.95):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化数据接口与Excel上传的端到端延迟对比
+
+上游系统已有结构化数据时，两种提交方式的完整耗时：
+- xlsx: 上游用pandas/openpyxl写出xlsx，再 POST /upload（read_excel解析，预览后重新读取文件生成下载文件）
+- ndjson / columns: 上游序列化为NDJSON或列式JSON，再 POST /api/process（直接构建DataFrame，透视表只计算一次）
+各方式在同一进程中通过Flask测试客户端请求，另外单独测量服务端把请求体读成DataFrame的耗时，并校验预览数据一致。
+
+用法:
+    python -m benchmarks.json_ingest --rows 10000 --repeat 3
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_app():
+    """在临时工作目录中加载应用（输出文件、历史库不写入项目目录）"""
+    os.environ.setdefault('WARMUP_ENABLED', 'false')
+    os.environ.setdefault('ADMISSION_ENABLED', 'false')
+    os.environ.setdefault('HISTORY_ENABLED', 'false')
+    os.environ.setdefault('SEARCH_ENABLED', 'false')
+    spec = importlib.util.spec_from_file_location('pay_fail_web', PROJECT_ROOT / 'pay-fail-web.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def encode_xlsx(df) -> bytes:
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def encode_ndjson(df) -> bytes:
+    return '\n'.join(json.dumps(record, ensure_ascii=False) for record in df.to_dict('records')).encode('utf-8')
+
+
+def encode_columns(df) -> bytes:
+    return json.dumps(df.to_dict('list'), ensure_ascii=False).encode('utf-8')
+
+
+def post_xlsx(client, body: bytes):
+    return client.post('/upload', data={'file': (io.BytesIO(body), 'export.xlsx')}, content_type='multipart/form-data')
+
+
+def post_json(content_type: str, output: str):
+    def post(client, body: bytes):
+        return client.post(f'/api/process?output={output}', data=body, content_type=content_type)
+    return post
+
+
+# 名称 -> (上游编码, 请求, 服务端读取)
+PATHS = {
+    'xlsx -> /upload': (encode_xlsx, post_xlsx, 'xlsx'),
+    'ndjson -> /api/process': (encode_ndjson, post_json('application/x-ndjson', 'both'), 'ndjson'),
+    'columns -> /api/process': (encode_columns, post_json('application/json', 'both'), 'columns'),
+    'ndjson（仅预览）': (encode_ndjson, post_json('application/x-ndjson', 'preview'), 'ndjson'),
+    'columns（仅预览）': (encode_columns, post_json('application/json', 'preview'), 'columns'),
+}
+
+
+def read_seconds(service, data_format: str, body: bytes) -> float:
+    """服务端把请求体读成DataFrame的耗时（xlsx为read_excel，/upload 中预览和生成下载文件各读取一次）"""
+    start = time.perf_counter()
+    if data_format == 'xlsx':
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as f:
+            f.write(body)
+            f.flush()
+            service._read_and_validate_excel(f.name)
+    else:
+        service._read_and_validate_json(io.BufferedReader(io.BytesIO(body)), data_format)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='结构化数据接口与Excel上传的端到端延迟对比')
+    parser.add_argument('--rows', type=int, default=10000, help='模拟数据行数')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式的重复次数（取中位数）')
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import SyntheticSpec, generate_dataframe
+
+    df = generate_dataframe(SyntheticSpec(rows=args.rows))
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='pay-fail-json-') as work_dir:
+        os.chdir(work_dir)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                app = load_app()
+                from excel_processor import ExcelProcessorService
+                service = ExcelProcessorService()
+            client = app.test_client()
+
+            results = {}
+            previews = {}
+            for name, (encode, post, data_format) in PATHS.items():
+                encode_times, read_times, request_times = [], [], []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    body = encode(df)
+                    encode_times.append(time.perf_counter() - start)
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        read_times.append(read_seconds(service, data_format, body))
+                        start = time.perf_counter()
+                        response = post(client, body)
+                        request_times.append(time.perf_counter() - start)
+                    payload = response.get_json()
+                    if response.status_code != 200 or not payload.get('success'):
+                        raise RuntimeError(f"{name} 请求失败: {payload.get('message')}")
+                previews[name] = json.dumps(payload['preview_data'], sort_keys=True, ensure_ascii=False, default=str)
+                results[name] = {
+                    'body_mb': len(body) / 1024 / 1024,
+                    'encode': statistics.median(encode_times),
+                    'read': statistics.median(read_times),
+                    'request': statistics.median(request_times),
+                }
+        finally:
+            os.chdir(previous_dir)
+
+    baseline = results['xlsx -> /upload']
+    baseline_total = baseline['encode'] + baseline['request']
+    print(f"📊 {args.rows} 行，{args.repeat} 次取中位数（/upload 和 output=both 都生成预览和下载文件）")
+    print(f"   {'方式':<26}{'请求体(MB)':>12}{'上游编码(s)':>12}{'服务端读取(s)':>14}{'请求(s)':>10}{'合计(s)':>10}{'节省':>8}")
+    for name, row in results.items():
+        total = row['encode'] + row['request']
+        saving = f"{(1 - total / baseline_total):.0%}" if name != 'xlsx -> /upload' else '-'
+        print(f"   {name:<26}{row['body_mb']:>12.2f}{row['encode']:>12.2f}{row['read']:>14.3f}"
+              f"{row['request']:>10.2f}{total:>10.2f}{saving:>8}")
+
+    reference = previews['xlsx -> /upload']
+    consistent = all(preview == reference for preview in previews.values())
+    print(f"   {'✅ 各方式的预览数据一致' if consistent else '❌ 预览数据不一致'}")
+    if not consistent:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
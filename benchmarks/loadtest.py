@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/upload + /download 端到端压力测试
+
+在本地依次以不同的gunicorn配置启动应用，按固定速率并发上传模拟文件并下载结果，
+记录吞吐量、p50/p95/p99延迟、错误率/超时率和每个worker的RSS峰值，输出对比报告。
+
+用法:
+    python -m benchmarks.loadtest --config 2x2:gthread --config 4x1:sync --rate 1 --duration 60
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import SyntheticSpec
+from benchmarks.run_benchmarks import prepare_input
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_config(text: str) -> Dict:
+    """解析 "workers x threads[:worker_class]" 形式的配置，如 2x2:gthread"""
+    size, _, worker_class = text.partition(':')
+    workers, _, threads = size.lower().partition('x')
+    return {
+        'name': text,
+        'workers': int(workers),
+        'threads': int(threads or 1),
+        'worker_class': worker_class or ('gthread' if int(threads or 1) > 1 else 'sync'),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def child_pids(pid: int) -> List[int]:
+    """查找gunicorn master的worker进程"""
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children.extend(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+class WorkerRssMonitor:
+    """定期采样各worker进程RSS，worker被回收重启时按pid分别记录"""
+
+    def __init__(self, master_pid: int, interval: float = 0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks: Dict[int, float] = {}
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _loop(self):
+        while self._running:
+            for pid in child_pids(self.master_pid):
+                rss = read_rss_mb(pid)
+                if rss > self.peaks.get(pid, 0):
+                    self.peaks[pid] = rss
+            time.sleep(self.interval)
+
+
+class AppServer:
+    """以指定gunicorn配置在临时工作目录中启动应用"""
+
+    def __init__(self, config: Dict, timeout: int, max_requests: int, env: Dict = None):
+        self.config = config
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.env = env or {}
+        self.port = free_port()
+        self.workdir = tempfile.TemporaryDirectory(prefix='pay-fail-loadtest-')
+        self.process = None
+        self.log_file = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, startup_timeout: float = 60):
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'127.0.0.1:{self.port}',
+            '--workers', str(self.config['workers']),
+            '--threads', str(self.config['threads']),
+            '--worker-class', self.config['worker_class'],
+            '--timeout', str(self.timeout),
+            '--max-requests', str(self.max_requests),
+            '--max-requests-jitter', str(max(1, self.max_requests // 10)),
+            '--pythonpath', str(PROJECT_ROOT),
+            '--chdir', self.workdir.name,
+            '--preload',
+            'pay-fail-web:app',
+        ]
+        self.log_file = open(Path(self.workdir.name) / 'gunicorn.log', 'w')
+        self.process = subprocess.Popen(command, stdout=self.log_file, stderr=subprocess.STDOUT,
+                                        env={**os.environ, **self.env})
+
+        deadline = time.time() + startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn启动失败，日志: {self.log_file.name}")
+            try:
+                with urllib.request.urlopen(f'{self.base_url}/health', timeout=2) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.3)
+        raise RuntimeError('等待应用启动超时')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log_file:
+            self.log_file.close()
+        self.workdir.cleanup()
+
+
+def encode_multipart(file_path: str) -> (bytes, str):
+    boundary = uuid.uuid4().hex
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{Path(file_path).name}"\r\n'
+        'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+    ).encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def upload_and_download(base_url: str, body: bytes, content_type: str, timeout: float) -> Dict:
+    """执行一次上传+下载，返回耗时和结果"""
+    start = time.perf_counter()
+    result = {'ok': False, 'timeout': False, 'status': None}
+    try:
+        request = urllib.request.Request(f'{base_url}/upload', data=body, headers={'Content-Type': content_type})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result['status'] = response.status
+            payload = json.loads(response.read())
+        result['upload_seconds'] = time.perf_counter() - start
+
+        if payload.get('success') and payload.get('download_url'):
+            remaining = max(1.0, timeout - result['upload_seconds'])
+            with urllib.request.urlopen(f"{base_url}{payload['download_url']}", timeout=remaining) as response:
+                response.read()
+                result['status'] = response.status
+            result['ok'] = True
+    except urllib.error.HTTPError as e:
+        result['status'] = e.code
+    except (socket.timeout, TimeoutError):
+        result['timeout'] = True
+    except urllib.error.URLError as e:
+        result['timeout'] = isinstance(e.reason, (socket.timeout, TimeoutError))
+        result['error'] = str(e.reason)
+    except (ConnectionError, OSError) as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def run_load(base_url: str, files: List[str], rate: float, duration: float, concurrency: int, timeout: float) -> Dict:
+    """开环负载：按固定速率发起请求，并发上限为concurrency"""
+    payloads = [encode_multipart(path) for path in files]
+    futures = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        i = 0
+        while True:
+            scheduled = start + i / rate
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            body, content_type = payloads[i % len(payloads)]
+            futures.append(executor.submit(upload_and_download, base_url, body, content_type, timeout))
+            i += 1
+        results = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+
+    latencies = [r['seconds'] for r in results if r['ok']]
+    total = len(results)
+    return {
+        'requests': total,
+        'succeeded': len(latencies),
+        'wall_seconds': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else 0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies) if latencies else 0,
+        'error_rate': sum(1 for r in results if not r['ok'] and not r['timeout']) / total if total else 0,
+        'timeout_rate': sum(1 for r in results if r['timeout']) / total if total else 0,
+        'status_codes': {str(code): sum(1 for r in results if r['status'] == code)
+                         for code in sorted({r['status'] for r in results if r['status'] is not None})},
+    }
+
+
+def render_markdown(report: Dict) -> str:
+    lines = [
+        f"# 压测报告 {report['timestamp']}",
+        '',
+        f"- 速率: {report['rate']} 请求/秒，持续 {report['duration']} 秒，客户端并发上限 {report['concurrency']}",
+        f"- 文件规模: {', '.join(str(r) for r in report['rows'])} 行",
+        f"- gunicorn超时: {report['gunicorn_timeout']}s，max-requests: {report['max_requests']}",
+        '',
+        '| 配置 | 请求数 | 成功 | 吞吐(次/秒) | p50(s) | p95(s) | p99(s) | 错误率 | 超时率 | worker RSS峰值(MB) |',
+        '|------|--------|------|-------------|--------|--------|--------|--------|--------|--------------------|',
+    ]
+    for item in report['results']:
+        r = item['load']
+        rss = item['worker_rss_peak_mb']
+        lines.append(
+            f"| {item['config']['name']} | {r['requests']} | {r['succeeded']} | {r['throughput_rps']:.2f} | "
+            f"{r['p50']:.2f} | {r['p95']:.2f} | {r['p99']:.2f} | {r['error_rate']:.1%} | {r['timeout_rate']:.1%} | "
+            f"{max(rss.values(), default=0):.0f} |"
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/upload + /download 端到端压力测试')
+    parser.add_argument('--config', action='append', help='gunicorn配置，格式 workers x threads[:worker_class]，可重复')
+    parser.add_argument('--rows', type=int, action='append', help='上传文件行数，可重复以混合不同大小')
+    parser.add_argument('--centers', type=int, default=20, help='直营中心数量')
+    parser.add_argument('--rate', type=float, default=1.0, help='每秒发起的上传数')
+    parser.add_argument('--duration', type=float, default=60, help='每个配置的压测时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=32, help='客户端最大并发数')
+    parser.add_argument('--client-timeout', type=float, default=120, help='客户端单次请求超时（秒）')
+    parser.add_argument('--gunicorn-timeout', type=int, default=60, help='gunicorn worker超时（秒）')
+    parser.add_argument('--max-requests', type=int, default=1000, help='gunicorn --max-requests')
+    parser.add_argument('--output', default='loadtest_report', help='报告输出路径前缀（生成.json和.md）')
+    args = parser.parse_args()
+
+    configs = [parse_config(c) for c in (args.config or ['2x2:gthread'])]
+    rows = args.rows or [5000]
+    files = [prepare_input(SyntheticSpec(rows=r, centers=args.centers)) for r in rows]
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'rate': args.rate,
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'rows': rows,
+        'gunicorn_timeout': args.gunicorn_timeout,
+        'max_requests': args.max_requests,
+        'results': [],
+    }
+
+    for config in configs:
+        print(f"🚀 启动配置 {config['name']}（{config['workers']} worker × {config['threads']} 线程, {config['worker_class']}）")
+        server = AppServer(config, args.gunicorn_timeout, args.max_requests)
+        try:
+            server.start()
+            monitor = WorkerRssMonitor(server.process.pid)
+            monitor.start()
+            try:
+                load = run_load(server.base_url, files, args.rate, args.duration, args.concurrency, args.client_timeout)
+            finally:
+                monitor.stop()
+        finally:
+            server.stop()
+
+        report['results'].append({
+            'config': config,
+            'load': load,
+            'worker_rss_peak_mb': {str(pid): rss for pid, rss in monitor.peaks.items()},
+        })
+        print(f"   吞吐 {load['throughput_rps']:.2f}/s, p50 {load['p50']:.2f}s, p95 {load['p95']:.2f}s, "
+              f"p99 {load['p99']:.2f}s, 错误率 {load['error_rate']:.1%}, 超时率 {load['timeout_rate']:.1%}")
+
+    with open(f'{args.output}.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    markdown = render_markdown(report)
+    with open(f'{args.output}.md', 'w', encoding='utf-8') as f:
+        f.write(markdown)
+
+    print()
+    print(markdown)
+    print(f"💾 报告已保存: {args.output}.json / {args.output}.md")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存模式对比：standard（object字符串）与 arrow（pyarrow字符串 + 分类类型）
+
+每种模式在独立子进程中跑一遍完整流水线，记录导入后的基线RSS、各阶段RSS峰值，
+按每10万行折算峰值内存增长，并逐单元格比较两种模式生成的Excel文件和预览数据。
+
+用法:
+    python -m benchmarks.memory_mode --rows 100000
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import add_spec_arguments, spec_from_args
+from benchmarks.run_benchmarks import STAGES, RssSampler, StageTimer, prepare_input, read_rss_bytes
+
+MODES = ['standard', 'arrow']
+
+
+def run_worker(mode: str, input_path: str, output_dir: str) -> Dict:
+    """子进程中执行：按 /upload 的顺序处理一次，返回RSS统计和输出摘要"""
+    import pandas as pd
+    from excel_processor import ExcelProcessorService
+
+    sampler = RssSampler()
+    baseline = read_rss_bytes() or 0
+    sampler.start()
+    try:
+        service = ExcelProcessorService(memory_mode=mode)
+        timer = StageTimer(sampler)
+        timer.instrument(service)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            df, validation = service._read_and_validate_excel(input_path)
+            if not validation['success']:
+                raise RuntimeError(validation['message'])
+            df = service._preprocess_data(df)
+            pivot_table = service._create_pivot_table_full_logic(df)
+            preview_data = service._generate_preview_data(pivot_table)
+            output_file = service._save_to_excel_full_style(df, pivot_table, output_dir)
+        peak = sampler.current_peak()
+    finally:
+        sampler.stop()
+
+    preview_json = json.dumps(preview_data, ensure_ascii=False, sort_keys=True, default=str)
+    return {
+        'mode': mode,
+        'rows': int(validation.get('rows_read', len(df))),
+        'pandas': pd.__version__,
+        'arrow_strings': service.string_dtype is not None,
+        'baseline_rss_mb': baseline / 1024 / 1024,
+        'peak_rss_mb': peak / 1024 / 1024,
+        'df_memory_mb': df.memory_usage(deep=True).sum() / 1024 / 1024,
+        'stages': timer.records,
+        'preview_sha1': hashlib.sha1(preview_json.encode('utf-8')).hexdigest(),
+        'output_file': output_file,
+    }
+
+
+def workbook_differences(path_a: str, path_b: str, limit: int = 10) -> List[str]:
+    """逐工作表比较单元格值、填充色、字体颜色和合并区域（工作表按顺序对应，透视表名含时间戳）"""
+    from openpyxl import load_workbook
+
+    wb_a, wb_b = load_workbook(path_a), load_workbook(path_b)
+    differences = []
+    if len(wb_a.worksheets) != len(wb_b.worksheets):
+        return [f"工作表数量不同: {len(wb_a.worksheets)} != {len(wb_b.worksheets)}"]
+
+    for index, (ws_a, ws_b) in enumerate(zip(wb_a.worksheets, wb_b.worksheets)):
+        if index > 0 and ws_a.title != ws_b.title:
+            differences.append(f"第{index + 1}个工作表名称不同: {ws_a.title} != {ws_b.title}")
+        if sorted(map(str, ws_a.merged_cells.ranges)) != sorted(map(str, ws_b.merged_cells.ranges)):
+            differences.append(f"{ws_a.title}: 合并单元格不同")
+        if (ws_a.max_row, ws_a.max_column) != (ws_b.max_row, ws_b.max_column):
+            differences.append(f"{ws_a.title}: 尺寸不同 {ws_a.dimensions} != {ws_b.dimensions}")
+            continue
+        for row_a, row_b in zip(ws_a.iter_rows(), ws_b.iter_rows()):
+            for cell_a, cell_b in zip(row_a, row_b):
+                if (cell_a.value != cell_b.value
+                        or cell_a.fill.fgColor.rgb != cell_b.fill.fgColor.rgb
+                        or cell_a.font.color != cell_b.font.color):
+                    differences.append(f"{ws_a.title}!{cell_a.coordinate}: {cell_a.value!r} != {cell_b.value!r}")
+                    if len(differences) >= limit:
+                        return differences
+    return differences
+
+
+def run_mode(mode: str, input_path: str, output_dir: str) -> Dict:
+    """在全新子进程中执行，避免两种模式共享已分配的内存"""
+    result_path = os.path.join(output_dir, 'result.json')
+    subprocess.run(
+        [sys.executable, '-m', 'benchmarks.memory_mode', '--worker', mode,
+         '--input', input_path, '--output-dir', output_dir, '--result', result_path],
+        cwd=str(Path(__file__).resolve().parent.parent),
+        check=True
+    )
+    with open(result_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def print_results(results: Dict[str, Dict]):
+    rows = next(iter(results.values()))['rows']
+    scale = 100000 / rows if rows else 0
+    print(f"\n📊 内存模式对比（{rows} 行，pandas {next(iter(results.values()))['pandas']}）")
+    header = ''.join(f"{mode:>14}" for mode in results)
+    print(f"   {'指标':<34}{header}")
+
+    def line(label, values, fmt='{:>14.1f}'):
+        print(f"   {label:<34}" + ''.join(fmt.format(v) for v in values))
+
+    line('pyarrow字符串', [str(r['arrow_strings']) for r in results.values()], '{:>14}')
+    line('导入后基线RSS(MB)', [r['baseline_rss_mb'] for r in results.values()])
+    line('DataFrame占用(MB)', [r['df_memory_mb'] for r in results.values()])
+    for name in STAGES:
+        if all(name in r['stages'] for r in results.values()):
+            line(f"{name} 峰值(MB)", [r['stages'][name]['peak_rss_mb'] for r in results.values()])
+    line('RSS峰值(MB)', [r['peak_rss_mb'] for r in results.values()])
+    line('每10万行峰值增长(MB)', [(r['peak_rss_mb'] - r['baseline_rss_mb']) * scale for r in results.values()])
+    line('总耗时(s)', [sum(s['seconds'] for s in r['stages'].values()) for r in results.values()], '{:>14.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='standard / arrow 内存模式对比')
+    add_spec_arguments(parser)
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--input', help=argparse.SUPPRESS)
+    parser.add_argument('--output-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='额外将结果写入该JSON文件')
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker, args.input, args.output_dir)
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    input_path = prepare_input(spec_from_args(args))
+    with tempfile.TemporaryDirectory(prefix='pay-fail-memory-') as tmp_dir:
+        results = {}
+        for mode in MODES:
+            print(f"🔄 正在以 {mode} 模式处理...")
+            output_dir = os.path.join(tmp_dir, mode)
+            os.makedirs(output_dir)
+            results[mode] = run_mode(mode, input_path, output_dir)
+        print_results(results)
+
+        print("\n🔍 正在比较输出...")
+        same_preview = results['standard']['preview_sha1'] == results['arrow']['preview_sha1']
+        differences = workbook_differences(results['standard']['output_file'], results['arrow']['output_file'])
+        print(f"   {'✅' if same_preview else '❌'} 预览数据{'一致' if same_preview else '不一致'}")
+        print(f"   {'✅' if not differences else '❌'} Excel文件{'一致' if not differences else '不一致'}")
+        for difference in differences:
+            print(f"      {difference}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if differences or not same_preview:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
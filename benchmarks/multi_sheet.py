@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多工作表读取基准测试
+
+把同一份模拟数据按行拆分到多个工作表（同一客户可能出现在多个工作表中），
+分别以1个进程和 --workers 个进程读取，对比耗时，并验证合并后的透视表（含跨工作表去重客户数）
+与把所有数据放在一个工作表中处理的结果一致。
+
+用法:
+    python -m benchmarks.multi_sheet --rows 100000 --sheets 8 --workers 4
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from benchmarks.synthetic import add_spec_arguments, spec_from_args, generate_dataframe
+
+
+def prepare_workbooks(spec, sheets: int):
+    """生成（或复用缓存的）单工作表和多工作表输入文件"""
+    key = hashlib.sha1(json.dumps({**spec.to_dict(), 'sheets': sheets}, sort_keys=True).encode()).hexdigest()[:12]
+    cache_dir = Path(tempfile.gettempdir()) / 'pay-fail-web-bench'
+    cache_dir.mkdir(exist_ok=True)
+    single_path = cache_dir / f"multi_{key}_single.xlsx"
+    multi_path = cache_dir / f"multi_{key}_sheets.xlsx"
+    if not (single_path.exists() and multi_path.exists()):
+        print(f"🔄 正在生成 {spec.rows} 行模拟数据（{sheets} 个工作表）...")
+        df = generate_dataframe(spec)
+        df.to_excel(single_path, index=False)
+        size = -(-len(df) // sheets)
+        with pd.ExcelWriter(multi_path, engine='openpyxl') as writer:
+            for i in range(sheets):
+                df.iloc[i * size:(i + 1) * size].to_excel(writer, sheet_name=f"区域{i + 1}", index=False)
+            # 不含必要列的工作表应被跳过
+            pd.DataFrame({'说明': ['汇总说明']}).to_excel(writer, sheet_name='说明', index=False)
+    return str(single_path), str(multi_path)
+
+
+def pivot_for(path: str, sheet_mode: str, workers: int):
+    from excel_processor import ExcelProcessorService
+
+    service = ExcelProcessorService()
+    service.config.EXCEL_SHEET_MODE = sheet_mode
+    service.config.SHEET_MAX_WORKERS = workers
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        df, validation = service._read_and_validate_excel(path)
+        read_seconds = time.perf_counter() - start
+        if not validation['success']:
+            raise RuntimeError(validation['message'])
+        pivot_table = service._create_pivot_table_full_logic(service._preprocess_data(df))
+    return read_seconds, pivot_table
+
+
+def normalized(pivot_table: pd.DataFrame) -> pd.DataFrame:
+    keys = [col for col in ['所属直营中心', '所属团队', '所属业务经理', '客户姓名'] if col in pivot_table.columns]
+    result = pivot_table.astype({col: str for col in keys}).sort_values(keys).reset_index(drop=True)
+    result['应还款金额'] = result['应还款金额'].round(2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多工作表读取基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--sheets', type=int, default=8, help='工作表数量')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行进程数')
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    single_path, multi_path = prepare_workbooks(spec, args.sheets)
+
+    _, reference = pivot_for(single_path, 'first', 1)
+    serial_seconds, serial_pivot = pivot_for(multi_path, 'all', 1)
+    parallel_seconds, parallel_pivot = pivot_for(multi_path, 'all', args.workers)
+
+    print(f"\n📊 多工作表读取（{spec.rows} 行，{args.sheets} 个工作表，CPU {os.cpu_count()} 核）")
+    print(f"   1 个进程:        {serial_seconds:.2f}s")
+    print(f"   {args.workers} 个进程:        {parallel_seconds:.2f}s（加速 {serial_seconds / parallel_seconds:.2f}x）")
+
+    expected = normalized(reference)
+    for label, pivot_table in [('1 个进程', serial_pivot), (f'{args.workers} 个进程', parallel_pivot)]:
+        same = normalized(pivot_table).equals(expected)
+        print(f"   {'✅' if same else '❌'} {label}: 透视表与单工作表结果{'一致' if same else '不一致'}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ExcelProcessorService 分阶段性能基准测试
+
+用法:
+    python -m benchmarks.run_benchmarks --rows 50000 --save-baseline
+    python -m benchmarks.run_benchmarks --rows 50000 --check --tolerance 0.2
+
+每个阶段记录耗时（不含嵌套阶段）和阶段内的RSS峰值；
+--check 时与基线对比，任一阶段超出容差即以非零状态退出。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 允许直接以脚本方式运行
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import SyntheticSpec, add_spec_arguments, spec_from_args, write_excel
+
+BASELINE_DIR = Path(__file__).resolve().parent / 'baselines'
+
+# 需要计时的处理阶段（按流水线顺序）
+STAGES = [
+    '_read_and_validate_excel',
+    '_preprocess_data',
+    '_sort_data',
+    '_create_pivot_table_full_logic',
+    '_generate_preview_data',
+    '_save_to_excel_full_style',
+]
+
+
+def read_rss_bytes() -> Optional[int]:
+    """读取当前进程RSS（Linux /proc），不可用时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss_bytes() -> int:
+    """进程生命周期内的RSS峰值（/proc不可用时的回退）"""
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class RssSampler:
+    """后台线程定期采样RSS，支持按阶段重置峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._running = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if read_rss_bytes() is None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _loop(self):
+        while self._running:
+            self.sample()
+            time.sleep(self.interval)
+
+    def sample(self) -> int:
+        rss = read_rss_bytes() or 0
+        with self._lock:
+            if rss > self.peak:
+                self.peak = rss
+        return rss
+
+    def reset(self) -> int:
+        """以当前RSS作为新的峰值起点"""
+        rss = read_rss_bytes()
+        if rss is None:
+            rss = max_rss_bytes()
+        with self._lock:
+            self.peak = rss
+        return rss
+
+    def current_peak(self) -> int:
+        if self._thread is None:
+            return max_rss_bytes()
+        self.sample()
+        with self._lock:
+            return self.peak
+
+
+class StageTimer:
+    """包装服务实例上的阶段方法，记录独占耗时和阶段内RSS峰值"""
+
+    def __init__(self, sampler: RssSampler):
+        self.sampler = sampler
+        self.records: Dict[str, Dict] = {}
+        self._stack: List[Dict] = []
+
+    def instrument(self, service, stages: List[str] = None):
+        for name in stages or STAGES:
+            setattr(service, name, self._wrap(name, getattr(service, name)))
+        return service
+
+    def _wrap(self, name, method):
+        @wraps(method)
+        def timed(*args, **kwargs):
+            frame = {'nested': 0.0}
+            self._stack.append(frame)
+            parent_peak = self.sampler.current_peak()
+            start_rss = self.sampler.reset()
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                peak = self.sampler.current_peak()
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1]['nested'] += elapsed
+                # 恢复外层阶段的峰值，保证外层峰值包含嵌套阶段
+                with self.sampler._lock:
+                    self.sampler.peak = max(parent_peak, peak)
+                self.records[name] = {
+                    'seconds': elapsed - frame['nested'],
+                    'inclusive_seconds': elapsed,
+                    'peak_rss_mb': peak / 1024 / 1024,
+                    'rss_growth_mb': (peak - start_rss) / 1024 / 1024,
+                }
+        return timed
+
+
+def run_pipeline(service, input_path: str, output_dir: str):
+    """按 /upload 的处理顺序执行完整流水线"""
+    df, validation = service._read_and_validate_excel(input_path)
+    if not validation['success']:
+        raise RuntimeError(validation['message'])
+    df = service._preprocess_data(df)
+    pivot_table = service._create_pivot_table_full_logic(df)
+    service._generate_preview_data(pivot_table)
+    service._save_to_excel_full_style(df, pivot_table, output_dir)
+
+
+def prepare_input(spec: SyntheticSpec) -> str:
+    """生成（或复用缓存的）模拟输入文件"""
+    key = hashlib.sha1(json.dumps(spec.to_dict(), sort_keys=True).encode()).hexdigest()[:12]
+    cache_dir = Path(tempfile.gettempdir()) / 'pay-fail-web-bench'
+    cache_dir.mkdir(exist_ok=True)
+    path = cache_dir / f"synthetic_{key}.xlsx"
+    if not path.exists():
+        print(f"🔄 正在生成 {spec.rows} 行模拟数据...")
+        write_excel(spec, str(path))
+    return str(path)
+
+
+def run_benchmark(spec: SyntheticSpec, repeat: int = 3, verbose: bool = False) -> Dict:
+    """执行基准测试，各阶段取中位数耗时和最大RSS峰值"""
+    from excel_processor import ExcelProcessorService
+
+    input_path = prepare_input(spec)
+    runs = []
+    totals = []
+    sampler = RssSampler()
+    sampler.start()
+    devnull = open(os.devnull, 'w')
+    try:
+        for i in range(repeat):
+            service = ExcelProcessorService()
+            timer = StageTimer(sampler)
+            timer.instrument(service)
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                # 处理过程中的print输出量很大，默认屏蔽以免干扰计时
+                with contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+                    run_pipeline(service, input_path, output_dir)
+                totals.append(time.perf_counter() - start)
+            runs.append(timer.records)
+            print(f"   第 {i + 1}/{repeat} 次: {totals[-1]:.3f}s")
+    finally:
+        sampler.stop()
+        devnull.close()
+
+    stages = {}
+    for name in STAGES:
+        samples = [run[name] for run in runs if name in run]
+        if not samples:
+            continue
+        stages[name] = {
+            'seconds': statistics.median(s['seconds'] for s in samples),
+            'inclusive_seconds': statistics.median(s['inclusive_seconds'] for s in samples),
+            'peak_rss_mb': max(s['peak_rss_mb'] for s in samples),
+            'rss_growth_mb': max(s['rss_growth_mb'] for s in samples),
+        }
+
+    return {
+        'spec': spec.to_dict(),
+        'repeat': repeat,
+        'total_seconds': statistics.median(totals),
+        'peak_rss_mb': max((s['peak_rss_mb'] for s in stages.values()), default=0),
+        'stages': stages,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': __import__('pandas').__version__,
+            'openpyxl': __import__('openpyxl').__version__,
+        },
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def compare_with_baseline(result: Dict, baseline: Dict, tolerance: float, min_seconds: float) -> List[str]:
+    """与基线对比，返回超出容差的阶段描述；耗时低于min_seconds的阶段只做参考不判定"""
+    regressions = []
+    checks = [('总耗时', result['total_seconds'], baseline['total_seconds'])]
+    for name, stage in result['stages'].items():
+        if name in baseline.get('stages', {}):
+            checks.append((name, stage['seconds'], baseline['stages'][name]['seconds']))
+
+    for name, current, base in checks:
+        if max(current, base) < min_seconds:
+            continue
+        change = (current - base) / base if base > 0 else 0
+        marker = '❌' if change > tolerance else '✅'
+        print(f"   {marker} {name}: {base:.3f}s -> {current:.3f}s ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(f"{name}: {base:.3f}s -> {current:.3f}s ({change:+.1%})")
+
+    base_peak = baseline.get('peak_rss_mb', 0)
+    if base_peak > 0:
+        change = (result['peak_rss_mb'] - base_peak) / base_peak
+        marker = '❌' if change > tolerance else '✅'
+        print(f"   {marker} RSS峰值: {base_peak:.1f}MB -> {result['peak_rss_mb']:.1f}MB ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(f"RSS峰值: {base_peak:.1f}MB -> {result['peak_rss_mb']:.1f}MB ({change:+.1%})")
+
+    return regressions
+
+
+def print_result(result: Dict):
+    print(f"\n📊 基准测试结果（{result['spec']['rows']} 行，重复 {result['repeat']} 次取中位数）")
+    print(f"   {'阶段':<34}{'耗时(s)':>10}{'RSS峰值(MB)':>14}{'RSS增长(MB)':>14}")
+    for name, stage in result['stages'].items():
+        print(f"   {name:<34}{stage['seconds']:>10.3f}{stage['peak_rss_mb']:>14.1f}{stage['rss_growth_mb']:>14.1f}")
+    print(f"   {'总计':<34}{result['total_seconds']:>10.3f}{result['peak_rss_mb']:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ExcelProcessorService 分阶段性能基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取中位数）')
+    parser.add_argument('--name', help='基线名称，默认按数据规模生成')
+    parser.add_argument('--save-baseline', action='store_true', help='保存结果为基线')
+    parser.add_argument('--check', action='store_true', help='与基线对比，超出容差时返回非零状态')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的性能退化比例（默认0.2即20%%）')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='耗时低于该值的阶段不参与退化判定')
+    parser.add_argument('--output', help='额外将结果写入该JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='显示处理过程输出')
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    name = args.name or f"rows{spec.rows}_centers{spec.centers}_{'uid' if spec.with_uid else 'nouid'}"
+    baseline_path = BASELINE_DIR / f"{name}.json"
+
+    result = run_benchmark(spec, repeat=args.repeat, verbose=args.verbose)
+    print_result(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 基线已保存: {baseline_path}")
+
+    if args.check:
+        if not baseline_path.exists():
+            print(f"\n⚠️  基线不存在: {baseline_path}，请先使用 --save-baseline 生成")
+            return 2
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n🔍 与基线对比（容差 {args.tolerance:.0%}）: {baseline_path}")
+        regressions = compare_with_baseline(result, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print(f"\n❌ 检测到 {len(regressions)} 项性能退化")
+            return 1
+        print("\n✅ 未检测到性能退化")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
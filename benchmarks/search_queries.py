@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索索引基准测试
+
+用模拟数据完成预处理和透视表，在临时目录中发布搜索索引，
+报告建立索引（含拼音首字母）和其他worker重新加载索引的耗时，以及各类查询的 p50/p95 延迟。
+
+用法:
+    python -m benchmarks.search_queries --rows 50000 --queries 500
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import add_spec_arguments, spec_from_args, generate_dataframe
+from search_index import SearchIndexService, pinyin_initials
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='搜索索引基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--queries', type=int, default=500, help='每类查询次数')
+    args = parser.parse_args()
+
+    from excel_processor import ExcelProcessorService
+
+    spec = spec_from_args(args)
+    print(f"🔄 正在生成 {spec.rows} 行模拟数据并创建透视表...")
+    service = ExcelProcessorService()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        pivot_table = service._create_pivot_table_full_logic(service._preprocess_data(generate_dataframe(spec)))
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'latest.json'
+        publisher = SearchIndexService(str(path))
+        start = time.perf_counter()
+        publisher.publish(pivot_table, source='synthetic.xlsx', background=False)
+        publish_seconds = time.perf_counter() - start
+
+        # 模拟其他worker：从共享文件加载
+        reader = SearchIndexService(str(path))
+        start = time.perf_counter()
+        index = reader.current()
+        load_seconds = time.perf_counter() - start
+        print(f"🔎 透视表 {len(pivot_table)} 行，{len(index.entries)} 个名称；发布（含拼音首字母）{publish_seconds:.2f}s，"
+              f"其他worker加载 {load_seconds:.2f}s，索引文件 {path.stat().st_size / 1024 / 1024:.1f}MB")
+
+        customers = pivot_table['客户姓名'].astype(str).tolist()
+        managers = pivot_table['所属业务经理'].astype(str).unique().tolist()
+        teams = pivot_table['所属团队'].astype(str).unique().tolist()
+        cases = {
+            '客户全名': lambda: rng.choice(customers),
+            '客户姓氏（1字）': lambda: rng.choice(customers)[:1],
+            '客户名中间字': lambda: rng.choice(customers)[1:2],
+            '客户拼音首字母': lambda: pinyin_initials(rng.choice(customers)),
+            '业务经理前缀': lambda: rng.choice(managers)[:2],
+            '团队全名（>3字）': lambda: rng.choice(teams),
+            '不存在': lambda: '不存在的客户',
+        }
+
+        print(f"\n📊 查询延迟（{args.queries} 次，每次最多20个匹配项）")
+        print(f"   {'查询':<20}{'平均匹配':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+        for name, make_query in cases.items():
+            samples = []
+            matched = 0
+            for _ in range(args.queries):
+                query = make_query()
+                start = time.perf_counter()
+                matched += len(index.search(query))
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"   {name:<20}{matched / args.queries:>10.1f}"
+                  f"{statistics.median(samples):>10.3f}{percentile(samples, 0.95):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
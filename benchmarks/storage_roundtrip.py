@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端往返测试
+
+按当前环境变量配置的存储后端（STORAGE_BACKEND 等，S3兼容服务可用本地MinIO）保存一个模拟输出文件，
+记录流式写入耗时，然后以两个独立进程模拟两个节点：从对方写入的对象读取（冷缓存）和再次读取（ETag未变，命中缓存），
+最后校验下载内容与写入内容一致并删除测试对象。
+
+用法:
+    STORAGE_BACKEND=s3 STORAGE_S3_BUCKET=pay-fail-web STORAGE_S3_ENDPOINT=http://127.0.0.1:9000 \\
+        python -m benchmarks.storage_roundtrip --rows 50000
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def sha1_of(path) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_twice(key: str) -> dict:
+    """子进程（另一个节点，独立的本地缓存目录）：冷读取和缓存读取"""
+    import storage
+    output_storage = storage.get_storage('output')
+    timings = {}
+    for label in ('cold', 'cached'):
+        start = time.perf_counter()
+        path = output_storage.local_path(key)
+        timings[label] = time.perf_counter() - start
+    return {'timings': timings, 'sha1': sha1_of(path), 'path': str(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='存储后端往返测试')
+    parser.add_argument('--rows', type=int, default=50000, help='模拟数据行数')
+    parser.add_argument('--worker', metavar='KEY', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(read_twice(args.worker)))
+        return
+
+    from benchmarks.synthetic import SyntheticSpec, generate_dataframe
+    from config import Config
+    from excel_processor import ExcelProcessorService
+    import storage
+
+    service = ExcelProcessorService()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        df = service._preprocess_data(generate_dataframe(SyntheticSpec(rows=args.rows)))
+        pivot_table = service._create_pivot_table_full_logic(df)
+        start = time.perf_counter()
+        location = service._save_to_excel_full_style(df, pivot_table, Config.OUTPUT_FOLDER)
+        write_seconds = time.perf_counter() - start
+
+    output_storage = storage.get_storage('output')
+    key = os.path.basename(location)
+    print(f"💾 {Config.STORAGE_BACKEND} 存储写入 {location}：{write_seconds:.2f}s（含生成工作簿）")
+
+    with tempfile.TemporaryDirectory(prefix='pay-fail-node-') as node_dir:
+        env = {**os.environ, 'STORAGE_CACHE_DIR': str(Path(node_dir) / 'cache'),
+               'PYTHONPATH': str(PROJECT_ROOT)}
+        command = [sys.executable, '-m', 'benchmarks.storage_roundtrip', '--worker', key]
+        output = subprocess.run(command, cwd=node_dir if Config.STORAGE_BACKEND == 's3' else None, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+    expected = sha1_of(output_storage.local_path(key))
+    timings = result['timings']
+    print(f"📥 另一节点读取：冷缓存 {timings['cold'] * 1000:.1f}ms，缓存命中 {timings['cached'] * 1000:.1f}ms")
+    print(f"   {'✅' if result['sha1'] == expected else '❌'} 内容{'一致' if result['sha1'] == expected else '不一致'}")
+    output_storage.delete(key)
+    if result['sha1'] != expected:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
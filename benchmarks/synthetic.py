@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟扣款失败导出数据生成器
+按指定行数和直营中心/团队/业务经理规模生成与真实导出结构一致的数据
+"""
+
+import argparse
+import random
+from dataclasses import dataclass, asdict
+from typing import Dict
+
+import pandas as pd
+
+# 用于生成中文名称的字库（覆盖不同拼音首字母，保证排序逻辑有代表性）
+CITY_CHARS = '北上广深杭成武西南重天苏长郑合济青厦福昆大沈哈石太兰贵'
+NAME_CHARS = '安白陈邓范高韩胡黄金李林刘马潘钱宋孙唐王魏吴肖徐杨叶张赵周朱'
+GIVEN_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰飞'
+
+
+@dataclass
+class SyntheticSpec:
+    """模拟数据规模参数"""
+    rows: int = 10000
+    centers: int = 20
+    teams_per_center: int = 5
+    managers_per_team: int = 4
+    customer_ratio: float = 0.8     # 去重客户数 / 行数
+    with_uid: bool = True           # 是否包含客户UID列
+    bp_ratio: float = 0.1           # 贷后BP非空比例
+    bp_team_ratio: float = 0.1      # 贷后BP团队占团队比例
+    high_amount_ratio: float = 0.2  # 金额超过阈值(10000)的比例
+    seed: int = 42
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _chinese_name(rng: random.Random, length: int = 2) -> str:
+    return rng.choice(NAME_CHARS) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(length - 1))
+
+
+def generate_dataframe(spec: SyntheticSpec) -> pd.DataFrame:
+    """生成模拟导出数据"""
+    rng = random.Random(spec.seed)
+
+    # 组织结构：直营中心 -> 团队 -> 业务经理
+    centers = []
+    used_center_names = set()
+    for i in range(spec.centers):
+        name = f"{rng.choice(CITY_CHARS)}{rng.choice(CITY_CHARS)}直营中心"
+        if name in used_center_names:
+            name = f"{name}{i + 1}"
+        used_center_names.add(name)
+        centers.append(name)
+
+    teams = []
+    for center in centers:
+        for t in range(spec.teams_per_center):
+            if rng.random() < spec.bp_team_ratio:
+                team = f"{center[:2]}贷后BP团队{t + 1}"
+            else:
+                team = f"{center[:2]}{_chinese_name(rng)}团队{t + 1}"
+            managers = [f"{_chinese_name(rng, 3)}{m + 1}" for m in range(spec.managers_per_team)]
+            teams.append((center, team, managers))
+
+    bp_names = [_chinese_name(rng, 3) for _ in range(max(1, len(teams) // 4))]
+    customer_count = max(1, int(spec.rows * spec.customer_ratio))
+
+    records = {
+        '所属直营中心': [],
+        '所属团队': [],
+        '所属业务经理': [],
+        '客户姓名': [],
+        '应还款金额': [],
+    }
+    if spec.with_uid:
+        records['客户UID'] = []
+    records['贷后BP'] = []
+
+    # 客户固定归属一个团队/经理，同一客户的多笔记录落在同一位置
+    customer_home = {}
+    for _ in range(spec.rows):
+        customer_id = rng.randrange(customer_count)
+        if customer_id not in customer_home:
+            center, team, managers = rng.choice(teams)
+            customer_home[customer_id] = (center, team, rng.choice(managers), _chinese_name(rng, 3))
+        center, team, manager, customer_name = customer_home[customer_id]
+
+        if rng.random() < spec.high_amount_ratio:
+            amount = round(rng.uniform(10000, 80000), 2)
+        else:
+            amount = round(rng.uniform(100, 9999.99), 2)
+
+        records['所属直营中心'].append(center)
+        records['所属团队'].append(team)
+        records['所属业务经理'].append(manager)
+        records['客户姓名'].append(customer_name)
+        records['应还款金额'].append(amount)
+        if spec.with_uid:
+            records['客户UID'].append(f"UID{customer_id:08d}")
+        records['贷后BP'].append(rng.choice(bp_names) if rng.random() < spec.bp_ratio else '无')
+
+    return pd.DataFrame(records)
+
+
+def write_excel(spec: SyntheticSpec, output_path: str) -> str:
+    """生成模拟数据并保存为xlsx"""
+    generate_dataframe(spec).to_excel(output_path, index=False)
+    return output_path
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser):
+    """为命令行添加数据规模参数"""
+    defaults = SyntheticSpec()
+    parser.add_argument('--rows', type=int, default=defaults.rows, help='数据行数')
+    parser.add_argument('--centers', type=int, default=defaults.centers, help='直营中心数量')
+    parser.add_argument('--teams-per-center', type=int, default=defaults.teams_per_center, help='每个直营中心的团队数')
+    parser.add_argument('--managers-per-team', type=int, default=defaults.managers_per_team, help='每个团队的业务经理数')
+    parser.add_argument('--customer-ratio', type=float, default=defaults.customer_ratio, help='去重客户数占行数比例')
+    parser.add_argument('--no-uid', action='store_true', help='不生成客户UID列')
+    parser.add_argument('--bp-ratio', type=float, default=defaults.bp_ratio, help='贷后BP非空比例')
+    parser.add_argument('--bp-team-ratio', type=float, default=defaults.bp_team_ratio, help='贷后BP团队占团队比例')
+    parser.add_argument('--seed', type=int, default=defaults.seed, help='随机种子')
+
+
+def spec_from_args(args) -> SyntheticSpec:
+    return SyntheticSpec(
+        rows=args.rows,
+        centers=args.centers,
+        teams_per_center=args.teams_per_center,
+        managers_per_team=args.managers_per_team,
+        customer_ratio=args.customer_ratio,
+        with_uid=not args.no_uid,
+        bp_ratio=args.bp_ratio,
+        bp_team_ratio=args.bp_team_ratio,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成模拟扣款失败导出数据')
+    add_spec_arguments(parser)
+    parser.add_argument('--output', required=True, help='输出xlsx路径')
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    write_excel(spec, args.output)
+    print(f"✅ 已生成 {spec.rows} 行模拟数据: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
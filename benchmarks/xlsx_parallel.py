@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xlsx分片并行解析基准测试
+
+用模拟数据生成（或复用缓存的）单工作表xlsx，分别用 pd.read_excel 和分片解析（--workers 指定的各个进程数）读取，
+报告耗时、相对read_excel的加速比和并行效率，并校验每次得到的DataFrame（列、类型、值）与read_excel完全一致。
+加速比受限于可用CPU核数，报告中会给出本机核数；进程数超过核数时只会增加调度和传输开销。
+另外在单进程中分阶段计时，按不能并行的部分（读取共享字符串、解压切片、拼接和类型推断）估算各核数下的加速比上限。
+
+用法:
+    python -m benchmarks.xlsx_parallel --rows 200000 --workers 1 --workers 2 --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from benchmarks.synthetic import add_spec_arguments, spec_from_args, write_excel
+
+
+def prepare_workbook(spec) -> str:
+    key = hashlib.sha1(json.dumps(spec.to_dict(), sort_keys=True).encode()).hexdigest()[:12]
+    cache_dir = Path(tempfile.gettempdir()) / 'pay-fail-web-bench'
+    cache_dir.mkdir(exist_ok=True)
+    path = cache_dir / f"synthetic_{key}.xlsx"
+    if not path.exists():
+        print(f"🔄 正在生成 {spec.rows} 行模拟数据...")
+        write_excel(spec, str(path))
+    return str(path)
+
+
+def timed(func, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def identical(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_exact=True)
+    except AssertionError:
+        return False
+    return all((expected[col].map(type) == actual[col].map(type)).all() for col in expected.columns)
+
+
+def stage_seconds(path: str) -> dict:
+    """单进程下各阶段耗时：只有分片解析可以并行，其余为主进程中的串行部分"""
+    import zipfile
+    import xlsx_reader
+
+    stages = {}
+    start = time.perf_counter()
+    worksheet_path, shared_strings, epoch, date_formats, timedelta_formats = xlsx_reader._sheet_metadata(path)
+    stages['metadata'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with zipfile.ZipFile(path) as archive, archive.open(worksheet_path) as source:
+        shards = list(xlsx_reader.iter_shards(source, xlsx_reader.MIN_SHARD_BYTES))
+    stages['split'] = time.perf_counter() - start
+
+    xlsx_reader._init_worker(shards[0], shared_strings, epoch, date_formats, timedelta_formats)
+    start = time.perf_counter()
+    results = [xlsx_reader._parse_shard(shard) for shard in shards[1:]]
+    stages['parse'] = time.perf_counter() - start
+    xlsx_reader._worker_state.clear()
+
+    start = time.perf_counter()
+    xlsx_reader._to_dataframe(xlsx_reader._assemble(results))
+    stages['assemble'] = time.perf_counter() - start
+    return stages
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='xlsx分片并行解析基准测试')
+    add_spec_arguments(parser)
+    parser.add_argument('--workers', type=int, action='append', help='解析进程数（可重复），默认1到本机核数的2的幂')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取中位数）')
+    args = parser.parse_args()
+
+    from xlsx_reader import read_sheet_sharded, _worksheet_bytes
+
+    cores = available_cores()
+    workers_list = args.workers or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    path = prepare_workbook(spec_from_args(args))
+    sheet_mb = _worksheet_bytes(path) / 1024 / 1024
+
+    print(f"📄 {args.rows} 行，文件 {os.path.getsize(path) / 1024 / 1024:.1f}MB，工作表XML {sheet_mb:.1f}MB；"
+          f"本机可用CPU核数 {cores}，{args.repeat} 次取中位数")
+    baseline, expected = timed(lambda: pd.read_excel(path), args.repeat)
+    print(f"   {'方式':<18}{'耗时(s)':>10}{'加速比':>10}{'并行效率':>10}{'结果一致':>10}")
+    print(f"   {'read_excel':<18}{baseline:>10.2f}{1:>10.2f}{'-':>10}{'-':>10}")
+
+    all_identical = True
+    for workers in workers_list:
+        seconds, actual = timed(lambda: read_sheet_sharded(path, workers=workers), args.repeat)
+        same = identical(expected, actual)
+        all_identical &= same
+        speedup = baseline / seconds
+        efficiency = speedup / min(workers, cores)
+        print(f"   {f'分片 × {workers} 进程':<18}{seconds:>10.2f}{speedup:>10.2f}{efficiency:>10.0%}{'✅' if same else '❌':>10}")
+
+    stages = stage_seconds(path)
+    serial = stages['metadata'] + stages['split'] + stages['assemble']
+    print(f"\n   单进程各阶段：读取共享字符串/样式 {stages['metadata']:.2f}s，解压切片 {stages['split']:.2f}s，"
+          f"分片解析 {stages['parse']:.2f}s（可并行），拼接和类型推断 {stages['assemble']:.2f}s")
+    estimates = '，'.join(f"{n} 核 {(serial + stages['parse']) / (serial + stages['parse'] / n):.1f}x" for n in (2, 4, 8, 16))
+    print(f"   按串行部分估算的加速比上限（不计进程间传输）：{estimates}")
+    if max(workers_list) > cores:
+        print(f"   ⚠️  进程数超过可用核数（{cores}），超出部分不会带来加速")
+    if not all_identical:
+        print("   ❌ 分片解析结果与read_excel不一致")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
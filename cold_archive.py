@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出报告冷存储
+超过 RETENTION_HOT_HOURS 的报告（xlsx/zip）由文件清理服务转入冷存储目录 output/cold/：
+- 逐个读出压缩包成员的原始内容，按顺序写入一个 xz（安装zstandard后可选zstd）压缩流 <文件名>.xz
+- 成员名称、大小、CRC和时间写入索引 <文件名>.index.json（索引文件存在即表示归档完成）
+xlsx本身是逐个成员deflate压缩的zip，成员XML连在一起整体压缩后通常还能再小约30%。
+
+下载冷存储中的报告时按索引边解压边重新打包为zip（deflate，带数据描述符），不落盘、不整体解压。
+"""
+
+import io
+import os
+import json
+import lzma
+import time
+import zlib
+import zipfile
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.index.json'
+COLD_CODECS = ('xz', 'zstd')
+CODEC_SUFFIXES = {'xz': '.xz', 'zstd': '.zst'}
+# 各压缩算法的默认级别（xz -1 在报告XML上压缩率高于zstd -17，耗时约1/10）
+DEFAULT_LEVELS = {'xz': 1, 'zstd': 17}
+# 可转入冷存储的报告类型
+ARCHIVE_EXTENSIONS = {'.xlsx', '.zip'}
+CHUNK_SIZE = 1024 * 1024
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class ColdArchiveError(Exception):
+    """冷存储归档或恢复失败"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集zipfile写出的数据，由生成器分块取走（不支持seek，zipfile自动使用数据描述符）"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class RestoredStream(io.RawIOBase):
+    """把生成器包装为只读文件对象（供send_file流式发送）"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        super().__init__()
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._chunks.close()
+        super().close()
+
+
+class ColdArchiveService:
+    """输出报告的冷存储：归档、按索引流式恢复和到期删除"""
+
+    def __init__(self, root: str = None, codec: str = None, level: int = None):
+        """
+        Args:
+            root (str): 冷存储目录，默认为 OUTPUT_FOLDER/cold
+            codec (str): 压缩算法 xz/zstd，默认使用 COLD_CODEC
+            level (int): 压缩级别，默认使用 COLD_LEVEL（未设置时按压缩算法取默认值）
+        """
+        self._root = Path(root) if root else None
+        self._codec = codec
+        self._level = level
+        self._warned_codec = False
+
+    @property
+    def root(self) -> Path:
+        return self._root or Path(Config.OUTPUT_FOLDER) / 'cold'
+
+    @property
+    def codec(self) -> str:
+        codec = (self._codec or Config.COLD_CODEC).lower()
+        if codec not in COLD_CODECS:
+            raise ValueError(f'不支持的冷存储压缩算法: {codec}')
+        if codec == 'zstd' and _zstd() is None:
+            if not self._warned_codec:
+                logger.warning("⚠️ 未安装zstandard，冷存储改用xz压缩")
+                self._warned_codec = True
+            codec = 'xz'
+        return codec
+
+    def _level_for(self, codec: str) -> int:
+        level = self._level if self._level is not None else Config.COLD_LEVEL
+        # 配置的级别只用于配置的压缩算法（zstd回退为xz时使用xz的默认级别）
+        if level and codec == (self._codec or Config.COLD_CODEC).lower():
+            return level
+        return DEFAULT_LEVELS[codec]
+
+    @staticmethod
+    def is_archivable(path: Path) -> bool:
+        return path.suffix.lower() in ARCHIVE_EXTENSIONS
+
+    def _index_path(self, filename: str) -> Path:
+        return self.root / f"{filename}{INDEX_SUFFIX}"
+
+    def _open_writer(self, path: Path, codec: str):
+        level = self._level_for(codec)
+        if codec == 'zstd':
+            compressor = _zstd().ZstdCompressor(level=level, write_checksum=True)
+            return compressor.stream_writer(open(path, 'wb'), closefd=True)
+        return lzma.open(path, 'wb', preset=level)
+
+    @staticmethod
+    def _open_reader(path: Path, codec: str):
+        if codec == 'zstd':
+            zstandard = _zstd()
+            if zstandard is None:
+                raise ColdArchiveError('读取zstd归档需要安装zstandard')
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return lzma.open(path, 'rb')
+
+    def archive(self, path: Path) -> Dict:
+        """
+        把报告转入冷存储（不删除原文件，由调用方在成功后删除）
+
+        Args:
+            path (Path): 输出目录中的报告文件
+
+        Returns:
+            dict: 索引内容，包含原始大小、归档大小和本次读写的字节数（io_bytes）
+        """
+        path = Path(path)
+        codec = self.codec
+        self.root.mkdir(parents=True, exist_ok=True)
+        blob_name = path.name + CODEC_SUFFIXES[codec]
+        blob_path = self.root / blob_name
+        tmp_path = blob_path.with_name(f"{blob_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        stat = path.stat()
+        start = time.perf_counter()
+
+        members = []
+        raw_size = 0
+        try:
+            with zipfile.ZipFile(path) as source, self._open_writer(tmp_path, codec) as writer:
+                for info in source.infolist():
+                    # 读取时zipfile校验CRC，损坏的报告不会进入冷存储
+                    with source.open(info) as member:
+                        while True:
+                            chunk = member.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            writer.write(chunk)
+                    raw_size += info.file_size
+                    members.append({
+                        'name': info.filename,
+                        'size': info.file_size,
+                        'crc': info.CRC,
+                        'date_time': list(info.date_time),
+                        'external_attr': info.external_attr,
+                    })
+            os.replace(tmp_path, blob_path)
+        except (zipfile.BadZipFile, OSError, lzma.LZMAError) as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise ColdArchiveError(f'归档 {path.name} 失败: {e}') from e
+
+        archived_size = blob_path.stat().st_size
+        entry = {
+            'version': INDEX_VERSION,
+            'filename': path.name,
+            'blob': blob_name,
+            'codec': codec,
+            'original_size': stat.st_size,
+            'raw_size': raw_size,
+            'archived_size': archived_size,
+            'mtime': stat.st_mtime,
+            'archived_at': datetime.now().isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - start, 3),
+            'members': members,
+        }
+        self._write_index(entry)
+        return {**entry, 'io_bytes': stat.st_size + archived_size}
+
+    def _write_index(self, entry: Dict):
+        """原子写入索引（索引出现即表示归档完成）"""
+        path = self._index_path(entry['filename'])
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get_entry(self, filename: str) -> Optional[Dict]:
+        """读取报告的冷存储索引，不存在时返回None"""
+        try:
+            with open(self._index_path(filename), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == INDEX_VERSION else None
+
+    def list_entries(self) -> List[Dict]:
+        """所有冷存储报告（不含成员列表），按原文件时间倒序"""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for index_path in self.root.glob(f"*{INDEX_SUFFIX}"):
+            entry = self.get_entry(index_path.name[:-len(INDEX_SUFFIX)])
+            if entry is not None:
+                entries.append({key: value for key, value in entry.items() if key != 'members'})
+        entries.sort(key=lambda entry: entry['mtime'], reverse=True)
+        return entries
+
+    def iter_restored(self, entry: Dict) -> Iterator[bytes]:
+        """按索引边解压边重新打包为zip，逐块产出"""
+        sink = _ChunkSink()
+        with self._open_reader(self.root / entry['blob'], entry['codec']) as reader:
+            archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+            for member in entry['members']:
+                info = zipfile.ZipInfo(member['name'], date_time=tuple(member['date_time']))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = member['external_attr']
+                # 预先给出大小，zipfile据此决定是否使用zip64
+                info.file_size = member['size']
+                crc = 0
+                remaining = member['size']
+                with archive.open(info, 'w') as target:
+                    while remaining:
+                        chunk = reader.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise ColdArchiveError(f"归档 {entry['blob']} 不完整")
+                        crc = zlib.crc32(chunk, crc)
+                        remaining -= len(chunk)
+                        target.write(chunk)
+                        data = sink.take()
+                        if data:
+                            yield data
+                if crc != member['crc']:
+                    raise ColdArchiveError(f"归档 {entry['blob']} 中 {member['name']} 校验失败")
+            archive.close()
+        yield sink.take()
+
+    def open_restored(self, filename: str) -> Optional[RestoredStream]:
+        """
+        打开冷存储中的报告（流式恢复为zip）
+
+        Returns:
+            RestoredStream: 只读文件对象；报告不在冷存储中时返回None
+        """
+        entry = self.get_entry(filename)
+        if entry is None or not (self.root / entry['blob']).exists():
+            return None
+        return RestoredStream(self.iter_restored(entry))
+
+    def delete(self, filename: str) -> int:
+        """删除冷存储中的报告（先删索引），返回释放的字节数"""
+        entry = self.get_entry(filename)
+        freed = 0
+        index_path = self._index_path(filename)
+        paths = [index_path] + ([self.root / entry['blob']] if entry else [])
+        for path in paths:
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+        return freed
+
+    def expire(self, cutoff_timestamp: float) -> (int, int):
+        """
+        删除原文件时间早于cutoff的冷存储报告，以及没有索引的残留归档/临时文件
+
+        Returns:
+            tuple: (删除的报告数, 释放的字节数)
+        """
+        if not self.root.exists():
+            return 0, 0
+        count = 0
+        freed = 0
+        indexed_blobs = set()
+        for entry in self.list_entries():
+            if entry['mtime'] < cutoff_timestamp:
+                freed += self.delete(entry['filename'])
+                count += 1
+            else:
+                indexed_blobs.add(entry['blob'])
+        # 中断的归档（只有压缩流没有索引）在一小时后清除
+        stale_before = time.time() - 3600
+        for path in self.root.iterdir():
+            if path.name.endswith(INDEX_SUFFIX) or path.name in indexed_blobs:
+                continue
+            try:
+                stat = path.stat()
+                if stat.st_mtime < stale_before:
+                    path.unlink()
+                    freed += stat.st_size
+            except OSError:
+                continue
+        return count, freed
+
+    def get_stats(self) -> Dict:
+        entries = self.list_entries()
+        original = sum(entry['original_size'] for entry in entries)
+        archived = sum(entry['archived_size'] for entry in entries)
+        return {
+            'codec': self.codec,
+            'files': len(entries),
+            'original_bytes': original,
+            'archived_bytes': archived,
+            'ratio': round(archived / original, 3) if original else None,
+        }
+
+
+# 全局冷存储服务实例
+cold_archive = ColdArchiveService()
@@ -13,10 +13,132 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB限制
     
     # Excel处理配置
-    ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
+    ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv', '.tsv'}
     REQUIRED_COLUMNS = ['应还款金额', '所属直营中心', '所属团队', '所属业务经理', '客户姓名']
     OPTIONAL_COLUMNS = ['客户UID', '贷后BP']
     
+    # 内存模式：standard 为普通object字符串；arrow 使用pyarrow字符串和分类类型，并省去预处理时的整表复制
+    MEMORY_MODE = os.environ.get('MEMORY_MODE', 'standard').lower()
+    
+    # CSV/TSV分块读取行数（每块读取后立即聚合，内存占用与文件大小无关）
+    CSV_CHUNK_ROWS = int(os.environ.get('CSV_CHUNK_ROWS', 50000))
+    # 每读取多少块合并一次各块的客户聚合结果（合并次数越少CPU越省，未合并的块占用内存）
+    CSV_AGGREGATE_BATCH = int(os.environ.get('CSV_AGGREGATE_BATCH', 16))
+    
+    # Excel工作表模式：first 只读第一个工作表；all 读取所有包含必要列的工作表（多进程并行解析后合并）
+    EXCEL_SHEET_MODE = os.environ.get('EXCEL_SHEET_MODE', 'first').lower()
+    SHEET_MAX_WORKERS = int(os.environ.get('SHEET_MAX_WORKERS', os.cpu_count() or 1))
+    
+    # xlsx解析：sharded 把第一个工作表的XML按行切成分片，由 XLSX_PARSE_WORKERS 个进程并行解析（结果与read_excel一致）；
+    # openpyxl 始终使用 pd.read_excel。工作表XML小于 XLSX_SHARD_MIN_MB 或只有1个进程时直接使用 pd.read_excel
+    XLSX_READER = os.environ.get('XLSX_READER', 'sharded').lower()
+    XLSX_PARSE_WORKERS = int(os.environ.get('XLSX_PARSE_WORKERS', os.cpu_count() or 1))
+    XLSX_SHARD_MIN_MB = int(os.environ.get('XLSX_SHARD_MIN_MB', 16))
+    
+    # 按直营中心拆分输出配置
+    SPLIT_MAX_WORKERS = int(os.environ.get('SPLIT_MAX_WORKERS', os.cpu_count() or 1))
+    
+    # 进程池子进程启动方式：forkserver（默认）或 spawn；worker为多线程进程，不使用fork
+    PROCESS_START_METHOD = os.environ.get('PROCESS_START_METHOD', 'forkserver').lower()
+    
+    # 表格图片渲染配置
+    IMAGE_FONT_PATH = os.environ.get('IMAGE_FONT_PATH', '')
+    IMAGE_SCALE = int(os.environ.get('IMAGE_SCALE', 2))
+    IMAGE_RENDER_WORKERS = int(os.environ.get('IMAGE_RENDER_WORKERS', os.cpu_count() or 1))
+    
+    # 准入控制配置（限制同一主机并发处理的大文件数量）
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_MAX_HEAVY_JOBS = int(os.environ.get('ADMISSION_MAX_HEAVY_JOBS', 1))
+    ADMISSION_HEAVY_THRESHOLD_MB = int(os.environ.get('ADMISSION_HEAVY_THRESHOLD_MB', 200))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 2))
+    ADMISSION_SLOT_DIR = os.environ.get('ADMISSION_SLOT_DIR', '/tmp/pay-fail-web-admission')
+    ADMISSION_BYTES_PER_ROW = int(os.environ.get('ADMISSION_BYTES_PER_ROW', 6000))
+    ADMISSION_SECONDS_PER_1K_ROWS = float(os.environ.get('ADMISSION_SECONDS_PER_1K_ROWS', 2))
+    
+    # worker预热配置（gunicorn post_fork时用模拟数据跑一遍处理流程）
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+    
+    # 处理进度推送配置
+    PROGRESS_MIN_INTERVAL = float(os.environ.get('PROGRESS_MIN_INTERVAL', 0.25))
+    PROGRESS_STREAM_TIMEOUT = float(os.environ.get('PROGRESS_STREAM_TIMEOUT', 300))
+    # 进度文件在该时间内仍未出现时先结束连接（上传还在传输时浏览器会按retry自动重连）
+    PROGRESS_START_TIMEOUT = float(os.environ.get('PROGRESS_START_TIMEOUT', 5))
+    
+    # 渐进式报告心跳：后台线程每 REPORT_HEARTBEAT_INTERVAL 秒写一次状态，
+    # 超过 REPORT_HEARTBEAT_TIMEOUT 秒没有心跳（或本机进程已退出）的报告按失败处理
+    REPORT_HEARTBEAT_INTERVAL = float(os.environ.get('REPORT_HEARTBEAT_INTERVAL', 10))
+    REPORT_HEARTBEAT_TIMEOUT = float(os.environ.get('REPORT_HEARTBEAT_TIMEOUT', 60))
+    
+    # 日志配置（worker只写队列，由单一监听线程批量写文件并按大小/时间轮转）
+    LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_ROTATE_HOURS = float(os.environ.get('LOG_ROTATE_HOURS', 24))
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 7))
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 200))
+    LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', 0.5))
+    
+    # 管理接口令牌（请求头 X-Admin-Token），未设置时请求分析等管理功能不可用
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    
+    # 请求采样分析的采样间隔（秒）
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+    
+    # 收件目录自动处理配置（分支机构把导出文件放到共享目录后自动处理）
+    INGEST_ENABLED = os.environ.get('INGEST_ENABLED', 'false').lower() == 'true'
+    INGEST_INBOX = os.environ.get('INGEST_INBOX', 'inbox')
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+    INGEST_POLL_INTERVAL = float(os.environ.get('INGEST_POLL_INTERVAL', 2))
+    INGEST_SETTLE_SECONDS = float(os.environ.get('INGEST_SETTLE_SECONDS', 5))
+    
+    # 历史汇总配置（每次处理的各层级汇总保存到SQLite，供趋势查询）
+    HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', 'true').lower() == 'true'
+    HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', 'data/history.db')
+    HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', 730))
+    
+    # 搜索索引配置（透视表完成后为最近一次报告建立客户/业务经理/团队及拼音首字母索引）
+    SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'true').lower() == 'true'
+    
+    # 下载配置：send_file 由worker发送；x-accel / x-sendfile 只返回响应头，由前置nginx/Apache发送文件
+    DOWNLOAD_MODE = os.environ.get('DOWNLOAD_MODE', 'send_file').lower()
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-output/')
+    # 下载令牌有效期（秒），多实例部署时需设置相同的 SECRET_KEY
+    DOWNLOAD_TOKEN_TTL = int(os.environ.get('DOWNLOAD_TOKEN_TTL', 3600))
+    
+    # 存储后端配置：local 为本地目录；s3 为S3兼容对象存储（AWS S3、MinIO），多节点共用输出文件和快照（需 pip install boto3）
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local').lower()
+    STORAGE_S3_BUCKET = os.environ.get('STORAGE_S3_BUCKET', '')
+    STORAGE_S3_PREFIX = os.environ.get('STORAGE_S3_PREFIX', 'pay-fail-web/')
+    STORAGE_S3_ENDPOINT = os.environ.get('STORAGE_S3_ENDPOINT', '')
+    STORAGE_S3_REGION = os.environ.get('STORAGE_S3_REGION', '')
+    STORAGE_PART_SIZE_MB = int(os.environ.get('STORAGE_PART_SIZE_MB', 8))
+    STORAGE_CACHE_DIR = os.environ.get('STORAGE_CACHE_DIR', 'output/.storage-cache')
+    STORAGE_CACHE_MAX_MB = int(os.environ.get('STORAGE_CACHE_MAX_MB', 1024))
+    
+    # 文件清理与分级保留配置：上传文件、日志和其他临时文件保留 CLEANUP_DAYS 天；
+    # 输出报告（xlsx/zip）保留 RETENTION_HOT_HOURS 小时后转入冷存储（output/cold），RETENTION_COLD_DAYS 天后删除（为0时不转入冷存储直接删除）
+    CLEANUP_DAYS = float(os.environ.get('CLEANUP_DAYS', 1))
+    CLEANUP_INTERVAL_MINUTES = float(os.environ.get('CLEANUP_INTERVAL_MINUTES', 60))
+    # 每轮清理转入冷存储的读写量上限（MB），超出的报告留到下一轮
+    CLEANUP_IO_BUDGET_MB = int(os.environ.get('CLEANUP_IO_BUDGET_MB', 256))
+    RETENTION_HOT_HOURS = float(os.environ.get('RETENTION_HOT_HOURS', 24))
+    RETENTION_COLD_DAYS = float(os.environ.get('RETENTION_COLD_DAYS', 30))
+    # 冷存储压缩：xz（标准库）或 zstd（需 pip install zstandard）；COLD_LEVEL 为0时使用各算法的默认级别
+    COLD_CODEC = os.environ.get('COLD_CODEC', 'xz').lower()
+    COLD_LEVEL = int(os.environ.get('COLD_LEVEL', 0))
+    
+    # 数据质量检查：预处理时统计金额无法识别、分组列为空、团队属于多个直营中心、客户UID对应多个姓名等问题，在 stats['数据质量'] 中返回
+    DATA_QUALITY_ENABLED = os.environ.get('DATA_QUALITY_ENABLED', 'true').lower() == 'true'
+    DATA_QUALITY_SAMPLE_ROWS = int(os.environ.get('DATA_QUALITY_SAMPLE_ROWS', 5))
+    # 发现问题时在下载文件中增加"数据质量"工作表（单个工作簿输出）
+    DATA_QUALITY_SHEET = os.environ.get('DATA_QUALITY_SHEET', 'false').lower() == 'true'
+    
+    # 增量处理配置（上次处理结果的快照目录，不在自动清理范围内）
+    SNAPSHOT_FOLDER = os.environ.get('SNAPSHOT_FOLDER', 'snapshots')
+    # 同一主机上各worker保存快照时互斥使用的锁文件
+    SNAPSHOT_LOCK_FILE = os.environ.get('SNAPSHOT_LOCK_FILE', '/tmp/pay-fail-web-snapshot.lock')
+    
     # 排序配置
     SORT_CONFIG = {
         '团队排序': True,
@@ -38,3 +160,4 @@ class Config:
         Path(Config.UPLOAD_FOLDER).mkdir(exist_ok=True)
         Path(Config.OUTPUT_FOLDER).mkdir(exist_ok=True)
         Path('logs').mkdir(exist_ok=True)
+        Path(Config.SNAPSHOT_FOLDER).mkdir(exist_ok=True)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据质量检查
+预处理时顺带统计会让报告悄悄出错的数据问题，结果放在处理结果的 stats['数据质量'] 中（可选写入下载文件的"数据质量"工作表）：
+- 应还款金额不是数字或为空：to_numeric 转换失败后按0计算（复用预处理的转换结果，只检查转换失败的行）
+- 直营中心/团队/业务经理/客户姓名为空：透视表按这些列分组，空值行不计入透视表
+- 同一团队属于多个直营中心：透视表按团队映射直营中心，只会归入其中一个
+- 同一客户UID对应多个客户姓名：去重客户数按UID计算，各姓名下的金额却分开显示
+
+没有问题时只做一次按 直营中心/团队/业务经理 的分组计数（组数只与业务经理数有关）和客户UID/姓名去重，
+示例行只在发现问题时才从数据中取出。
+"""
+
+import numbers
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import Config
+
+# 检查项代码 -> 说明（数量的单位见说明）
+QUALITY_CHECKS = {
+    'amount_invalid': '应还款金额不是数字，已按0计算',
+    'amount_blank': '应还款金额为空，已按0计算',
+    'center_blank': '所属直营中心为空，未计入透视表',
+    'team_blank': '所属团队为空，未计入透视表',
+    'manager_blank': '所属业务经理为空，未计入透视表',
+    'customer_blank': '客户姓名为空，未计入透视表',
+    'team_multi_center': '同一团队属于多个直营中心，透视表中只归入其中一个（数量为涉及的行数）',
+    'uid_multi_name': '同一客户UID对应多个客户姓名（数量为客户UID个数）',
+}
+
+# 分组列为空的检查项
+BLANK_CHECKS = {
+    '所属直营中心': 'center_blank',
+    '所属团队': 'team_blank',
+    '所属业务经理': 'manager_blank',
+}
+
+# 示例行中显示的列
+SAMPLE_COLUMNS = ['所属直营中心', '所属团队', '所属业务经理', '客户姓名', '客户UID', '应还款金额']
+
+
+def _is_blank(values: pd.Series) -> pd.Series:
+    """空值或只含空白字符（.str 对非字符串值返回空值，数字不算空白）"""
+    blank = values.isna()
+    if values.dtype == object or isinstance(values.dtype, (pd.StringDtype, pd.CategoricalDtype)):
+        stripped = values.str.strip() if not isinstance(values.dtype, pd.CategoricalDtype) else values.astype(object).str.strip()
+        blank |= stripped.eq('').fillna(False).astype(bool)
+    return blank
+
+
+def _json_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (int, float, bool, str)):
+        return value
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class DataQualityProfile:
+    """一次处理的数据质量检查结果（分块/多工作表读取时各部分的结果可合并）"""
+
+    def __init__(self, sample_rows: int = None, aggregated: bool = False):
+        """
+        Args:
+            sample_rows (int): 每个检查项保留的示例行数，默认 DATA_QUALITY_SAMPLE_ROWS
+            aggregated (bool): 分组列检查在按客户聚合后的数据上进行（CSV/多工作表导入），数量为客户明细行数，示例不含行号
+        """
+        self.sample_rows = Config.DATA_QUALITY_SAMPLE_ROWS if sample_rows is None else sample_rows
+        self.aggregated = aggregated
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[Dict]] = {}
+        self.details: Dict[str, List[Dict]] = {}
+
+    @property
+    def has_issues(self) -> bool:
+        return any(self.counts.values())
+
+    def _add(self, code: str, count: int, rows: pd.DataFrame = None, row_numbers: bool = True, **context):
+        if not count:
+            return
+        self.counts[code] = self.counts.get(code, 0) + int(count)
+        samples = self.samples.setdefault(code, [])
+        if rows is None or len(samples) >= self.sample_rows:
+            return
+        columns = [col for col in SAMPLE_COLUMNS if col in rows.columns]
+        for index, row in rows.head(self.sample_rows - len(samples))[columns].iterrows():
+            sample = dict(context)
+            if row_numbers and isinstance(index, numbers.Integral):
+                # 原始数据的RangeIndex对应Excel/CSV中的行号（第1行为表头）
+                sample['行号'] = index + 2
+            sample.update({col: _json_value(row[col]) for col in columns})
+            samples.append(sample)
+
+    def check_amounts(self, df: pd.DataFrame, raw: pd.Series, numeric: pd.Series, **context):
+        """
+        金额转换结果检查（在 fillna(0) 之前调用）
+
+        Args:
+            df (pd.DataFrame): 转换前的数据（取示例行的其他列）
+            raw (pd.Series): 原始应还款金额
+            numeric (pd.Series): pd.to_numeric(raw, errors='coerce') 的结果
+            **context: 写入示例行的附加信息（如工作表名称）
+        """
+        failed = numeric.isna()
+        if not failed.any():
+            return
+        failed_index = failed.index[failed.to_numpy()]
+        blank = _is_blank(raw.loc[failed_index])
+        rows = df.loc[failed_index]
+        self._add('amount_blank', int(blank.sum()), rows[blank.to_numpy()], **context)
+        self._add('amount_invalid', int((~blank).sum()), rows[~blank.to_numpy()], **context)
+
+    def check_keys(self, df: pd.DataFrame):
+        """分组列检查：空值、团队属于多个直营中心、客户UID对应多个客户姓名"""
+        row_numbers = not self.aggregated
+        group_columns = [col for col in BLANK_CHECKS if col in df.columns]
+        if group_columns:
+            # 一次分组计数，之后的检查都在组上进行
+            groups = df.groupby(group_columns, dropna=False, observed=True, sort=False).size()
+            keys = groups.index.to_frame(index=False)
+            keys['行数'] = groups.to_numpy()
+            for col in group_columns:
+                blank_keys = _is_blank(keys[col])
+                count = int(keys.loc[blank_keys, '行数'].sum())
+                if count:
+                    blank_values = keys.loc[blank_keys, col]
+                    rows = df[df[col].isna() | df[col].isin(blank_values.dropna())]
+                    self._add(BLANK_CHECKS[col], count, rows, row_numbers=row_numbers)
+
+            if '所属团队' in keys.columns and '所属直营中心' in keys.columns:
+                pairs = keys[~_is_blank(keys['所属团队']) & ~_is_blank(keys['所属直营中心'])]
+                pairs = pairs.groupby(['所属团队', '所属直营中心'], observed=True, sort=False)['行数'].sum().reset_index()
+                conflicts = pairs[pairs['所属团队'].duplicated(keep=False)]
+                if len(conflicts):
+                    teams = conflicts['所属团队'].unique()
+                    # 每个团队在每个直营中心下各取一行作为示例
+                    rows = df[df['所属团队'].isin(teams)].drop_duplicates(['所属团队', '所属直营中心'])
+                    self._add('team_multi_center', int(conflicts['行数'].sum()), rows, row_numbers=row_numbers)
+                    shown = conflicts[conflicts['所属团队'].isin(teams[:self.sample_rows])]
+                    self.details['team_multi_center'] = [
+                        {'所属团队': _json_value(team),
+                         '直营中心': {str(center): int(rows) for center, rows in zip(team_rows['所属直营中心'], team_rows['行数'])}}
+                        for team, team_rows in shown.groupby('所属团队', observed=True, sort=False)
+                    ]
+
+        if '客户姓名' in df.columns:
+            blank = _is_blank(df['客户姓名'])
+            if blank.any():
+                self._add('customer_blank', int(blank.sum()), df[blank], row_numbers=row_numbers)
+
+        if '客户UID' in df.columns and '客户姓名' in df.columns:
+            # 去重保留首次出现的行，示例行号即该组合首次出现的位置
+            pairs = df[['客户UID', '客户姓名']].dropna().drop_duplicates()
+            duplicated = pairs['客户UID'].duplicated(keep=False)
+            if duplicated.any():
+                rows = df.loc[pairs.index[duplicated.to_numpy()]].sort_values('客户UID', key=lambda x: x.astype(str))
+                self._add('uid_multi_name', int(pairs.loc[duplicated, '客户UID'].nunique()), rows, row_numbers=row_numbers)
+
+    def merge(self, other: Optional['DataQualityProfile']):
+        """合并另一部分（数据块/工作表）的检查结果"""
+        if other is None:
+            return
+        for code, count in other.counts.items():
+            self.counts[code] = self.counts.get(code, 0) + count
+            samples = self.samples.setdefault(code, [])
+            samples.extend(other.samples.get(code, [])[:max(0, self.sample_rows - len(samples))])
+        for code, details in other.details.items():
+            merged = self.details.setdefault(code, [])
+            merged.extend(details[:max(0, self.sample_rows - len(merged))])
+
+    def to_stats(self) -> Dict:
+        """处理结果 stats['数据质量']：只列出发现问题的检查项"""
+        issues = []
+        for code, description in QUALITY_CHECKS.items():
+            if not self.counts.get(code):
+                continue
+            issue = {'检查项': code, '说明': description, '数量': self.counts[code], '示例': self.samples.get(code, [])}
+            if code in self.details:
+                issue['明细'] = self.details[code]
+            issues.append(issue)
+        stats = {'问题数': len(issues), '检查项': issues}
+        if self.aggregated:
+            stats['说明'] = '分组列检查在按客户聚合后的明细上进行，数量为客户明细行数'
+        return stats
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """"数据质量"工作表：每个检查项一行汇总，后接示例行"""
+        records = []
+        for issue in self.to_stats()['检查项']:
+            records.append({'检查项': issue['说明'], '数量': issue['数量']})
+            for sample in issue['示例']:
+                records.append({'检查项': '', '数量': None, **sample})
+        columns = ['检查项', '数量', '工作表', '行号'] + SAMPLE_COLUMNS
+        frame = pd.DataFrame.from_records(records)
+        return frame[[col for col in columns if col in frame.columns]]
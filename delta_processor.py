@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量处理服务
+将新上传的数据与上次保存的快照按客户对比，只对受影响的直营中心重新计算透视表和预览表格，
+未变化的直营中心直接复用快照中的透视表行和预览结构，并生成"与上次相比"的变化摘要
+"""
+
+import os
+import json
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from config import Config
+import storage
+from excel_processor import excel_service
+
+try:
+    import fcntl
+except ImportError:  # Windows开发环境：退化为进程内锁
+    fcntl = None
+
+# 快照格式变化时递增，旧快照将被忽略
+SNAPSHOT_VERSION = 1
+
+# 影响透视表结果的列，任一列变化即视为客户数据变化
+PIVOT_COLUMNS = ['所属直营中心', '所属团队', '所属业务经理', '客户姓名', '客户UID', '应还款金额']
+
+
+class DeltaProcessorService:
+    """增量处理服务"""
+
+    # 变化摘要中列出的客户明细数量上限
+    SAMPLE_LIMIT = 50
+
+    def __init__(self, snapshot_dir: str = None):
+        """
+        初始化增量处理服务
+
+        Args:
+            snapshot_dir (str): 快照目录，默认使用快照存储后端（本地为 Config.SNAPSHOT_FOLDER，不在自动清理范围内）
+        """
+        self.storage = storage.LocalStorage(snapshot_dir) if snapshot_dir else storage.get_storage('snapshots')
+        self.service = excel_service
+        self.lock_path = Path(snapshot_dir) / '.snapshot.lock' if snapshot_dir else Path(Config.SNAPSHOT_LOCK_FILE)
+        self._local_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 增量处理
+    # ------------------------------------------------------------------
+    def process_excel_incremental(self, input_path: str, output_dir: str = None, output_mode: str = 'single') -> Dict:
+        """
+        增量处理Excel文件：对比快照、局部重算、生成预览和下载文件，并保存为新快照
+
+        没有可用快照（首次运行或列结构变化）时按全量处理，结果同样保存为快照
+        """
+        try:
+            result = {
+                'success': False,
+                'message': '',
+                'preview_data': {},
+                'changes': {},
+                'output_file': None,
+                'stats': {},
+                'errors': []
+            }
+
+            if output_dir is None:
+                output_dir = Config.OUTPUT_FOLDER
+
+            print(f"📁 正在增量处理文件: {input_path}")
+
+            # 第1步：读取、验证和预处理（与全量流程一致）
+            df, validation_result = self.service._read_and_validate_excel(input_path)
+            if not validation_result['success']:
+                result['errors'] = validation_result['errors']
+                result['message'] = validation_result['message']
+                return result
+
+            result['stats']['原始数据行数'] = validation_result.get('rows_read', len(df))
+            result['stats']['检测到的列'] = list(df.columns)
+            quality = self.service._quality_profile_for(validation_result)
+            df = self.service._preprocess_data(df, quality)
+
+            # 第2步：与快照对比
+            key_column = self._key_column(df)
+            row_hashes = self._customer_hashes(df, key_column)
+            snapshot = self.load_snapshot()
+
+            if snapshot is None or not self._is_compatible(snapshot, df, key_column):
+                print("   ⚠️  没有可用的快照，按全量处理")
+                pivot_table = self.service._create_pivot_table_full_logic(df)
+                preview_data = self.service._generate_preview_data(pivot_table)
+                changes = {'baseline': True, 'key_column': key_column}
+                recomputed_centers = list(preview_data.keys())
+            else:
+                changed_keys = self._diff_customers(snapshot['hashes'], row_hashes)
+                affected_centers = self._affected_centers(df, snapshot['df'], key_column, changed_keys)
+                changed_count = sum(len(keys) for keys in changed_keys.values())
+                print(f"   ✅ 对比完成：{changed_count} 位客户变化，影响 {len(affected_centers)} 个直营中心")
+
+                pivot_table, preview_data = self._merge_with_snapshot(df, snapshot, affected_centers)
+                changes = self._summarize_changes(snapshot, df, pivot_table, key_column, row_hashes, changed_keys)
+                recomputed_centers = [center for center in preview_data if center in affected_centers]
+
+            changes['recomputed_centers'] = recomputed_centers
+            changes['reused_centers'] = len(preview_data) - len(recomputed_centers)
+
+            self.service._publish_search_index(pivot_table, input_path)
+
+            # 第3步：生成下载文件并保存新快照
+            output_file = self.service._save_output(df, pivot_table, output_dir, output_mode, quality)
+            self.save_snapshot(df, pivot_table, preview_data, row_hashes, key_column)
+
+            result.update({
+                'success': True,
+                'message': '增量处理完成',
+                'preview_data': preview_data,
+                'changes': changes,
+                'output_file': output_file,
+                'history_run_id': self.service._record_history(df, pivot_table, input_path),
+                'stats': {
+                    **result['stats'],
+                    '透视表行数': len(pivot_table),
+                    '直营中心数量': len(preview_data),
+                    '重新计算的直营中心数量': len(recomputed_centers),
+                    '总金额': float(df['应还款金额'].sum()),
+                    '处理时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    **self.service._quality_stats(quality)
+                }
+            })
+
+            return result
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'处理文件时发生错误: {str(e)}',
+                'preview_data': {},
+                'changes': {},
+                'output_file': None,
+                'stats': {},
+                'errors': [str(e), traceback.format_exc()]
+            }
+
+    @staticmethod
+    def _key_column(df: pd.DataFrame) -> str:
+        """客户对比键：有客户UID时用UID，否则用客户姓名（与透视表去重字段一致）"""
+        return '客户UID' if '客户UID' in df.columns else '客户姓名'
+
+    @staticmethod
+    def _pivot_columns(df: pd.DataFrame) -> List[str]:
+        return [column for column in PIVOT_COLUMNS if column in df.columns]
+
+    def _customer_hashes(self, df: pd.DataFrame, key_column: str) -> pd.Series:
+        """
+        每位客户一个内容哈希：各行哈希按客户求和（与行顺序无关），一次向量化计算
+        """
+        row_hashes = pd.util.hash_pandas_object(df[self._pivot_columns(df)], index=False)
+        keys = df[key_column].astype(str).where(df[key_column].notna(), '<空>')
+        return row_hashes.groupby(keys.values, sort=False).sum()
+
+    def _is_compatible(self, snapshot: Dict, df: pd.DataFrame, key_column: str) -> bool:
+        """透视表字段和对比键一致时快照才可复用"""
+        meta = snapshot['meta']
+        return (meta.get('version') == SNAPSHOT_VERSION
+                and meta.get('key_column') == key_column
+                and meta.get('pivot_columns') == self._pivot_columns(df)
+                and '所属直营中心' in df.columns)
+
+    @staticmethod
+    def _diff_customers(old_hashes: pd.Series, new_hashes: pd.Series) -> Dict[str, Set[str]]:
+        """按客户哈希对比，返回新增、删除和变化的客户键"""
+        old_keys = set(old_hashes.index)
+        new_keys = set(new_hashes.index)
+        common = old_hashes.index.intersection(new_hashes.index)
+        modified = common[old_hashes[common].values != new_hashes[common].values]
+        return {
+            'added': new_keys - old_keys,
+            'removed': old_keys - new_keys,
+            'modified': set(modified),
+        }
+
+    @staticmethod
+    def _affected_centers(df: pd.DataFrame, old_df: pd.DataFrame, key_column: str,
+                          changed_keys: Dict[str, Set[str]]) -> Set[str]:
+        """
+        受影响的直营中心：
+        1. 变化客户在新旧数据中所在的直营中心
+        2. 包含变化客户所属团队或业务经理的直营中心（去重客户数变化会改变这些中心内的排序）
+        3. 与以上中心共用团队的直营中心（透视表按团队映射直营中心，跨中心团队需一起重算）
+        """
+        keys = changed_keys['added'] | changed_keys['removed'] | changed_keys['modified']
+        if not keys:
+            return set()
+
+        affected, teams, managers = set(), set(), set()
+        for frame in (old_df, df):
+            frame_keys = frame[key_column].astype(str).where(frame[key_column].notna(), '<空>')
+            changed_rows = frame[frame_keys.isin(keys)]
+            affected.update(changed_rows['所属直营中心'].unique())
+            teams.update(changed_rows['所属团队'].unique())
+            managers.update(changed_rows['所属业务经理'].unique())
+
+        # 团队、业务经理与直营中心的对应关系（新旧数据合并）
+        links = pd.concat([
+            frame[['所属直营中心', '所属团队', '所属业务经理']].drop_duplicates()
+            for frame in (old_df, df)
+        ]).drop_duplicates()
+        affected.update(links.loc[
+            links['所属团队'].isin(teams) | links['所属业务经理'].isin(managers), '所属直营中心'
+        ])
+
+        # 按团队求闭包
+        while True:
+            shared_teams = set(links.loc[links['所属直营中心'].isin(affected), '所属团队'])
+            expanded = set(links.loc[links['所属团队'].isin(shared_teams), '所属直营中心'])
+            if expanded <= affected:
+                return affected
+            affected |= expanded
+
+    def _recompute_subset(self, df: pd.DataFrame, affected_centers: Set[str]) -> pd.DataFrame:
+        """
+        只对受影响直营中心重新计算透视表
+
+        除这些中心的数据外，还带上其业务经理在其他中心的数据，使业务经理去重客户数与全量计算一致；
+        其他中心的透视表行不完整，由调用方丢弃
+        """
+        in_affected = df['所属直营中心'].isin(affected_centers)
+        managers = df.loc[in_affected, '所属业务经理'].unique()
+        subset = df[in_affected | df['所属业务经理'].isin(managers)]
+        return self.service._create_pivot_table_full_logic(subset)
+
+    def _merge_with_snapshot(self, df: pd.DataFrame, snapshot: Dict, affected_centers: Set[str]):
+        """受影响的直营中心重新计算透视表和预览，其余直营中心沿用快照，按新数据的直营中心顺序拼接"""
+        old_pivot = snapshot['pivot']
+        old_preview = snapshot['preview']
+
+        if affected_centers:
+            new_pivot = self._recompute_subset(df, affected_centers)
+            new_pivot = new_pivot[new_pivot['所属直营中心'].isin(affected_centers)]
+            new_preview = self.service._generate_preview_data(new_pivot)
+        else:
+            new_pivot = old_pivot.iloc[0:0]
+            new_preview = {}
+
+        sections = []
+        preview_data = {}
+        for center in df['所属直营中心'].unique():
+            if center in affected_centers:
+                section = new_pivot[new_pivot['所属直营中心'] == center]
+                if center in new_preview:
+                    preview_data[center] = new_preview[center]
+            else:
+                section = old_pivot[old_pivot['所属直营中心'] == center]
+                if center in old_preview:
+                    preview_data[center] = old_preview[center]
+            sections.append(section)
+
+        pivot_table = pd.concat(sections, ignore_index=True) if sections else old_pivot.iloc[0:0]
+        return pivot_table, preview_data
+
+    def _summarize_changes(self, snapshot: Dict, df: pd.DataFrame, pivot_table: pd.DataFrame, key_column: str,
+                           row_hashes: pd.Series, changed_keys: Dict[str, Set[str]]) -> Dict:
+        """生成变化摘要：客户增删改数量、各直营中心金额变化、部分客户明细"""
+        old_totals = {c['name']: c for c in self.service._generate_center_summary(snapshot['pivot'])}
+        new_totals = {c['name']: c for c in self.service._generate_center_summary(pivot_table)}
+
+        centers = []
+        for name in list(new_totals) + [n for n in old_totals if n not in new_totals]:
+            old_amount = old_totals.get(name, {}).get('total_amount', 0)
+            new_amount = new_totals.get(name, {}).get('total_amount', 0)
+            old_rows = old_totals.get(name, {}).get('row_count', 0)
+            new_rows = new_totals.get(name, {}).get('row_count', 0)
+            if old_amount == new_amount and old_rows == new_rows and name in old_totals and name in new_totals:
+                continue
+            centers.append({
+                'name': name,
+                'status': 'added' if name not in old_totals else 'removed' if name not in new_totals else 'changed',
+                'old_amount': old_amount,
+                'new_amount': new_amount,
+                'amount_delta': round(new_amount - old_amount, 2),
+                'row_delta': new_rows - old_rows,
+            })
+
+        def 客户金额(frame: pd.DataFrame, keys: Set[str]) -> Dict[str, Dict]:
+            frame_keys = frame[key_column].astype(str).where(frame[key_column].notna(), '<空>')
+            selected = frame[frame_keys.isin(keys)]
+            grouped = selected.groupby(frame_keys[selected.index], sort=False).agg(
+                客户姓名=('客户姓名', 'first'), 直营中心=('所属直营中心', 'first'), 金额=('应还款金额', 'sum')
+            )
+            return grouped.to_dict('index')
+
+        sample_keys = set()
+        for change_type in ('added', 'removed', 'modified'):
+            sample_keys.update(sorted(changed_keys[change_type])[:self.SAMPLE_LIMIT])
+        old_customers = 客户金额(snapshot['df'], sample_keys)
+        new_customers = 客户金额(df, sample_keys)
+
+        customers = []
+        for change_type in ('added', 'removed', 'modified'):
+            for key in sorted(changed_keys[change_type])[:self.SAMPLE_LIMIT]:
+                old = old_customers.get(key, {})
+                new = new_customers.get(key, {})
+                customers.append({
+                    'key': key,
+                    'change': change_type,
+                    '客户姓名': new.get('客户姓名', old.get('客户姓名')),
+                    '直营中心': new.get('直营中心', old.get('直营中心')),
+                    'old_amount': float(old.get('金额', 0)),
+                    'new_amount': float(new.get('金额', 0)),
+                })
+
+        return {
+            'baseline': False,
+            'key_column': key_column,
+            'previous_run': snapshot['meta'].get('created_at'),
+            'customers_added': len(changed_keys['added']),
+            'customers_removed': len(changed_keys['removed']),
+            'customers_modified': len(changed_keys['modified']),
+            'customers_unchanged': len(row_hashes) - len(changed_keys['added']) - len(changed_keys['modified']),
+            'total_amount_delta': round(float(df['应还款金额'].sum()) - float(snapshot['df']['应还款金额'].sum()), 2),
+            'centers': centers,
+            'customers': customers[:self.SAMPLE_LIMIT],
+        }
+
+    # ------------------------------------------------------------------
+    # 快照存储（先写入新目录，再原子替换 current.json 指针，多worker/多节点读取安全）
+    #
+    # 同一主机上的保存通过文件锁串行：只在新快照比当前指针更新时替换指针，
+    # 只删除比上一个指针更早的快照目录，其他上传正在写入的目录和读取中的上一个快照都保留到下次保存
+    # ------------------------------------------------------------------
+    POINTER_KEY = 'current.json'
+
+    @contextmanager
+    def _save_lock(self):
+        """主机级快照保存锁（文件锁，worker被杀时由内核自动释放）"""
+        with self._local_lock:
+            if fcntl is None:
+                yield
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _read_pointer(self) -> Optional[Dict]:
+        try:
+            return json.loads(self.storage.read_bytes(self.POINTER_KEY))
+        except (OSError, ValueError):
+            return None
+
+    def load_snapshot(self) -> Optional[Dict]:
+        """读取当前快照，不存在或损坏时返回None（S3存储时pickle文件经本地缓存读取）"""
+        try:
+            meta = json.loads(self.storage.read_bytes(self.POINTER_KEY))
+            preview = json.loads(self.storage.read_bytes(f"{meta['dir']}/preview.json"))
+            frames = {}
+            for name in ('data', 'pivot', 'hashes'):
+                path = self.storage.local_path(f"{meta['dir']}/{name}.pkl")
+                if path is None:
+                    raise FileNotFoundError(f"{meta['dir']}/{name}.pkl")
+                frames[name] = pd.read_pickle(path)
+            return {
+                'meta': meta,
+                'df': frames['data'],
+                'pivot': frames['pivot'],
+                'hashes': frames['hashes'],
+                'preview': preview,
+            }
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"   ⚠️  快照读取失败: {e}")
+            return None
+
+    def save_snapshot(self, df: pd.DataFrame, pivot_table: pd.DataFrame, preview_data: Dict,
+                      row_hashes: pd.Series, key_column: str):
+        """保存本次结果为新快照（快照文件全部写完后才替换指针），并删除上一个快照之前的旧快照"""
+        created_at = datetime.now()
+        dir_name = f"{created_at.strftime('%Y%m%d_%H%M%S_%f')}_{os.urandom(4).hex()}"
+
+        for name, frame in (('data', df), ('pivot', pivot_table), ('hashes', row_hashes)):
+            with self.storage.open_write(f"{dir_name}/{name}.pkl") as f:
+                frame.to_pickle(f)
+        self.storage.write_bytes(
+            f"{dir_name}/preview.json",
+            json.dumps(preview_data, ensure_ascii=False, default=str).encode('utf-8')
+        )
+
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'dir': dir_name,
+            'key_column': key_column,
+            'pivot_columns': self._pivot_columns(df),
+            'rows': len(df),
+            'customers': len(row_hashes),
+            'created_at': created_at.isoformat(timespec='seconds'),
+        }
+        with self._save_lock():
+            previous = self._read_pointer()
+            previous_dir = previous.get('dir') if previous else None
+            if previous_dir and previous_dir > dir_name:
+                # 同时进行的另一次上传已发布了更新的快照，本次快照作废
+                self._delete_snapshot_dir(dir_name)
+                print(f"   ⚠️  已有更新的快照 {previous_dir}，本次快照未发布")
+                return
+            self.storage.write_bytes(self.POINTER_KEY, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+            # 删除早于上一个快照的目录：上一个快照可能仍在被读取，更新的目录可能仍在写入
+            if previous_dir:
+                for key in self.storage.list_keys():
+                    snapshot_dir = key.split('/', 1)[0]
+                    if key != self.POINTER_KEY and '/' in key and snapshot_dir < previous_dir:
+                        self.storage.delete(key)
+        print(f"   ✅ 快照已保存: {self.storage.location(dir_name)}")
+
+    def _delete_snapshot_dir(self, dir_name: str):
+        for key in self.storage.list_keys(f"{dir_name}/"):
+            self.storage.delete(key)
+
+# 全局增量处理服务实例
+delta_service = DeltaProcessorService()
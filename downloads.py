@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载文件服务
+下载链接使用带有效期的签名令牌（不再暴露原始文件名），按 DOWNLOAD_MODE 返回文件：
+- send_file: 由worker直接发送（gunicorn对真实文件使用内核sendfile，但传输期间一直占用worker线程）
+- x-accel: 只返回 X-Accel-Redirect 响应头，由前置nginx从内部location发送文件，worker线程立即释放
+- x-sendfile: 只返回 X-Sendfile 响应头（Apache mod_xsendfile）
+已转入冷存储的报告总是由worker边解压边发送。
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from flask import current_app, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.utils import send_file
+
+from config import Config
+import storage
+from cold_archive import cold_archive
+
+DOWNLOAD_MODES = ('send_file', 'x-accel', 'x-sendfile')
+
+# 下载文件类型
+DOWNLOAD_MIMETYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.zip': 'application/zip'
+}
+
+TOKEN_SALT = 'pay-fail-web.download'
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(Config.SECRET_KEY, salt=TOKEN_SALT)
+
+
+def make_download_token(filename: str) -> str:
+    """为输出目录中的文件生成下载令牌"""
+    return _serializer().dumps(filename)
+
+
+def resolve_download_token(token: str) -> Optional[str]:
+    """
+    校验下载令牌
+
+    Returns:
+        str: 令牌对应的文件名；签名无效或已超过 DOWNLOAD_TOKEN_TTL 秒时返回None
+    """
+    try:
+        filename = _serializer().loads(token, max_age=Config.DOWNLOAD_TOKEN_TTL)
+    except (BadSignature, SignatureExpired):
+        return None
+    return filename if is_safe_filename(filename) else None
+
+
+def is_safe_filename(filename) -> bool:
+    """只允许输出目录下的文件名（不含路径）"""
+    return (
+        isinstance(filename, str) and bool(filename)
+        and filename not in ('.', '..')
+        and os.path.basename(filename) == filename
+        and '\\' not in filename
+    )
+
+
+def output_file_path(filename: str) -> Optional[Path]:
+    """
+    输出文件的本地路径（S3存储时为下载到本地缓存后的路径），不存在时返回None
+
+    使用绝对路径：send_file会将相对路径解析到应用根目录而非工作目录
+    """
+    path = storage.get_storage('output').local_path(filename)
+    return Path(os.path.abspath(path)) if path is not None else None
+
+
+def build_download_response(file_path: Path, download_name: str, mode: str = None):
+    """
+    按下载模式生成文件响应
+
+    三种模式共用werkzeug的响应头（Content-Disposition中文文件名、Content-Length、ETag、条件请求），
+    x-accel/x-sendfile模式响应体为空，由前置服务器按响应头发送文件
+    """
+    mode = mode or Config.DOWNLOAD_MODE
+    if mode not in DOWNLOAD_MODES:
+        raise ValueError(f'不支持的下载模式: {mode}')
+    accel_path = os.path.relpath(file_path, os.path.abspath(Config.OUTPUT_FOLDER))
+    if mode == 'x-accel' and accel_path.startswith('..'):
+        # nginx内部location只映射输出目录（S3缓存目录在输出目录之外时由worker发送）
+        mode = 'send_file'
+
+    response = send_file(
+        str(file_path),
+        request.environ,
+        mimetype=DOWNLOAD_MIMETYPES.get(file_path.suffix.lower(), 'application/octet-stream'),
+        as_attachment=True,
+        download_name=download_name,
+        use_x_sendfile=mode != 'send_file',
+        response_class=current_app.response_class,
+    )
+    # 响应头只能是latin-1，中文文件名需URL编码（nginx和mod_xsendfile都会解码）
+    if mode == 'x-accel':
+        # nginx按内部location映射到输出目录
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = (
+            Config.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(Path(accel_path).as_posix())
+        )
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = quote(str(file_path))
+    return response
+
+
+def build_cold_download_response(filename: str):
+    """
+    冷存储中报告的下载响应：边解压边重新打包，由worker以分块传输发送（无Content-Length，不支持断点续传）
+
+    Returns:
+        Response: 报告不在冷存储中时返回None
+    """
+    stream = cold_archive.open_restored(filename)
+    if stream is None:
+        return None
+    return send_file(
+        stream,
+        request.environ,
+        mimetype=DOWNLOAD_MIMETYPES.get(Path(filename).suffix.lower(), 'application/octet-stream'),
+        as_attachment=True,
+        download_name=filename,
+        conditional=False,
+        response_class=current_app.response_class,
+    )
@@ -9,12 +9,24 @@ import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
+import io
 import os
+import re
+import json
+import codecs
+import zipfile
 import warnings
+from concurrent.futures import as_completed
 from datetime import datetime
 import traceback
 from typing import Dict, List, Tuple, Optional
 from config import Config
+import progress
+import process_pool
+from archive_names import unique_archive_name
+import storage
+import xlsx_reader
+from data_quality import DataQualityProfile
 
 # 忽略警告
 warnings.filterwarnings('ignore')
@@ -22,8 +34,17 @@ warnings.filterwarnings('ignore')
 class ExcelProcessorService:
     """Excel处理服务类 - 与原始版本保持一致"""
     
-    def __init__(self):
+    # 省内存模式下转为分类类型的低基数列（业务经理在贷后BP替换后再转换）
+    CATEGORY_COLUMNS = ['所属直营中心', '所属团队']
+    
+    def __init__(self, memory_mode: str = None):
+        """
+        Args:
+            memory_mode (str): standard 或 arrow，默认读取 Config.MEMORY_MODE
+        """
         self.config = Config()
+        self.memory_mode = (memory_mode or self.config.MEMORY_MODE) == 'arrow'
+        self.string_dtype = _arrow_string_dtype() if self.memory_mode else None
     
     def process_excel_for_preview(self, input_path: str) -> Dict:
         """
@@ -47,14 +68,16 @@ class ExcelProcessorService:
                 result['message'] = validation_result['message']
                 return result
             
-            result['stats']['原始数据行数'] = len(df)
+            result['stats']['原始数据行数'] = validation_result.get('rows_read', len(df))
             result['stats']['检测到的列'] = list(df.columns)
             
-            # 第2步：数据预处理
-            df = self._preprocess_data(df)
+            # 第2步：数据预处理（同时检查数据质量）
+            quality = self._quality_profile_for(validation_result)
+            df = self._preprocess_data(df, quality)
             
             # 第3步：创建透视表
             pivot_table = self._create_pivot_table_full_logic(df)
+            self._publish_search_index(pivot_table, input_path)
             
             # 第4步：按直营中心分组预览数据
             preview_data = self._generate_preview_data(pivot_table)
@@ -63,12 +86,14 @@ class ExcelProcessorService:
                 'success': True,
                 'message': '数据处理完成',
                 'preview_data': preview_data,
+                'history_run_id': self._record_history(df, pivot_table, input_path),
                 'stats': {
                     **result['stats'],
                     '透视表行数': len(pivot_table),
                     '直营中心数量': len(preview_data),
                     '总金额': float(df['应还款金额'].sum()),
-                    '处理时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    '处理时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    **self._quality_stats(quality)
                 }
             })
             
@@ -114,6 +139,7 @@ class ExcelProcessorService:
             }
         
         print(f"   ✅ 生成Excel风格预览数据完成，包含 {len(preview_data)} 个直营中心")
+        progress.report('preview', centers=len(preview_data))
         
         return preview_data
     
@@ -202,9 +228,12 @@ class ExcelProcessorService:
         
         return table_structure
 
-    def process_excel_file(self, input_path: str, output_dir: str = None) -> Dict:
+    def process_excel_file(self, input_path: str, output_dir: str = None, record_history: bool = False) -> Dict:
         """
         处理Excel文件的主要方法 - 完全复制原始逻辑
+        
+        Args:
+            record_history (bool): 保存汇总到历史库并更新搜索索引（Web上传已在预览阶段保存，只有收件目录等独立入口需要）
         """
         try:
             result = {
@@ -227,27 +256,32 @@ class ExcelProcessorService:
                 result['message'] = validation_result['message']
                 return result
             
-            result['stats']['原始数据行数'] = len(df)
+            result['stats']['原始数据行数'] = validation_result.get('rows_read', len(df))
             result['stats']['检测到的列'] = list(df.columns)
             
-            # 第2步：数据预处理
-            df = self._preprocess_data(df)
+            # 第2步：数据预处理（同时检查数据质量）
+            quality = self._quality_profile_for(validation_result)
+            df = self._preprocess_data(df, quality)
             
             # 第3步：创建透视表（使用原始完整逻辑）
             pivot_table = self._create_pivot_table_full_logic(df)
+            if record_history:
+                self._publish_search_index(pivot_table, input_path, background=False)
             
             # 第4步：生成输出文件
-            output_file = self._save_to_excel_full_style(df, pivot_table, output_dir)
+            output_file = self._save_to_excel_full_style(df, pivot_table, output_dir, quality)
             
             result.update({
                 'success': True,
                 'message': '文件处理完成',
                 'output_file': output_file,
+                'history_run_id': self._record_history(df, pivot_table, input_path) if record_history else None,
                 'stats': {
                     **result['stats'],
                     '透视表行数': len(pivot_table),
                     '直营中心数量': df['所属直营中心'].nunique() if '所属直营中心' in df.columns else 0,
-                    '总金额': float(df['应还款金额'].sum())
+                    '总金额': float(df['应还款金额'].sum()),
+                    **self._quality_stats(quality)
                 }
             })
             
@@ -262,6 +296,319 @@ class ExcelProcessorService:
                 'errors': [str(e), traceback.format_exc()]
             }
     
+    def process_excel_by_center(self, input_path: str, output_dir: str = None) -> Dict:
+        """
+        按直营中心拆分输出 - 每个直营中心单独一个工作簿，多进程并行渲染后打包为zip
+        """
+        try:
+            result = {
+                'success': False,
+                'message': '',
+                'output_file': None,
+                'stats': {},
+                'errors': []
+            }
+            
+            if output_dir is None:
+                output_dir = self.config.OUTPUT_FOLDER
+            
+            print(f"📁 正在按直营中心拆分处理文件: {input_path}")
+            
+            # 第1步：读取和验证Excel文件
+            df, validation_result = self._read_and_validate_excel(input_path)
+            if not validation_result['success']:
+                result['errors'] = validation_result['errors']
+                result['message'] = validation_result['message']
+                return result
+            
+            result['stats']['原始数据行数'] = validation_result.get('rows_read', len(df))
+            result['stats']['检测到的列'] = list(df.columns)
+            
+            # 第2步：数据预处理（同时检查数据质量）
+            quality = self._quality_profile_for(validation_result)
+            df = self._preprocess_data(df, quality)
+            
+            # 第3步：创建透视表（使用原始完整逻辑）
+            pivot_table = self._create_pivot_table_full_logic(df)
+            
+            if '所属直营中心' not in pivot_table.columns:
+                result['message'] = '数据中没有所属直营中心信息，无法按直营中心拆分'
+                result['errors'].append(result['message'])
+                return result
+            
+            # 第4步：并行渲染各直营中心工作簿并写入zip
+            output_file = self._save_center_workbooks_zip(pivot_table, output_dir, quality)
+            
+            result.update({
+                'success': True,
+                'message': '文件处理完成',
+                'output_file': output_file,
+                'stats': {
+                    **result['stats'],
+                    '透视表行数': len(pivot_table),
+                    '直营中心数量': pivot_table['所属直营中心'].nunique(),
+                    '总金额': float(df['应还款金额'].sum()),
+                    **self._quality_stats(quality)
+                }
+            })
+            
+            return result
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'处理文件时发生错误: {str(e)}',
+                'output_file': None,
+                'stats': {},
+                'errors': [str(e), traceback.format_exc()]
+            }
+    
+    def process_excel_summary(self, input_path: str) -> Tuple[Dict, Optional[pd.DataFrame], Optional[pd.DataFrame],
+                                                              Optional[DataQualityProfile]]:
+        """
+        渐进式处理第一阶段：读取、预处理并创建透视表，直接由透视表汇总各直营中心金额和行数
+
+        预览表格和Excel文件由调用方用返回的数据和透视表继续生成，无需重新读取文件
+
+        Returns:
+            tuple: (结果字典, 预处理后的数据, 透视表, 数据质量检查结果)，失败时后三项为None
+        """
+        try:
+            result = {
+                'success': False,
+                'message': '',
+                'summary': [],
+                'stats': {},
+                'errors': []
+            }
+            
+            print(f"📁 正在渐进式处理文件: {input_path}")
+            
+            # 第1步：读取和验证Excel文件
+            df, validation_result = self._read_and_validate_excel(input_path)
+            if not validation_result['success']:
+                result['errors'] = validation_result['errors']
+                result['message'] = validation_result['message']
+                return result, None, None, None
+            
+            result['stats']['原始数据行数'] = validation_result.get('rows_read', len(df))
+            result['stats']['检测到的列'] = list(df.columns)
+            
+            # 第2步：数据预处理（同时检查数据质量）
+            quality = self._quality_profile_for(validation_result)
+            df = self._preprocess_data(df, quality)
+            
+            # 第3步：创建透视表
+            pivot_table = self._create_pivot_table_full_logic(df)
+            self._publish_search_index(pivot_table, input_path)
+            
+            # 第4步：各直营中心汇总
+            summary = self._generate_center_summary(pivot_table)
+            
+            result.update({
+                'success': True,
+                'message': '汇总完成，正在生成预览表格和Excel文件',
+                'summary': summary,
+                'history_run_id': self._record_history(df, pivot_table, input_path),
+                'stats': {
+                    **result['stats'],
+                    '透视表行数': len(pivot_table),
+                    '直营中心数量': len(summary),
+                    '总金额': float(df['应还款金额'].sum()),
+                    '处理时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    **self._quality_stats(quality)
+                }
+            })
+            
+            return result, df, pivot_table, quality
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'处理文件时发生错误: {str(e)}',
+                'summary': [],
+                'stats': {},
+                'errors': [str(e), traceback.format_exc()]
+            }, None, None, None
+    
+    def process_json(self, stream, data_format: str = 'ndjson', source: str = 'api', **kwargs) -> Dict:
+        """
+        处理结构化数据（/api/process）：直接从NDJSON或列式JSON构建DataFrame，不经过Excel编码和解析
+
+        Args:
+            stream: 请求体（二进制文件对象）
+            data_format (str): ndjson（每行一个JSON对象）或 columns（列式JSON）
+            source (str): 数据来源名称（写入历史库和搜索索引）
+            **kwargs: 传给 process_dataframe 的输出选项
+
+        Returns:
+            dict: 与 process_dataframe 相同
+        """
+        print(f"📥 正在处理结构化数据: {source}（{data_format}）")
+        df, validation_result = self._read_and_validate_json(stream, data_format)
+        if not validation_result['success']:
+            return {
+                'success': False,
+                'message': validation_result['message'],
+                'preview_data': {},
+                'output_file': None,
+                'stats': {},
+                'errors': validation_result['errors']
+            }
+        return self.process_dataframe(df, source=source, rows_read=validation_result['rows_read'], **kwargs)
+    
+    def process_dataframe(self, df: pd.DataFrame, source: str = 'api', output_dir: str = None,
+                          preview: bool = True, workbook: bool = True, output_mode: str = 'single',
+                          rows_read: int = None) -> Dict:
+        """
+        处理已在内存中的数据：预处理、透视表，按需生成预览数据和输出文件（透视表只计算一次）
+
+        Args:
+            df (pd.DataFrame): 包含必要列的原始数据
+            source (str): 数据来源名称（写入历史库和搜索索引）
+            output_dir (str): 输出目录，默认为 OUTPUT_FOLDER
+            preview (bool): 是否生成预览数据
+            workbook (bool): 是否生成输出文件
+            output_mode (str): single 为单个工作簿，split 为分中心压缩包
+            rows_read (int): 原始行数（默认为df行数）
+
+        Returns:
+            dict: {'success', 'message', 'preview_data', 'output_file', 'stats', 'errors', 'history_run_id'}
+        """
+        try:
+            result = {
+                'success': False,
+                'message': '',
+                'preview_data': {},
+                'output_file': None,
+                'stats': {},
+                'errors': []
+            }
+            
+            if output_dir is None:
+                output_dir = self.config.OUTPUT_FOLDER
+            
+            # 第1步：验证必要列
+            validation_result = self._validate_dataframe(df)
+            if not validation_result['success']:
+                result['errors'] = validation_result['errors']
+                result['message'] = validation_result['message']
+                return result
+            
+            result['stats']['原始数据行数'] = rows_read if rows_read is not None else len(df)
+            result['stats']['检测到的列'] = list(df.columns)
+            
+            # 第2步：数据预处理（同时检查数据质量）
+            quality = self._quality_profile_for(validation_result)
+            df = self._preprocess_data(df, quality)
+            
+            # 第3步：创建透视表
+            pivot_table = self._create_pivot_table_full_logic(df)
+            self._publish_search_index(pivot_table, source)
+            
+            # 第4步：预览数据和输出文件共用同一个透视表
+            if preview:
+                result['preview_data'] = self._generate_preview_data(pivot_table)
+            if workbook:
+                result['output_file'] = self._save_output(df, pivot_table, output_dir, output_mode, quality)
+            
+            result.update({
+                'success': True,
+                'message': '数据处理完成',
+                'history_run_id': self._record_history(df, pivot_table, source),
+                'stats': {
+                    **result['stats'],
+                    '透视表行数': len(pivot_table),
+                    '直营中心数量': df['所属直营中心'].nunique() if '所属直营中心' in df.columns else 0,
+                    '总金额': float(df['应还款金额'].sum()),
+                    '处理时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    **self._quality_stats(quality)
+                }
+            })
+            
+            return result
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'处理数据时发生错误: {str(e)}',
+                'preview_data': {},
+                'output_file': None,
+                'stats': {},
+                'errors': [str(e), traceback.format_exc()]
+            }
+    
+    def _new_quality_profile(self, aggregated: bool = False) -> Optional[DataQualityProfile]:
+        """新的数据质量检查结果，DATA_QUALITY_ENABLED关闭时返回None"""
+        return DataQualityProfile(aggregated=aggregated) if self.config.DATA_QUALITY_ENABLED else None
+    
+    def _quality_profile_for(self, validation_result: Dict) -> Optional[DataQualityProfile]:
+        """分块/多工作表读取时金额已在读取阶段检查，沿用读取阶段的结果"""
+        if 'quality' in validation_result:
+            return validation_result['quality']
+        return self._new_quality_profile()
+    
+    @staticmethod
+    def _quality_stats(quality: Optional[DataQualityProfile]) -> Dict:
+        return {'数据质量': quality.to_stats()} if quality is not None else {}
+    
+    @staticmethod
+    def _print_quality(quality: DataQualityProfile):
+        stats = quality.to_stats()
+        if not stats['问题数']:
+            print("   ✅ 数据质量检查未发现问题")
+            return
+        print(f"   ⚠️  数据质量检查发现 {stats['问题数']} 类问题：")
+        for issue in stats['检查项']:
+            print(f"     - {issue['说明']}: {issue['数量']}")
+    
+    def _record_history(self, df: pd.DataFrame, pivot_table: pd.DataFrame, input_path: str) -> Optional[int]:
+        """保存本次处理的各层级汇总到历史库，失败不影响处理结果"""
+        if not self.config.HISTORY_ENABLED:
+            return None
+        try:
+            from history_store import history_store
+            run_id = history_store.record_run(df, pivot_table, source=os.path.basename(input_path))
+            print(f"   ✅ 历史汇总已保存（运行ID: {run_id}）")
+            return run_id
+        except Exception as e:
+            print(f"   ⚠️  保存历史汇总失败: {e}")
+            return None
+    
+    def _publish_search_index(self, pivot_table: pd.DataFrame, input_path: str, background: bool = True):
+        """用本次透视表更新最近报告的搜索索引（/api/search），失败不影响处理结果"""
+        if not self.config.SEARCH_ENABLED:
+            return
+        try:
+            from search_index import search_index
+            search_index.publish(pivot_table, source=os.path.basename(input_path), background=background)
+        except Exception as e:
+            print(f"   ⚠️  更新搜索索引失败: {e}")
+    
+    def _generate_center_summary(self, pivot_table: pd.DataFrame) -> List[Dict]:
+        """按透视表中的直营中心顺序汇总金额和行数（与预览数据的 total_amount / row_count 一致）"""
+        if '所属直营中心' not in pivot_table.columns:
+            return [{
+                'name': '数据预览',
+                'total_amount': float(pivot_table['应还款金额'].sum()) if '应还款金额' in pivot_table.columns else 0,
+                'row_count': len(pivot_table)
+            }]
+        
+        汇总 = pivot_table.groupby('所属直营中心', sort=False, observed=True)['应还款金额'].agg(['sum', 'size'])
+        return [
+            {'name': center, 'total_amount': float(row['sum']), 'row_count': int(row['size'])}
+            for center, row in 汇总.iterrows()
+        ]
+    
+    def _save_output(self, df: pd.DataFrame, pivot_table: pd.DataFrame, output_dir: str, output_mode: str = 'single',
+                     quality: DataQualityProfile = None) -> str:
+        """按输出模式保存已计算好的透视表：single为单个工作簿，split为分中心压缩包"""
+        if output_mode == 'split':
+            if '所属直营中心' not in pivot_table.columns:
+                raise ValueError('数据中没有所属直营中心信息，无法按直营中心拆分')
+            return self._save_center_workbooks_zip(pivot_table, output_dir, quality)
+        return self._save_to_excel_full_style(df, pivot_table, output_dir, quality)
+    
     def _read_and_validate_excel(self, file_path: str) -> Tuple[pd.DataFrame, Dict]:
         """读取并验证Excel文件"""
         result = {'success': False, 'message': '', 'errors': []}
@@ -274,14 +621,21 @@ class ExcelProcessorService:
             
             file_ext = os.path.splitext(file_path)[1].lower()
             if file_ext not in self.config.ALLOWED_EXTENSIONS:
-                result['message'] = f'不支持的文件格式: {file_ext}，请使用 .xlsx 或 .xls 格式'
+                result['message'] = f'不支持的文件格式: {file_ext}，请使用 {" / ".join(sorted(self.config.ALLOWED_EXTENSIONS))} 格式'
                 result['errors'].append(result['message'])
                 return None, result
             
+            if file_ext in ('.csv', '.tsv'):
+                return self._read_and_validate_csv(file_path, sep='\t' if file_ext == '.tsv' else ',')
+            
+            if self.config.EXCEL_SHEET_MODE == 'all':
+                return self._read_and_validate_sheets(file_path)
+            
             # 读取Excel文件
             print("   正在读取Excel文件...")
-            df = pd.read_excel(file_path)
+            df = xlsx_reader.read_excel(file_path, on_progress=lambda rows: progress.report('read', rows_read=rows))
             print(f"   ✅ 成功读取 {len(df)} 行数据")
+            progress.report('read', rows_read=len(df))
             
             if len(df) == 0:
                 result['message'] = 'Excel文件为空'
@@ -292,61 +646,376 @@ class ExcelProcessorService:
             print(f"   文件包含的列: {list(df.columns)}")
             
             # 验证必要列
-            missing_columns = [col for col in self.config.REQUIRED_COLUMNS if col not in df.columns]
+            validation_result = self._validate_dataframe(df)
+            if not validation_result['success']:
+                return None, validation_result
+            
+            result['success'] = True
+            result['message'] = f'成功读取 {len(df)} 行数据'
+            
+            return df, result
+            
+        except Exception as e:
+            result['message'] = f'读取文件失败: {str(e)}'
+            result['errors'].append(str(e))
+            return None, result
+    
+    def _read_and_validate_csv(self, file_path: str, sep: str = ',') -> Tuple[pd.DataFrame, Dict]:
+        """
+        分块读取并验证CSV/TSV文件
+
+        每块读取后立即完成金额格式化和贷后BP替换，并按客户聚合金额，内存占用只与客户数有关。
+        透视表与Excel路径一致；原始数据工作表为聚合后的客户明细（不含贷后BP等其他列）
+        """
+        result = {'success': False, 'message': '', 'errors': []}
+        
+        try:
+            encoding = self._detect_encoding(file_path)
+            print(f"   正在分块读取CSV文件（编码: {encoding}）...")
+            
+            # 先只读表头验证必要列
+            header = pd.read_csv(file_path, sep=sep, encoding=encoding, nrows=0)
+            columns = [str(col).strip() for col in header.columns]
+            print(f"   文件包含的列: {columns}")
+            missing_columns = [col for col in self.config.REQUIRED_COLUMNS if col not in columns]
             if missing_columns:
                 result['message'] = f'缺少必要的列: {missing_columns}'
                 result['errors'].append(result['message'])
                 return None, result
             
-            # 检查是否有客户UID列
-            if '客户UID' in df.columns:
+            # 只读取处理需要的列，全部按文本读取（保留客户UID前导零），金额在预处理中转换
+            usecols = [col for col in header.columns
+                       if str(col).strip() in self.config.REQUIRED_COLUMNS + self.config.OPTIONAL_COLUMNS]
+            rows_read = 0
+            # 各块的聚合结果先收集起来，每 CSV_AGGREGATE_BATCH 块合并一次，避免每块都重新聚合全部已读数据
+            partials = []
+            batch = max(2, self.config.CSV_AGGREGATE_BATCH)
+            quality = self._new_quality_profile(aggregated=True)
+            for chunk in pd.read_csv(file_path, sep=sep, encoding=encoding, usecols=usecols, dtype=str,
+                                     chunksize=self.config.CSV_CHUNK_ROWS):
+                chunk.columns = [str(col).strip() for col in chunk.columns]
+                rows_read += len(chunk)
+                partials.append(self._aggregate_partial(self._normalize_chunk(chunk, quality)))
+                if len(partials) >= batch:
+                    partials = [self._aggregate_partial(pd.concat(partials, ignore_index=True))]
+                progress.report('read', rows_read=rows_read)
+            
+            aggregated = self._aggregate_partial(pd.concat(partials, ignore_index=True)) if partials else None
+            print(f"   ✅ 成功读取 {rows_read} 行数据，聚合为 {0 if aggregated is None else len(aggregated)} 行客户明细")
+            
+            if not rows_read:
+                result['message'] = 'CSV文件为空'
+                result['errors'].append(result['message'])
+                return None, result
+            
+            if '客户UID' in aggregated.columns:
                 print(f"   ✅ 检测到客户UID列，将用于去重计数")
             else:
                 print(f"   ⚠️  未检测到客户UID列，将使用客户姓名去重计数")
             
             result['success'] = True
-            result['message'] = f'成功读取 {len(df)} 行数据'
+            result['message'] = f'成功读取 {rows_read} 行数据'
+            result['rows_read'] = rows_read  # 聚合前的原始行数，用于统计信息
+            result['quality'] = quality
+            
+            return aggregated, result
+            
+        except Exception as e:
+            result['message'] = f'读取文件失败: {str(e)}'
+            result['errors'].append(str(e))
+            return None, result
+    
+    def _validate_dataframe(self, df: pd.DataFrame) -> Dict:
+        """验证必要列，并提示是否按客户UID去重"""
+        result = {'success': False, 'message': '', 'errors': []}
+        missing_columns = [col for col in self.config.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            result['message'] = f'缺少必要的列: {missing_columns}'
+            result['errors'].append(result['message'])
+            return result
+        
+        # 检查是否有客户UID列
+        if '客户UID' in df.columns:
+            print(f"   ✅ 检测到客户UID列，将用于去重计数")
+        else:
+            print(f"   ⚠️  未检测到客户UID列，将使用客户姓名去重计数")
+        
+        result['success'] = True
+        return result
+    
+    def _read_and_validate_json(self, stream, data_format: str = 'ndjson') -> Tuple[pd.DataFrame, Dict]:
+        """
+        读取NDJSON或列式JSON
+
+        - ndjson: 每行一个JSON对象，逐行读取，只保留必要列和可选列（按列收集，不保留每行的字典）
+        - columns: {"列名": [值, ...], ...} 或 {"columns": [列名, ...], "data": [[值, ...], ...]}
+
+        值按原样保留（客户UID可为字符串或数字），金额在预处理中转换；原始数据工作表与Excel路径一样为逐行明细
+        """
+        result = {'success': False, 'message': '', 'errors': []}
+        needed = self.config.REQUIRED_COLUMNS + self.config.OPTIONAL_COLUMNS
+        
+        try:
+            if data_format == 'ndjson':
+                print("   正在逐行读取NDJSON...")
+                columns = {col: [] for col in needed}
+                present = []
+                rows_read = 0
+                for line_number, line in enumerate(stream, 1):
+                    if line_number == 1:
+                        line = line.removeprefix(codecs.BOM_UTF8)
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        result['message'] = f'第 {line_number} 行不是有效的JSON: {e}'
+                        result['errors'].append(result['message'])
+                        return None, result
+                    if not isinstance(record, dict):
+                        result['message'] = f'第 {line_number} 行不是JSON对象'
+                        result['errors'].append(result['message'])
+                        return None, result
+                    for col, values in columns.items():
+                        values.append(record.get(col))
+                    if len(present) < len(columns):
+                        present.extend(col for col in record if col in columns and col not in present)
+                    rows_read += 1
+                    if rows_read % self.config.CSV_CHUNK_ROWS == 0:
+                        progress.report('read', rows_read=rows_read)
+                # 只保留至少出现在一行中的列，按首次出现的顺序（与Excel中的列一致，缺少的必要列由验证报告）
+                df = pd.DataFrame({col: columns[col] for col in present})
+            elif data_format == 'columns':
+                print("   正在读取列式JSON...")
+                payload = json.loads(stream.read().removeprefix(codecs.BOM_UTF8))
+                if isinstance(payload, dict) and isinstance(payload.get('columns'), list) and 'data' in payload:
+                    df = pd.DataFrame(payload['data'], columns=[str(col).strip() for col in payload['columns']])
+                elif isinstance(payload, dict) and all(isinstance(values, list) for values in payload.values()):
+                    df = pd.DataFrame({str(col).strip(): values for col, values in payload.items()})
+                else:
+                    result['message'] = '列式JSON应为 {"列名": [值, ...]} 或 {"columns": [...], "data": [[...], ...]}'
+                    result['errors'].append(result['message'])
+                    return None, result
+                del payload
+                df = df[[col for col in df.columns if col in needed]]
+                rows_read = len(df)
+            else:
+                result['message'] = f'不支持的数据格式: {data_format}，请使用 ndjson 或 columns'
+                result['errors'].append(result['message'])
+                return None, result
+            
+            print(f"   ✅ 成功读取 {rows_read} 行数据")
+            progress.report('read', rows_read=rows_read)
+            
+            if not rows_read:
+                result['message'] = '数据为空'
+                result['errors'].append(result['message'])
+                return None, result
+            
+            print(f"   数据包含的列: {list(df.columns)}")
+            result['success'] = True
+            result['message'] = f'成功读取 {rows_read} 行数据'
+            result['rows_read'] = rows_read
             
             return df, result
             
+        except ValueError as e:
+            result['message'] = f'读取数据失败: {str(e)}'
+            result['errors'].append(str(e))
+            return None, result
+    
+    def _read_and_validate_sheets(self, file_path: str) -> Tuple[pd.DataFrame, Dict]:
+        """
+        多工作表模式：读取所有包含必要列的工作表，每个工作表在独立进程中解析并按客户聚合，
+        再合并各部分结果（保留客户UID/姓名，跨工作表的去重客户数不变）
+
+        原始数据工作表与CSV路径一样为聚合后的客户明细
+        """
+        result = {'success': False, 'message': '', 'errors': []}
+        
+        try:
+            # 只读表头找出包含必要列的工作表
+            with pd.ExcelFile(file_path) as workbook:
+                sheet_names = workbook.sheet_names
+                matched = []
+                for sheet_name in sheet_names:
+                    header = workbook.parse(sheet_name, nrows=0)
+                    columns = {str(col).strip() for col in header.columns}
+                    if all(col in columns for col in self.config.REQUIRED_COLUMNS):
+                        matched.append(sheet_name)
+            skipped = [name for name in sheet_names if name not in matched]
+            print(f"   共 {len(sheet_names)} 个工作表，{len(matched)} 个包含必要列: {matched}")
+            if skipped:
+                print(f"   ⚠️  跳过缺少必要列的工作表: {skipped}")
+            
+            if not matched:
+                result['message'] = f'没有包含必要列的工作表: {self.config.REQUIRED_COLUMNS}'
+                result['errors'].append(result['message'])
+                return None, result
+            
+            needed = self.config.REQUIRED_COLUMNS + self.config.OPTIONAL_COLUMNS
+            max_workers = max(1, min(self.config.SHEET_MAX_WORKERS, len(matched)))
+            print(f"   正在并行读取 {len(matched)} 个工作表（{max_workers} 个进程）...")
+            
+            partials = {}
+            sheet_rows = {}
+            sheet_quality = {}
+            check_quality = self.config.DATA_QUALITY_ENABLED
+            if max_workers == 1:
+                completed = (_read_sheet_partial(file_path, name, needed, check_quality) for name in matched)
+                for sheet_name, rows, partial, quality in completed:
+                    sheet_rows[sheet_name] = rows
+                    partials[sheet_name] = partial
+                    sheet_quality[sheet_name] = quality
+                    progress.report('read', done=len(sheet_rows), total=len(matched), rows_read=sum(sheet_rows.values()))
+            else:
+                with process_pool.new_process_pool(max_workers) as executor:
+                    futures = [executor.submit(_read_sheet_partial, file_path, name, needed, check_quality) for name in matched]
+                    for future in as_completed(futures):
+                        sheet_name, rows, partial, quality = future.result()
+                        sheet_rows[sheet_name] = rows
+                        partials[sheet_name] = partial
+                        sheet_quality[sheet_name] = quality
+                        print(f"     ✅ 工作表 {sheet_name}: {rows} 行")
+                        progress.report('read', done=len(sheet_rows), total=len(matched), rows_read=sum(sheet_rows.values()))
+            
+            rows_read = sum(sheet_rows.values())
+            if not rows_read:
+                result['message'] = 'Excel文件为空'
+                result['errors'].append(result['message'])
+                return None, result
+            
+            # 按工作表顺序合并，客户明细顺序与逐个读取一致
+            aggregated = self._aggregate_partial(pd.concat([partials[name] for name in matched], ignore_index=True))
+            print(f"   ✅ 成功读取 {rows_read} 行数据，聚合为 {len(aggregated)} 行客户明细")
+            
+            if '客户UID' in aggregated.columns:
+                print(f"   ✅ 检测到客户UID列，将用于去重计数")
+            else:
+                print(f"   ⚠️  未检测到客户UID列，将使用客户姓名去重计数")
+            
+            result['success'] = True
+            result['message'] = f'成功读取 {len(matched)} 个工作表共 {rows_read} 行数据'
+            result['rows_read'] = rows_read
+            result['sheets'] = [{'name': name, 'rows': sheet_rows[name]} for name in matched]
+            result['skipped_sheets'] = skipped
+            # 按工作表顺序合并各工作表的金额检查结果
+            quality = self._new_quality_profile(aggregated=True)
+            if quality is not None:
+                for name in matched:
+                    quality.merge(sheet_quality[name])
+            result['quality'] = quality
+            
+            return aggregated, result
+            
         except Exception as e:
             result['message'] = f'读取文件失败: {str(e)}'
             result['errors'].append(str(e))
             return None, result
     
-    def _preprocess_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """数据预处理 - 与原始版本保持一致"""
-        df = df.copy()
+    @staticmethod
+    def _detect_encoding(file_path: str) -> str:
+        """检测CSV编码：UTF-8 BOM -> UTF-8 -> GB18030（兼容GBK/GB2312）"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(256 * 1024)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        try:
+            # 采样可能截断在多字节字符中间，使用增量解码器忽略末尾不完整的字符
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return 'gb18030'
+    
+    def _normalize_chunk(self, chunk: pd.DataFrame, quality: DataQualityProfile = None, **context) -> pd.DataFrame:
+        """分块预处理：金额格式化和贷后BP替换（与 _preprocess_data 一致），之后不再需要贷后BP列"""
+        应还款金额 = pd.to_numeric(chunk['应还款金额'], errors='coerce')
+        if quality is not None:
+            quality.check_amounts(chunk, chunk['应还款金额'], 应还款金额, **context)
+        chunk['应还款金额'] = 应还款金额.fillna(0)
+        if '贷后BP' in chunk.columns:
+            self._apply_post_loan_bp(chunk)
+            chunk = chunk.drop(columns='贷后BP')
+        return chunk
+    
+    @staticmethod
+    def _apply_post_loan_bp(df: pd.DataFrame):
+        """贷后BP非空且不为"无"时替换业务经理（向量化，避免逐行apply）"""
+        有贷后BP = df['贷后BP'].notna() & ~df['贷后BP'].astype(str).str.strip().isin(['无', ''])
+        df['所属业务经理'] = df['贷后BP'].where(有贷后BP, df['所属业务经理'])
+    
+    @staticmethod
+    def _aggregate_partial(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        按 直营中心/团队/业务经理/客户姓名[/客户UID] 聚合金额
+
+        保留客户UID使团队和业务经理的去重客户数不变，可对多个部分结果再次聚合
+        """
+        keys = [col for col in ['所属直营中心', '所属团队', '所属业务经理', '客户姓名', '客户UID'] if col in df.columns]
+        return df.groupby(keys, sort=False, dropna=False, as_index=False)['应还款金额'].sum()
+    
+    def _preprocess_data(self, df: pd.DataFrame, quality: DataQualityProfile = None) -> pd.DataFrame:
+        """
+        数据预处理 - 与原始版本保持一致
+
+        Args:
+            quality (DataQualityProfile): 传入时复用金额转换结果检查数据质量，并在贷后BP替换后检查分组列
+        """
+        # 省内存模式下由类型转换生成新的DataFrame，不再整表复制
+        df = self._to_memory_dtypes(df) if self.memory_mode else df.copy()
+        progress.report('preprocess')
         
         # 处理应还款金额格式
         print("   正在格式化应还款金额...")
-        df['应还款金额'] = pd.to_numeric(df['应还款金额'], errors='coerce').fillna(0)
+        应还款金额 = pd.to_numeric(df['应还款金额'], errors='coerce')
+        if quality is not None:
+            quality.check_amounts(df, df['应还款金额'], 应还款金额)
+        df['应还款金额'] = 应还款金额.fillna(0)
         print(f"   ✅ 应还款金额格式化完成")
         
         # 处理贷后BP逻辑
         if '贷后BP' in df.columns and '所属业务经理' in df.columns:
             print(f"   正在处理贷后BP逻辑...")
-            def 获取业务经理(row):
-                if pd.notna(row['贷后BP']) and str(row['贷后BP']).strip() not in ['无', '']:
-                    return row['贷后BP']
-                else:
-                    return row['所属业务经理']
-            df['所属业务经理'] = df.apply(获取业务经理, axis=1)
+            self._apply_post_loan_bp(df)
             print(f"   ✅ 贷后BP逻辑处理完成")
         
+        if self.memory_mode and '所属业务经理' in df.columns:
+            df['所属业务经理'] = df['所属业务经理'].astype('category')
+        
+        if quality is not None:
+            quality.check_keys(df)
+            self._print_quality(quality)
+        
         # 应用排序
         df = self._sort_data(df)
         
         return df
     
+    def _to_memory_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """省内存模式：直营中心/团队转为分类类型，其余文本列转为pyarrow字符串（astype不复制未转换的列）"""
+        dtypes = {}
+        for col in df.columns:
+            # 只转换纯文本列，混有数字的列（如部分客户UID为数字）保持原样，保证输出一致
+            if col == '应还款金额' or pd.api.types.infer_dtype(df[col], skipna=True) != 'string':
+                continue
+            if col in self.CATEGORY_COLUMNS:
+                dtypes[col] = 'category'
+            elif self.string_dtype is not None:
+                dtypes[col] = self.string_dtype
+        return df.astype(dtypes, copy=False)
+    
     def _sort_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """数据排序 - 完整的原始逻辑"""
         print("   正在对原始数据进行排序...")
         try:
             from pypinyin import pinyin, Style
-            df['拼音排序键'] = df['所属直营中心'].apply(
-                lambda x: ''.join([p[0] for p in pinyin(str(x), style=Style.NORMAL)])
-            )
+            # 直营中心数量很少，每个中心只计算一次拼音
+            拼音映射 = {
+                x: ''.join([p[0] for p in pinyin(str(x), style=Style.NORMAL)])
+                for x in df['所属直营中心'].unique()
+            }
+            # 排序键固定为object类型，保证不同内存模式下的排序结果一致
+            df['拼音排序键'] = df['所属直营中心'].map(拼音映射).astype(object)
             df = df.sort_values('拼音排序键', ascending=True)
             df = df.drop('拼音排序键', axis=1)
             print("   ✅ 使用拼音排序完成")
@@ -354,7 +1023,7 @@ class ExcelProcessorService:
             for i, 直营中心 in enumerate(df['所属直营中心'].unique()[:5]):
                 print(f"     {i+1}. {直营中心}")
         except ImportError:
-            df = df.sort_values('所属直营中心', ascending=True)
+            df = df.sort_values('所属直营中心', ascending=True, key=lambda x: x.astype(object))
             print("   ⚠️  使用Unicode排序（建议安装pypinyin获得更好的中文排序）")
         
         return df
@@ -377,7 +1046,8 @@ class ExcelProcessorService:
             values=['应还款金额'],
             index=存在的透视表行字段,
             aggfunc={'应还款金额': 'sum'},
-            fill_value=0
+            fill_value=0,
+            observed=True  # 分类类型只保留实际出现的组合
         ).reset_index()
         
         # 扁平化列名
@@ -397,11 +1067,11 @@ class ExcelProcessorService:
             去重字段 = '客户UID' if '客户UID' in df.columns else '客户姓名'
             
             # 按团队分组，计算去重后的客户数量
-            团队统计 = df.groupby('所属团队')[去重字段].nunique().reset_index()
+            团队统计 = df.groupby('所属团队', observed=True)[去重字段].nunique().reset_index()
             团队统计.columns = ['所属团队', '团队客户数量']
             
             # 按业务经理分组，计算去重后的客户数量
-            业务经理统计 = df.groupby('所属业务经理')[去重字段].nunique().reset_index()
+            业务经理统计 = df.groupby('所属业务经理', observed=True)[去重字段].nunique().reset_index()
             业务经理统计.columns = ['所属业务经理', '业务经理客户数量']
             
             # 将统计信息合并到透视表
@@ -440,11 +1110,13 @@ class ExcelProcessorService:
             透视表 = 透视表.drop(['直营中心顺序键', '团队客户数量', '业务经理客户数量', '团队排序键'], axis=1)
         
         print(f"   ✅ 透视表排序逻辑应用完成")
+        progress.report('pivot', pivot_rows=len(透视表))
         
         return 透视表
     
-    def _save_to_excel_full_style(self, df: pd.DataFrame, pivot_table: pd.DataFrame, output_dir: str) -> str:
-        """保存到Excel文件 - 完整样式"""
+    def _save_to_excel_full_style(self, df: pd.DataFrame, pivot_table: pd.DataFrame, output_dir: str,
+                                  quality: DataQualityProfile = None) -> str:
+        """保存到Excel文件 - 完整样式（DATA_QUALITY_SHEET开启且发现数据问题时增加"数据质量"工作表）"""
         # 生成输出文件名
         current_time = datetime.now()
         sheet_name = f"{current_time.month:02d}{current_time.day:02d}{current_time.hour:02d}{current_time.minute:02d}"
@@ -453,29 +1125,97 @@ class ExcelProcessorService:
         base_name = "扣款失败信息处理"
         timestamp = current_time.strftime('%Y%m%d_%H%M%S')
         output_filename = f"{base_name}_{timestamp}.xlsx"
-        output_path = os.path.join(output_dir, output_filename)
+        output_storage = storage.for_output_dir(output_dir)
+        output_path = output_storage.location(output_filename)
         
-        # 保存Excel文件
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            # 透视表工作表
-            pivot_table.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # 原始数据工作表  
-            df.to_excel(writer, sheet_name='原始数据', index=False)
-            
-            # 获取工作簿和工作表
-            workbook = writer.book
-            pivot_ws = workbook[sheet_name]
-            raw_ws = workbook['原始数据']
-            
-            # 应用完整样式
-            self._apply_pivot_table_style_full(pivot_ws, pivot_table)
-            self._apply_raw_data_style_full(raw_ws, df)
+        # 保存Excel文件（流式写入存储后端：本地为临时文件+原子替换，S3为分片上传）
+        with output_storage.open_write(output_filename) as output_stream:
+            with pd.ExcelWriter(output_stream, engine='openpyxl') as writer:
+                # 透视表工作表
+                pivot_table.to_excel(writer, sheet_name=sheet_name, index=False)
+                
+                # 原始数据工作表  
+                df.to_excel(writer, sheet_name='原始数据', index=False)
+                
+                # 获取工作簿和工作表
+                workbook = writer.book
+                pivot_ws = workbook[sheet_name]
+                raw_ws = workbook['原始数据']
+                
+                # 应用完整样式
+                self._apply_pivot_table_style_full(pivot_ws, pivot_table)
+                self._apply_raw_data_style_full(raw_ws, df)
+                
+                # 数据质量工作表
+                if quality is not None and quality.has_issues and self.config.DATA_QUALITY_SHEET:
+                    quality_df = quality.to_dataframe()
+                    quality_df.to_excel(writer, sheet_name='数据质量', index=False)
+                    self._apply_raw_data_style_full(workbook['数据质量'], quality_df)
+            bytes_saved = output_stream.tell()
         
         print(f"   ✅ 文件保存完成: {output_path}")
+        progress.report('saved', force=True, bytes_saved=bytes_saved)
+        
+        return output_path
+    
+    def _save_center_workbooks_zip(self, pivot_table: pd.DataFrame, output_dir: str,
+                                   quality: DataQualityProfile = None) -> str:
+        """
+        按直营中心拆分透视表，多进程并行渲染，按完成顺序流式写入zip
+
+        DATA_QUALITY_SHEET开启且发现数据问题时，压缩包中另附"数据质量.xlsx"（与单个工作簿中的"数据质量"工作表内容相同）
+        """
+        current_time = datetime.now()
+        sheet_name = f"{current_time.month:02d}{current_time.day:02d}{current_time.hour:02d}{current_time.minute:02d}"
+        timestamp = current_time.strftime('%Y%m%d_%H%M%S')
+        output_filename = f"扣款失败信息分中心_{timestamp}.zip"
+        output_storage = storage.for_output_dir(output_dir)
+        output_path = output_storage.location(output_filename)
+        
+        # 保持透视表中的直营中心顺序，每个子进程只拿到自己的切片
+        直营中心列表 = list(pivot_table['所属直营中心'].unique())
+        max_workers = max(1, min(self.config.SPLIT_MAX_WORKERS, len(直营中心列表)))
+        print(f"   正在并行生成 {len(直营中心列表)} 个直营中心工作簿（{max_workers} 个进程）...")
+        # 按透视表顺序预先分配文件名，子进程完成顺序不影响重名时的序号
+        used_names = set()
+        
+        with output_storage.open_write(output_filename) as output_stream, \
+                zipfile.ZipFile(output_stream, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with process_pool.new_process_pool(max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        _render_center_workbook,
+                        center,
+                        pivot_table[pivot_table['所属直营中心'] == center],
+                        sheet_name
+                    ): unique_archive_name(center, used_names, '.xlsx')
+                    for center in 直营中心列表
+                }
+                for future in as_completed(futures):
+                    center, content = future.result()
+                    zf.writestr(futures[future], content)
+                    print(f"     ✅ {center} 工作簿已写入")
+            
+            # 数据质量工作簿（名称在各中心之后分配，与直营中心重名时追加序号）
+            if quality is not None and quality.has_issues and self.config.DATA_QUALITY_SHEET:
+                zf.writestr(unique_archive_name('数据质量', used_names, '.xlsx'), self._quality_workbook_bytes(quality))
+            zf.close()
+            bytes_saved = output_stream.tell()
+        
+        print(f"   ✅ 分中心压缩包保存完成: {output_path}")
+        progress.report('saved', force=True, bytes_saved=bytes_saved)
         
         return output_path
     
+    def _quality_workbook_bytes(self, quality: DataQualityProfile) -> bytes:
+        """数据质量检查结果单独生成工作簿（分中心压缩包使用）"""
+        quality_df = quality.to_dataframe()
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            quality_df.to_excel(writer, sheet_name='数据质量', index=False)
+            self._apply_raw_data_style_full(writer.book['数据质量'], quality_df)
+        return buffer.getvalue()
+    
     def _apply_pivot_table_style_full(self, ws, pivot_table: pd.DataFrame):
         """应用完整的透视表样式"""
         if '所属直营中心' in pivot_table.columns:
@@ -562,7 +1302,10 @@ class ExcelProcessorService:
         )
         
         # 应用样式到所有单元格
+        总行数 = ws.max_row
         for row in range(1, ws.max_row + 1):
+            if row % 500 == 0:
+                progress.report('styling', done=row, total=总行数, sheet=ws.title, sheet_rows_styled=row)
             # 先确定行的类型和高度
             row_type = None
             row_height = None
@@ -743,5 +1486,43 @@ class ExcelProcessorService:
         
         print("     ✅ 单元格合并完成")
 
+def _arrow_string_dtype():
+    """pyarrow字符串类型，未安装pyarrow时返回None（省内存模式只使用分类类型）"""
+    try:
+        import pyarrow  # noqa: F401
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        print("⚠️  未安装pyarrow，省内存模式仅对直营中心/团队/业务经理使用分类类型")
+        return None
+
+
+def _render_center_workbook(center, center_pivot: pd.DataFrame, sheet_name: str) -> Tuple[str, bytes]:
+    """子进程入口：渲染单个直营中心的透视表工作簿，返回xlsx字节"""
+    service = ExcelProcessorService()
+    workbook = openpyxl.Workbook()
+    ws = workbook.active
+    ws.title = sheet_name
+    service._apply_pivot_style_with_center_title_full(ws, center_pivot)
+    
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return center, buffer.getvalue()
+
+def _read_sheet_partial(file_path: str, sheet_name: str, needed: List[str],
+                        check_quality: bool = False) -> Tuple[str, int, pd.DataFrame, Optional[DataQualityProfile]]:
+    """
+    子进程入口：读取单个工作表的处理所需列并按客户聚合
+
+    与CSV路径一样全部按文本读取，不同工作表中同一客户UID（数字/文本）能正确合并；
+    check_quality 为True时同时检查金额，返回该工作表的数据质量检查结果
+    """
+    service = ExcelProcessorService()
+    df = pd.read_excel(file_path, sheet_name=sheet_name, dtype=str,
+                       usecols=lambda col: str(col).strip() in needed)
+    df.columns = [str(col).strip() for col in df.columns]
+    quality = DataQualityProfile(aggregated=True) if check_quality else None
+    partial = service._aggregate_partial(service._normalize_chunk(df, quality, 工作表=sheet_name))
+    return sheet_name, len(df), partial, quality
+
 # 创建全局服务实例
 excel_service = ExcelProcessorService()
\ No newline at end of file
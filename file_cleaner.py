@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 """
 自动文件清理服务
-自动删除超过指定天数的上传和输出文件
+分级保留：
+- 上传文件、日志和其他临时文件超过 CLEANUP_DAYS 天后删除
+- 输出报告（xlsx/zip）超过 RETENTION_HOT_HOURS 小时后转入冷存储（见cold_archive），
+  冷存储中的报告在原文件生成 RETENTION_COLD_DAYS 天后删除
+每轮转入冷存储的读写量不超过 CLEANUP_IO_BUDGET_MB，按时间从旧到新处理，剩余的留到下一轮。
 """
 
 import os
@@ -12,42 +16,60 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
+from config import Config
+from log_pipeline import active_log_files
+from cold_archive import cold_archive, ColdArchiveError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 class FileCleanerService:
     """文件自动清理服务"""
     
-    def __init__(self, cleanup_days=1):
+    def __init__(self, cleanup_days=None, hot_hours=None, cold_days=None, io_budget_mb=None):
         """
         初始化清理服务
         
         Args:
-            cleanup_days (int): 文件保留天数，默认1天
+            cleanup_days (float): 上传文件、日志等的保留天数，默认使用 CLEANUP_DAYS
+            hot_hours (float): 输出报告转入冷存储前的保留小时数，默认使用 RETENTION_HOT_HOURS
+            cold_days (float): 输出报告（含冷存储）的保留天数，默认使用 RETENTION_COLD_DAYS，为0时不转入冷存储
+            io_budget_mb (int): 每轮转入冷存储的读写量上限（MB），默认使用 CLEANUP_IO_BUDGET_MB
         """
-        self.cleanup_days = cleanup_days
-        self.cleanup_interval = 24 * 3600  # 每24小时运行一次
+        self.cleanup_days = cleanup_days if cleanup_days is not None else Config.CLEANUP_DAYS
+        self.hot_hours = hot_hours if hot_hours is not None else Config.RETENTION_HOT_HOURS
+        self.cold_days = cold_days if cold_days is not None else Config.RETENTION_COLD_DAYS
+        self.io_budget = (io_budget_mb if io_budget_mb is not None else Config.CLEANUP_IO_BUDGET_MB) * 1024 * 1024
+        self.cleanup_interval = Config.CLEANUP_INTERVAL_MINUTES * 60
         self.running = False
         self.cleanup_thread = None
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = {}
         
         # 需要清理的目录
         self.cleanup_dirs = [
             'uploads',
-            'output', 
+            Config.OUTPUT_FOLDER,
             'logs'
         ]
         
         # 需要清理的文件扩展名
-        self.cleanup_extensions = {'.xlsx', '.xls', '.log', '.tmp'}
-        
+        self.cleanup_extensions = {'.xlsx', '.xls', '.csv', '.tsv', '.zip', '.png', '.json', '.log', '.tmp'}
+    
     def start(self):
         """启动自动清理服务"""
         if self.running:
             return
-            
+        
         self.running = True
         self.cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self.cleanup_thread.start()
-        logger.info(f"🧹 文件清理服务已启动，将每{self.cleanup_days}天清理一次旧文件")
+        logger.info(f"🧹 文件清理服务已启动，每{self.cleanup_interval / 60:g}分钟清理一次"
+                    f"（{self._describe_policy()}）")
         
         # 立即执行一次清理
         self._cleanup_old_files()
@@ -71,14 +93,42 @@ class FileCleanerService:
                 
                 if self.running:
                     self._cleanup_old_files()
-                    
+            
             except Exception as e:
                 logger.error(f"❌ 清理循环出错: {e}")
                 time.sleep(60)  # 出错后等待1分钟再试
     
+    def _describe_policy(self):
+        if self.cold_days > 0:
+            return (f"临时文件保留{self.cleanup_days:g}天，报告{self.hot_hours:g}小时后转入冷存储，"
+                    f"{self.cold_days:g}天后删除")
+        return f"临时文件保留{self.cleanup_days:g}天，报告保留{self.hot_hours:g}小时"
+    
+    def _acquire_sweep_lock(self):
+        """同一时间只允许一个进程清理（gunicorn主进程定时清理和worker处理后触发的清理可能重叠）"""
+        output_dir = Path(Config.OUTPUT_FOLDER)
+        output_dir.mkdir(exist_ok=True)
+        lock_file = open(output_dir / '.cleanup.lock', 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        return lock_file
+    
     def _cleanup_old_files(self):
-        """清理超过指定天数的旧文件"""
+        """按分级保留策略清理一轮"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        lock_file = None
         try:
+            lock_file = self._acquire_sweep_lock()
+            if lock_file is None:
+                logger.info("🧹 其他进程正在清理，跳过本轮")
+                return
+            
+            start = time.perf_counter()
             cutoff_time = datetime.now() - timedelta(days=self.cleanup_days)
             total_cleaned = 0
             total_size = 0
@@ -96,57 +146,174 @@ class FileCleanerService:
                 if cleaned_count > 0:
                     logger.info(f"📁 {dir_name}: 清理了 {cleaned_count} 个文件，释放 {self._format_size(cleaned_size)}")
             
-            if total_cleaned > 0:
+            archive_stats = self._retire_reports()
+            total_cleaned += archive_stats['deleted']
+            total_size += archive_stats['freed']
+            
+            self._last_sweep = {
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+                'seconds': round(time.perf_counter() - start, 3),
+                'deleted': total_cleaned,
+                'freed': total_size,
+                **archive_stats,
+            }
+            
+            if total_cleaned > 0 or archive_stats['archived'] > 0:
                 logger.info(f"✅ 清理完成：共清理 {total_cleaned} 个文件，释放 {self._format_size(total_size)} 空间")
             else:
                 logger.info("✨ 没有需要清理的文件")
-                
+        
         except Exception as e:
             logger.error(f"❌ 文件清理失败: {e}")
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+            self._sweep_lock.release()
+    
+    def _is_report(self, file_path):
+        """输出目录第一层的报告文件（由分级保留策略处理）"""
+        return (
+            file_path.parent.resolve() == Path(Config.OUTPUT_FOLDER).resolve()
+            and cold_archive.is_archivable(file_path)
+        )
+    
+    def _iter_files(self, dir_path):
+        """遍历目录中的文件（跳过冷存储目录，冷存储由索引管理）"""
+        cold_root = cold_archive.root.resolve()
+        for root, dirs, files in os.walk(dir_path):
+            dirs[:] = [d for d in dirs if (Path(root) / d).resolve() != cold_root]
+            for file in files:
+                yield Path(root) / file
     
     def _cleanup_directory(self, dir_path, cutoff_time):
         """清理指定目录中的旧文件"""
         cleaned_count = 0
         cleaned_size = 0
+        active_logs = {path.resolve() for path in active_log_files()}
         
         try:
-            for root, dirs, files in os.walk(dir_path):
-                for file in files:
-                    file_path = Path(root) / file
-                    
-                    # 检查文件扩展名
-                    if file_path.suffix.lower() not in self.cleanup_extensions:
-                        continue
-                    
-                    # 跳过.gitkeep文件
-                    if file == '.gitkeep':
-                        continue
+            for file_path in self._iter_files(dir_path):
+                # 检查文件扩展名
+                if file_path.suffix.lower() not in self.cleanup_extensions:
+                    continue
+                
+                # 跳过.gitkeep文件
+                if file_path.name == '.gitkeep':
+                    continue
+                
+                # 跳过正在写入的日志文件（已轮转的日志按修改时间正常清理）
+                if file_path.resolve() in active_logs:
+                    continue
+                
+                # 输出报告按分级保留策略处理
+                if self._is_report(file_path):
+                    continue
+                
+                try:
+                    # 检查文件修改时间
+                    mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
                     
-                    try:
-                        # 检查文件修改时间
-                        mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-                        
-                        if mtime < cutoff_time:
-                            file_size = file_path.stat().st_size
-                            file_path.unlink()
-                            cleaned_count += 1
-                            cleaned_size += file_size
-                            logger.debug(f"🗑️  删除: {file_path} ({mtime.strftime('%Y-%m-%d %H:%M:%S')})")
-                            
-                    except Exception as e:
-                        logger.warning(f"⚠️  删除文件失败 {file_path}: {e}")
-                        continue
-                        
+                    if mtime < cutoff_time:
+                        file_size = file_path.stat().st_size
+                        file_path.unlink()
+                        cleaned_count += 1
+                        cleaned_size += file_size
+                        logger.debug(f"🗑️  删除: {file_path} ({mtime.strftime('%Y-%m-%d %H:%M:%S')})")
+                
+                except Exception as e:
+                    logger.warning(f"⚠️  删除文件失败 {file_path}: {e}")
+                    continue
+        
         except Exception as e:
             logger.error(f"❌ 清理目录 {dir_path} 失败: {e}")
         
         return cleaned_count, cleaned_size
     
+    def _retire_reports(self):
+        """
+        输出报告超过热存储时间后转入冷存储（冷存储关闭时直接删除），并删除到期的冷存储报告
+        
+        转入冷存储按文件时间从旧到新进行，累计读写量达到预算后停止（每轮至少处理一个文件）
+        """
+        stats = {'archived': 0, 'archived_bytes': 0, 'io_bytes': 0, 'deferred': 0, 'deleted': 0, 'freed': 0}
+        output_dir = Path(Config.OUTPUT_FOLDER)
+        if not output_dir.exists():
+            return stats
+        
+        now = time.time()
+        hot_cutoff = now - self.hot_hours * 3600
+        cold_cutoff = now - self.cold_days * 86400
+        
+        candidates = []
+        for file_path in output_dir.iterdir():
+            if not file_path.is_file() or not cold_archive.is_archivable(file_path):
+                continue
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            if stat.st_mtime < hot_cutoff:
+                candidates.append((stat.st_mtime, stat.st_size, file_path))
+        candidates.sort()
+        
+        for mtime, size, file_path in candidates:
+            archived = False
+            if self.cold_days > 0 and mtime >= cold_cutoff:
+                # 读原文件 + 写归档（不超过原文件大小）
+                if stats['io_bytes'] and stats['io_bytes'] + 2 * size > self.io_budget:
+                    stats['deferred'] += 1
+                    continue
+                try:
+                    entry = cold_archive.archive(file_path)
+                    archived = True
+                except ColdArchiveError as e:
+                    logger.warning(f"⚠️  {e}，按到期文件删除")
+                else:
+                    stats['archived'] += 1
+                    stats['archived_bytes'] += entry['archived_size']
+                    stats['io_bytes'] += entry['io_bytes']
+                    logger.debug(f"🧊 转入冷存储: {file_path.name} "
+                                 f"({self._format_size(size)} -> {self._format_size(entry['archived_size'])})")
+            try:
+                file_path.unlink()
+                if not archived:
+                    stats['deleted'] += 1
+                    stats['freed'] += size
+            except OSError as e:
+                logger.warning(f"⚠️  删除文件失败 {file_path}: {e}")
+        
+        expired, expired_size = cold_archive.expire(cold_cutoff)
+        stats['deleted'] += expired
+        stats['freed'] += expired_size
+        
+        if stats['archived']:
+            logger.info(f"🧊 {stats['archived']} 个报告转入冷存储，读写 {self._format_size(stats['io_bytes'])}"
+                        + (f"，{stats['deferred']} 个留到下一轮" if stats['deferred'] else ''))
+        if expired:
+            logger.info(f"🗑️  删除 {expired} 个到期的冷存储报告，释放 {self._format_size(expired_size)}")
+        return stats
+    
     def cleanup_now(self):
         """立即执行一次清理"""
         logger.info("🧹 手动触发文件清理...")
         self._cleanup_old_files()
     
+    def cleanup_in_background(self):
+        """在后台线程中执行一次清理（处理请求完成后调用，不阻塞响应；已有清理在进行时跳过）"""
+        if self._sweep_lock.locked():
+            return
+        threading.Thread(target=self._cleanup_old_files, name='file-cleaner', daemon=True).start()
+    
+    def get_retention_policy(self):
+        """分级保留策略"""
+        return {
+            'cleanup_days': self.cleanup_days,
+            'hot_hours': self.hot_hours,
+            'cold_days': self.cold_days,
+            'io_budget_mb': self.io_budget // (1024 * 1024),
+            'interval_minutes': self.cleanup_interval / 60,
+        }
+    
     def get_file_stats(self):
         """获取各目录的文件统计信息"""
         stats = {}
@@ -160,25 +327,29 @@ class FileCleanerService:
             size = 0
             
             try:
-                for root, dirs, files in os.walk(dir_name):
-                    for file in files:
-                        if file == '.gitkeep':
-                            continue
-                        
-                        file_path = Path(root) / file
-                        if file_path.suffix.lower() in self.cleanup_extensions:
-                            count += 1
-                            size += file_path.stat().st_size
-                            
+                for file_path in self._iter_files(dir_name):
+                    if file_path.name == '.gitkeep':
+                        continue
+                    
+                    if file_path.suffix.lower() in self.cleanup_extensions:
+                        count += 1
+                        size += file_path.stat().st_size
+            
             except Exception as e:
                 logger.warning(f"⚠️  获取 {dir_name} 统计信息失败: {e}")
             
             stats[dir_name] = {
-                'count': count, 
+                'count': count,
                 'size': size,
                 'size_formatted': self._format_size(size)
             }
         
+        cold_stats = cold_archive.get_stats()
+        stats['cold'] = {
+            **cold_stats,
+            'size_formatted': self._format_size(cold_stats['archived_bytes']),
+        }
+        stats['last_sweep'] = self._last_sweep
         return stats
     
     @staticmethod
@@ -192,7 +363,7 @@ class FileCleanerService:
 
 
 # 全局清理服务实例
-file_cleaner = FileCleanerService(cleanup_days=1)
+file_cleaner = FileCleanerService()
 
 def start_file_cleaner():
     """启动文件清理服务"""
@@ -206,6 +377,14 @@ def cleanup_files_now():
     """立即清理文件"""
     file_cleaner.cleanup_now()
 
+def cleanup_files_in_background():
+    """在后台线程中清理文件"""
+    file_cleaner.cleanup_in_background()
+
 def get_file_stats():
     """获取文件统计信息"""
     return file_cleaner.get_file_stats()
+
+def get_retention_policy():
+    """获取分级保留策略"""
+    return file_cleaner.get_retention_policy()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn配置钩子
+命令行参数（见Dockerfile）优先于此文件中的设置
+"""
+
+
+def on_starting(server):
+    """
+    主进程中创建日志管道和监听线程：worker由主进程fork而来，全部共用同一个监听线程写日志文件。
+    不加 --preload 时worker各自加载应用，setup_logging 直接返回继承的管道，不会各自启动写日志文件的线程
+    """
+    import logging
+    import log_pipeline
+    log_pipeline.setup_logging(logging.INFO)
+
+
+def post_fork(server, worker):
+    """新worker启动（包括 --max-requests 回收后重启）时预热处理流程"""
+    from warmup import warm_up_worker
+    warm_up_worker()
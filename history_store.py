@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史汇总存储
+每次处理完成后把透视表的直营中心/团队/业务经理汇总（金额、行数、去重客户数、高额笔数）写入SQLite，
+下载文件被清理后仍可按时间范围查询趋势（/api/history/*）。
+本模块不导入pandas，Web进程查询历史时不需要加载处理服务。
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import Config
+
+# 汇总层级 -> 透视表列
+LEVEL_COLUMNS = {
+    'center': '所属直营中心',
+    'team': '所属团队',
+    'manager': '所属业务经理',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_at TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    source TEXT,
+    row_count INTEGER NOT NULL,
+    customer_count INTEGER NOT NULL,
+    total_amount REAL NOT NULL,
+    high_amount_count INTEGER NOT NULL,
+    center_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_run_at ON runs(run_at);
+CREATE INDEX IF NOT EXISTS idx_runs_run_date ON runs(run_date, id);
+
+CREATE TABLE IF NOT EXISTS aggregates (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    run_at TEXT NOT NULL,
+    level TEXT NOT NULL,
+    name TEXT NOT NULL,
+    center TEXT,
+    total_amount REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    customer_count INTEGER NOT NULL,
+    high_amount_count INTEGER NOT NULL
+);
+-- 趋势查询：按层级+名称在时间范围内取数，索引覆盖查询列
+CREATE INDEX IF NOT EXISTS idx_aggregates_trend
+    ON aggregates(level, name, run_at, run_id, total_amount, row_count, customer_count, high_amount_count);
+CREATE INDEX IF NOT EXISTS idx_aggregates_run ON aggregates(run_id, level);
+"""
+
+METRIC_COLUMNS = ['total_amount', 'row_count', 'customer_count', 'high_amount_count']
+
+
+def build_aggregates(df, pivot_table, threshold: float) -> Dict:
+    """
+    由预处理后的数据和透视表计算本次运行的各层级汇总
+
+    金额、行数（透视表中的客户行）和高额笔数来自透视表，去重客户数按客户UID（没有时按客户姓名）从原始数据计算，
+    与透视表排序使用的去重口径一致
+
+    Returns:
+        dict: {'run': 总体汇总, 'rows': [各层级汇总]}
+    """
+    key_column = '客户UID' if '客户UID' in df.columns else '客户姓名'
+    pivot = pivot_table.assign(_高额=pivot_table['应还款金额'] > threshold)
+    rows = []
+    for level, column in LEVEL_COLUMNS.items():
+        if column not in pivot.columns or column not in df.columns:
+            continue
+        grouped = pivot.groupby(column, sort=False, observed=True).agg(
+            total_amount=('应还款金额', 'sum'),
+            row_count=('应还款金额', 'size'),
+            high_amount_count=('_高额', 'sum'),
+            center=('所属直营中心', 'first'),
+        )
+        customers = df.groupby(column, observed=True)[key_column].nunique()
+        for name, row in grouped.iterrows():
+            rows.append({
+                'level': level,
+                'name': str(name),
+                'center': None if row['center'] is None else str(row['center']),
+                'total_amount': float(row['total_amount']),
+                'row_count': int(row['row_count']),
+                'customer_count': int(customers.get(name, 0)),
+                'high_amount_count': int(row['high_amount_count']),
+            })
+
+    run = {
+        'row_count': int(len(pivot)),
+        'customer_count': int(df[key_column].nunique()),
+        'total_amount': float(pivot['应还款金额'].sum()),
+        'high_amount_count': int(pivot['_高额'].sum()),
+        'center_count': int(pivot['所属直营中心'].nunique()) if '所属直营中心' in pivot.columns else 0,
+    }
+    return {'run': run, 'rows': rows}
+
+
+class HistoryStore:
+    """SQLite历史汇总存储（WAL模式，多个worker可同时读写）"""
+
+    def __init__(self, db_path: str = None):
+        """
+        初始化历史汇总存储
+
+        Args:
+            db_path (str): 数据库文件路径，默认 Config.HISTORY_DB_PATH
+        """
+        self.db_path = Path(db_path or Config.HISTORY_DB_PATH)
+        self.retention_days = Config.HISTORY_RETENTION_DAYS
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，避免连接跨线程或跨fork共享"""
+        self._ensure_schema()
+        with closing(sqlite3.connect(self.db_path, timeout=10)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys = ON')
+            with conn:
+                yield conn
+
+    def _ensure_schema(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.db_path, timeout=10)) as conn:
+                conn.execute('PRAGMA journal_mode = WAL')
+                conn.executescript(SCHEMA)
+            self._initialized = True
+
+    def record_run(self, df, pivot_table, source: str = None, run_at: datetime = None) -> int:
+        """
+        保存一次处理的汇总数据
+
+        Args:
+            df: 预处理后的数据
+            pivot_table: 透视表
+            source (str): 来源文件名
+            run_at (datetime): 运行时间，默认当前时间
+
+        Returns:
+            int: 运行ID
+        """
+        aggregates = build_aggregates(df, pivot_table, Config.FORMAT_CONFIG['金额阈值'])
+        return self.insert_run(aggregates, source=source, run_at=run_at)
+
+    def insert_run(self, aggregates: Dict, source: str = None, run_at: datetime = None) -> int:
+        run_at = run_at or datetime.now()
+        run_at_text = run_at.isoformat(timespec='seconds')
+        run = aggregates['run']
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (run_at, run_date, source, row_count, customer_count, total_amount, '
+                'high_amount_count, center_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_at_text, run_at.date().isoformat(), source, run['row_count'], run['customer_count'],
+                 run['total_amount'], run['high_amount_count'], run['center_count'])
+            )
+            run_id = cursor.lastrowid
+            conn.executemany(
+                'INSERT INTO aggregates (run_id, run_at, level, name, center, total_amount, row_count, '
+                'customer_count, high_amount_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (run_id, run_at_text, row['level'], row['name'], row['center'], row['total_amount'],
+                     row['row_count'], row['customer_count'], row['high_amount_count'])
+                    for row in aggregates['rows']
+                ]
+            )
+            if self.retention_days > 0:
+                cutoff = (run_at - timedelta(days=self.retention_days)).isoformat(timespec='seconds')
+                conn.execute('DELETE FROM runs WHERE run_at < ?', (cutoff,))
+        return run_id
+
+    @staticmethod
+    def _range_clause(column: str, start: Optional[str], end: Optional[str], params: List) -> str:
+        """日期范围条件：end 只给日期时包含当天"""
+        clauses = []
+        if start:
+            clauses.append(f'{column} >= ?')
+            params.append(start)
+        if end:
+            clauses.append(f'{column} <= ?')
+            params.append(end if 'T' in end else f'{end}T23:59:59')
+        return ''.join(f' AND {clause}' for clause in clauses)
+
+    def list_runs(self, start: str = None, end: str = None, limit: int = 100) -> List[Dict]:
+        params = []
+        where = self._range_clause('run_at', start, end, params)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT * FROM runs WHERE 1 = 1{where} ORDER BY run_at DESC, id DESC LIMIT ?',
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_run(self, run_id: int, level: str = None) -> Optional[Dict]:
+        with self._connect() as conn:
+            run = conn.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+            if run is None:
+                return None
+            params = [run_id]
+            level_clause = ''
+            if level:
+                level_clause = ' AND level = ?'
+                params.append(level)
+            rows = conn.execute(
+                f'SELECT level, name, center, {", ".join(METRIC_COLUMNS)} FROM aggregates '
+                f'WHERE run_id = ?{level_clause} ORDER BY level, total_amount DESC',
+                params
+            ).fetchall()
+        return {**dict(run), 'aggregates': [dict(row) for row in rows]}
+
+    def trend(self, level: str = None, name: str = None, start: str = None, end: str = None,
+              bucket: str = 'day') -> List[Dict]:
+        """
+        时间范围内的趋势
+
+        Args:
+            level (str): center / team / manager，为空时返回每次运行的总体汇总
+            name (str): 直营中心/团队/业务经理名称（指定level时必填）
+            start, end (str): ISO日期或时间
+            bucket (str): day 每天只取最后一次运行（同一天重复上传不会重复计算）；run 返回每次运行
+        """
+        params = []
+        if level:
+            if level not in LEVEL_COLUMNS:
+                raise ValueError(f'不支持的层级: {level}')
+            if not name:
+                raise ValueError('查询直营中心/团队/业务经理趋势时必须指定名称')
+            table = 'aggregates'
+            where = 'level = ? AND name = ?'
+            params.extend([level, name])
+        else:
+            table = 'runs'
+            where = '1 = 1'
+        where += self._range_clause('run_at', start, end, params)
+
+        run_column = 'run_id' if level else 'id'
+        if bucket == 'day':
+            # 每天最后一次运行（runs(run_date, id)索引）
+            day_params = []
+            day_where = self._range_clause('run_at', start, end, day_params)
+            where += f' AND {run_column} IN (SELECT MAX(id) FROM runs WHERE 1 = 1{day_where} GROUP BY run_date)'
+            params.extend(day_params)
+        elif bucket != 'run':
+            raise ValueError(f'不支持的聚合方式: {bucket}')
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT {run_column} AS run_id, run_at, {", ".join(METRIC_COLUMNS)} FROM {table} '
+                f'WHERE {where} ORDER BY run_at',
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def names(self, level: str, center: str = None, start: str = None, end: str = None) -> List[Dict]:
+        """时间范围内出现过的名称（供前端选择），最近出现的在前"""
+        if level not in LEVEL_COLUMNS:
+            raise ValueError(f'不支持的层级: {level}')
+        params = [level]
+        where = 'level = ?'
+        if center:
+            where += ' AND center = ?'
+            params.append(center)
+        where += self._range_clause('run_at', start, end, params)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT name, center, MAX(run_at) AS last_run_at, COUNT(*) AS run_count FROM aggregates '
+                f'WHERE {where} GROUP BY name ORDER BY last_run_at DESC, name',
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_stats(self) -> Dict:
+        if not self.db_path.exists():
+            return {'runs': 0, 'db_size': 0}
+        with self._connect() as conn:
+            count, first, last = conn.execute('SELECT COUNT(*), MIN(run_at), MAX(run_at) FROM runs').fetchone()
+        return {
+            'runs': count,
+            'first_run_at': first,
+            'last_run_at': last,
+            'db_size': os.path.getsize(self.db_path),
+        }
+
+
+# 全局历史汇总存储实例
+history_store = HistoryStore()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+收件目录自动处理服务
+监视 INGEST_INBOX 目录，文件大小和修改时间稳定 INGEST_SETTLE_SECONDS 秒后视为写入完成，
+移入 processing/ 后交给进程池用 ExcelProcessorService 处理，结果写入输出存储（OUTPUT_FOLDER 或S3），
+源文件移入 processed/ 或 failed/，每个文件的处理记录追加到 output/ingest/manifest.jsonl。
+
+可随Web应用启动（INGEST_ENABLED=true），也可单独运行：
+    python ingest_daemon.py --inbox /mnt/nas/inbox --workers 4
+同一收件目录通过文件锁保证只有一个实例在处理。
+"""
+
+import os
+import io
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import Config
+import storage
+
+logger = logging.getLogger(__name__)
+
+# 子进程中计时的处理阶段
+INGEST_STAGES = {
+    '_read_and_validate_excel': 'read',
+    '_preprocess_data': 'preprocess',
+    '_create_pivot_table_full_logic': 'pivot',
+    '_save_to_excel_full_style': 'save',
+}
+
+# 状态文件中保留的最近处理记录数
+RECENT_LIMIT = 50
+
+
+def _safe_stem(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]', '_', Path(name).stem).strip('._') or 'input'
+
+
+def _unique_path(directory: Path, name: str) -> Path:
+    target = directory / name
+    counter = 1
+    while target.exists():
+        target = directory / f"{Path(name).stem}_{counter}{Path(name).suffix}"
+        counter += 1
+    return target
+
+
+def _ingest_file(source_path: str, output_dir: str) -> Dict:
+    """
+    进程池中执行：处理单个文件并把结果移动到输出目录
+
+    输出文件名带上源文件名，避免同一秒内完成的多个文件互相覆盖
+    """
+    from excel_processor import ExcelProcessorService
+
+    timings = {}
+    service = ExcelProcessorService()
+    for method_name, stage in INGEST_STAGES.items():
+        method = getattr(service, method_name)
+
+        def timed(*args, _method=method, _stage=stage, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                timings[_stage] = round(time.perf_counter() - start, 3)
+
+        setattr(service, method_name, timed)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix='.ingest-') as work_dir:
+        # 处理过程的print输出在后台服务中没有意义
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = service.process_excel_file(source_path, work_dir, record_history=True)
+        if result['success']:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            output_storage = storage.for_output_dir(output_dir)
+            key = storage.unique_key(output_storage, f"{_safe_stem(source_path)}_处理结果_{timestamp}.xlsx")
+            output_storage.put_file(result['output_file'], key)
+            result['output_file'] = output_storage.location(key)
+
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['stages'] = timings
+    return result
+
+
+class IngestDaemon:
+    """收件目录自动处理服务"""
+
+    def __init__(self, inbox: str = None, output_dir: str = None, workers: int = None,
+                 settle_seconds: float = None, poll_interval: float = None):
+        """
+        初始化收件目录处理服务
+
+        Args:
+            inbox (str): 收件目录，默认 Config.INGEST_INBOX
+            output_dir (str): 结果输出目录，默认 Config.OUTPUT_FOLDER
+            workers (int): 处理进程数
+            settle_seconds (float): 文件大小和修改时间保持不变多久后视为写入完成
+            poll_interval (float): 扫描间隔（秒）
+        """
+        self.inbox = Path(inbox or Config.INGEST_INBOX)
+        self.processing_dir = self.inbox / 'processing'
+        self.processed_dir = self.inbox / 'processed'
+        self.failed_dir = self.inbox / 'failed'
+        self.output_dir = Path(output_dir or Config.OUTPUT_FOLDER)
+        self.state_dir = self.output_dir / 'ingest'
+        self.status_path = self.state_dir / 'status.json'
+        self.manifest_path = self.state_dir / 'manifest.jsonl'
+        self.workers = workers or Config.INGEST_WORKERS
+        self.settle_seconds = Config.INGEST_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.poll_interval = poll_interval or Config.INGEST_POLL_INTERVAL
+
+        # 文件名 -> (大小, 修改时间, 首次观察到该状态的时间)
+        self._observed: Dict[str, tuple] = {}
+        # future -> 处理记录
+        self._pending: Dict = {}
+        self._executor = None
+        self._lock_file = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.status = {
+            'pid': os.getpid(),
+            'inbox': str(self.inbox.resolve()),
+            'workers': self.workers,
+            'started_at': None,
+            'heartbeat': None,
+            'processed': 0,
+            'failed': 0,
+            'in_progress': [],
+            'recent': [],
+        }
+
+    def acquire_lock(self) -> bool:
+        """同一收件目录只允许一个实例处理（多个gunicorn worker或独立进程同时启动时）"""
+        import fcntl
+
+        for directory in (self.inbox, self.processing_dir, self.processed_dir, self.failed_dir, self.state_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.inbox / '.ingest.lock', 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def start(self) -> bool:
+        """在后台线程中运行，未获得收件目录锁时返回False"""
+        if self._thread is not None:
+            return True
+        if not self.acquire_lock():
+            logger.info(f"📥 收件目录 {self.inbox} 已由其他进程处理，跳过")
+            return False
+        self._prepare()
+        self._thread = threading.Thread(target=self._loop, name='ingest-daemon', daemon=True)
+        self._thread.start()
+        logger.info(f"📥 收件目录处理服务已启动: {self.inbox}（{self.workers} 个进程）")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._write_status(running=False)
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def run_forever(self, once: bool = False):
+        """前台运行；once=True 时处理完当前已有文件后退出"""
+        if not self.acquire_lock():
+            raise RuntimeError(f"收件目录 {self.inbox} 已由其他进程处理")
+        self._prepare()
+        try:
+            if once:
+                # 已有文件不需要等待写入完成
+                self.settle_seconds = 0
+                self.poll_once()
+                while self._pending:
+                    time.sleep(self.poll_interval)
+                    self.poll_once()
+            else:
+                self._loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _prepare(self):
+        """上次异常退出时留在 processing/ 中的文件放回收件目录重新处理"""
+        for leftover in self.processing_dir.iterdir():
+            if leftover.is_file():
+                os.replace(leftover, _unique_path(self.inbox, leftover.name))
+                logger.warning(f"⚠️  重新处理上次未完成的文件: {leftover.name}")
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.status['started_at'] = datetime.now().isoformat(timespec='seconds')
+        self._write_status()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"❌ 收件目录扫描失败: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def poll_once(self):
+        """扫描一次：提交写入完成的新文件，收集已完成的处理结果，更新状态文件"""
+        for path in self._stable_files():
+            self._submit(path)
+        for future in [f for f in self._pending if f.done()]:
+            self._finish(future, self._pending.pop(future))
+        self._write_status()
+
+    def _stable_files(self) -> List[Path]:
+        """返回大小和修改时间已保持不变 settle_seconds 秒的文件"""
+        now = time.time()
+        current = {}
+        stable = []
+        for entry in os.scandir(self.inbox):
+            # 跳过目录、隐藏文件和Excel打开时生成的 ~$ 锁文件
+            if not entry.is_file() or entry.name.startswith(('.', '~$')):
+                continue
+            if Path(entry.name).suffix.lower() not in Config.ALLOWED_EXTENSIONS:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            previous = self._observed.get(entry.name)
+            if previous and previous[:2] == (stat.st_size, stat.st_mtime):
+                since = previous[2]
+            else:
+                since = now
+            current[entry.name] = (stat.st_size, stat.st_mtime, since)
+            if stat.st_size > 0 and now - since >= self.settle_seconds:
+                stable.append(Path(entry.path))
+        self._observed = current
+        return stable
+
+    def _submit(self, path: Path):
+        # 先移入 processing/，防止重复提交，也让上传方不会再改写该文件
+        claimed = _unique_path(self.processing_dir, path.name)
+        try:
+            os.replace(path, claimed)
+        except OSError as e:
+            logger.warning(f"⚠️  无法领取文件 {path.name}: {e}")
+            return
+        self._observed.pop(path.name, None)
+        record = {
+            'source': path.name,
+            'size': claimed.stat().st_size,
+            'detected_at': datetime.now().isoformat(timespec='seconds'),
+            'submitted': time.time(),
+        }
+        future = self._executor.submit(_ingest_file, str(claimed), str(self.output_dir))
+        self._pending[future] = (claimed, record)
+        logger.info(f"📥 开始处理收件目录文件: {path.name}")
+
+    def _finish(self, future, pending):
+        claimed, record = pending
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'success': False, 'message': f'处理进程异常: {e}', 'errors': [str(e), traceback.format_exc()]}
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        target_dir = self.processed_dir if result['success'] else self.failed_dir
+        os.replace(claimed, _unique_path(target_dir, f"{stamp}_{claimed.name}"))
+
+        record.update({
+            'status': 'processed' if result['success'] else 'failed',
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'total_seconds': round(time.time() - record.pop('submitted'), 3),
+            'processing_seconds': result.get('seconds'),
+            'stages': result.get('stages', {}),
+            'message': result.get('message', ''),
+        })
+        if result['success']:
+            record['output_file'] = os.path.basename(result['output_file'])
+            record['rows'] = result['stats'].get('原始数据行数')
+            self.status['processed'] += 1
+            logger.info(f"✅ 收件目录文件处理完成: {record['source']} -> {record['output_file']}")
+        else:
+            record['error'] = (result.get('errors') or [record['message']])[0]
+            self.status['failed'] += 1
+            logger.error(f"❌ 收件目录文件处理失败: {record['source']}: {record['message']}")
+
+        with open(self.manifest_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.status['recent'] = ([record] + self.status['recent'])[:RECENT_LIMIT]
+
+    def _write_status(self, running: bool = True):
+        """原子写入状态文件，供各worker的 /api/stats 读取"""
+        self.status.update({
+            'running': running,
+            'heartbeat': time.time(),
+            'poll_interval': self.poll_interval,
+            'in_progress': [record['source'] for _, record in self._pending.values()],
+        })
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.status_path.with_name(f"{self.status_path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.status, f, ensure_ascii=False)
+        os.replace(tmp_path, self.status_path)
+
+
+def read_status(output_dir: str = None) -> Optional[Dict]:
+    """读取处理服务状态（可能来自其他进程），长时间没有心跳时标记为未运行"""
+    status_path = Path(output_dir or Config.OUTPUT_FOLDER) / 'ingest' / 'status.json'
+    try:
+        with open(status_path, 'r', encoding='utf-8') as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stale_after = max(30, 5 * status.get('poll_interval', Config.INGEST_POLL_INTERVAL))
+    if status.get('running') and time.time() - status.get('heartbeat', 0) > stale_after:
+        status['running'] = False
+        status['stale'] = True
+    return status
+
+
+# 随Web应用启动的实例
+ingest_daemon = None
+
+
+def start_ingest_daemon() -> bool:
+    """随Web应用启动收件目录处理服务（INGEST_ENABLED=true 时）"""
+    global ingest_daemon
+    if ingest_daemon is None:
+        ingest_daemon = IngestDaemon()
+    return ingest_daemon.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='收件目录自动处理服务')
+    parser.add_argument('--inbox', default=Config.INGEST_INBOX, help='收件目录')
+    parser.add_argument('--output', default=Config.OUTPUT_FOLDER, help='结果输出目录')
+    parser.add_argument('--workers', type=int, default=Config.INGEST_WORKERS, help='处理进程数')
+    parser.add_argument('--settle', type=float, default=Config.INGEST_SETTLE_SECONDS, help='文件稳定多少秒后开始处理')
+    parser.add_argument('--once', action='store_true', help='处理完当前已有文件后退出')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    daemon = IngestDaemon(args.inbox, args.output, args.workers, args.settle)
+    print(f"📥 正在监视收件目录: {daemon.inbox}")
+    daemon.run_forever(once=args.once)
+    print(f"✅ 已处理 {daemon.status['processed']} 个文件，失败 {daemon.status['failed']} 个")
+    sys.exit(1 if daemon.status['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
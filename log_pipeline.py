@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非阻塞日志管道
+各进程（gunicorn worker）的日志记录只放入本进程的有界队列，由转发线程经跨进程管道发给一个监听线程，
+监听线程批量写入日志文件并按大小/时间轮转，请求线程不做任何磁盘I/O。
+管道和监听线程由gunicorn主进程创建（gunicorn.conf.py 的 on_starting 钩子，与是否 --preload 无关），
+worker由主进程fork而来，继承同一管道，fork后在子进程中重新创建本进程的队列和转发线程。
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+import logging.handlers
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import Config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 本进程的日志管道（setup_logging 只生效一次）
+_pipeline = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """本进程队列已满时丢弃日志并计数，不阻塞请求线程"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchRotatingWriter:
+    """批量写入日志文件，按大小和时间轮转；轮转后的文件仍以 .log 结尾，由文件清理服务按天数删除"""
+
+    def __init__(self, path: str, max_bytes: int, rotate_seconds: float, backup_count: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.rotations = 0
+        self._stream = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._open()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self.path, 'a', encoding='utf-8')
+        self._size = self._stream.tell()
+        # 时间轮转周期从打开文件时开始计算（续写已有文件时重新计时）
+        self._opened_at = time.time()
+
+    def _reopen_if_removed(self):
+        """日志文件被外部删除或移走时重新打开，避免写入已删除的文件"""
+        try:
+            if os.stat(self.path).st_ino == os.fstat(self._stream.fileno()).st_ino:
+                return
+        except OSError:
+            pass
+        self._stream.close()
+        self._open()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self._size == 0:
+            return False
+        if self.max_bytes > 0 and self._size + incoming > self.max_bytes:
+            return True
+        return self.rotate_seconds > 0 and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self._stream.close()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        target = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        counter = 1
+        while target.exists():
+            target = self.path.with_name(f"{self.path.stem}.{stamp}_{counter}{self.path.suffix}")
+            counter += 1
+        os.replace(self.path, target)
+        self.rotations += 1
+        self._remove_old_backups()
+        self._open()
+
+    def _remove_old_backups(self):
+        if self.backup_count <= 0:
+            return
+        backups = sorted(self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"))
+        for old in backups[:-self.backup_count]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def write(self, lines: List[str]):
+        data = ''.join(lines)
+        self._reopen_if_removed()
+        if self._should_rotate(len(data.encode('utf-8'))):
+            self._rotate()
+        self._stream.write(data)
+        self._stream.flush()
+        self._size = self._stream.tell()
+
+    def close(self):
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+
+class LogPipeline:
+    """各进程的队列和转发线程 + 跨进程管道 + 单一监听线程"""
+
+    def __init__(self, log_file: str = None):
+        self.log_file = log_file or Config.LOG_FILE
+        self.batch_size = Config.LOG_BATCH_SIZE
+        self.flush_interval = Config.LOG_FLUSH_INTERVAL
+        # 单向管道只有监听线程读取；多个进程的转发线程写入时用跨进程锁保证记录不交错
+        self._reader, self._sender = multiprocessing.Pipe(duplex=False)
+        self._send_lock = multiprocessing.Lock()
+        self.handler = DroppingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+        self.formatter = logging.Formatter(LOG_FORMAT)
+        self.writer = BatchRotatingWriter(
+            self.log_file, Config.LOG_MAX_BYTES, Config.LOG_ROTATE_HOURS * 3600, Config.LOG_BACKUP_COUNT
+        )
+        self.owner_pid = os.getpid()
+        self.written = 0
+        self.batches = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._forwarder = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._listen, name='log-listener', daemon=True)
+        self._thread.start()
+        self._start_forwarder()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _start_forwarder(self):
+        self._forwarder = threading.Thread(
+            target=self._forward, args=(self.handler.queue,), name='log-forwarder', daemon=True
+        )
+        self._forwarder.start()
+
+    def _after_fork_in_child(self):
+        """
+        gunicorn用os.fork创建worker，子进程中只有执行fork的线程，父进程的转发线程不存在，
+        父进程队列的内部锁也可能正被其他线程持有，因此在子进程中换用新队列并启动自己的转发线程
+        """
+        self.handler.queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+        self.handler.dropped = 0
+        self._start_forwarder()
+
+    def _forward(self, local_queue: queue.Queue):
+        """把本进程队列中的日志发送到监听线程，None 表示结束"""
+        while True:
+            record = local_queue.get()
+            if record is None:
+                return
+            try:
+                with self._send_lock:
+                    self._sender.send(record)
+            except Exception:
+                # 记录中带有无法序列化的附加字段，或管道已关闭
+                self.handler.dropped += 1
+
+    def stop(self):
+        """发送完本进程队列中的日志，停止监听线程并写完管道中剩余的日志（只在创建管道的进程中执行）"""
+        if os.getpid() != self.owner_pid or self._thread is None:
+            return
+        try:
+            self.handler.queue.put(None, timeout=1)
+            self._forwarder.join(timeout=5)
+        except queue.Full:
+            pass
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.writer.close()
+
+    def _listen(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+            elif self._stop.is_set():
+                return
+
+    def _next_batch(self) -> List[logging.LogRecord]:
+        """阻塞等待第一条日志，之后在flush_interval内尽量多取，最多batch_size条"""
+        try:
+            if not self._reader.poll(self.flush_interval):
+                return []
+            batch = [self._reader.recv()]
+        except (EOFError, OSError):
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or not self._reader.poll(remaining):
+                    break
+                batch.append(self._reader.recv())
+            except (EOFError, OSError):
+                break
+        return batch
+
+    def _write(self, batch: List[logging.LogRecord]):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record) + '\n')
+            except Exception:
+                continue
+        try:
+            self.writer.write(lines)
+            sys.stderr.write(''.join(lines))
+        except Exception as e:
+            sys.stderr.write(f"⚠️  日志写入失败: {e}\n")
+        self.written += len(lines)
+        self.batches += 1
+
+    def get_stats(self) -> Dict:
+        """当前进程的积压和丢弃数；写入和轮转计数只在监听线程所在的进程中有意义"""
+        stats = {
+            'log_file': self.log_file,
+            'queued': self.handler.queue.qsize(),
+            'dropped': self.handler.dropped,
+        }
+        if os.getpid() == self.owner_pid:
+            stats.update({'written': self.written, 'batches': self.batches, 'rotations': self.writer.rotations})
+        return stats
+
+
+def setup_logging(level: int = logging.INFO) -> Optional[LogPipeline]:
+    """配置根日志：只挂载队列处理器，由监听线程写文件和控制台；重复调用不会重复创建"""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+
+    _pipeline = LogPipeline()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_pipeline.handler)
+    _pipeline.start()
+    return _pipeline
+
+
+def active_log_files() -> List[Path]:
+    """正在写入的日志文件，文件清理服务不删除"""
+    return [Path(Config.LOG_FILE)]
+
+
+def get_stats() -> Dict:
+    return _pipeline.get_stats() if _pipeline is not None else {}
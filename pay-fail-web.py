@@ -5,20 +5,40 @@
 基于Flask的Web界面，支持文件上传和在线处理
 """
 
+import time
+_APP_IMPORT_START = time.perf_counter()
+
+import io
 import os
+import sys
+import hmac
 import json
 import traceback
 import logging
+from contextlib import ExitStack
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for, flash, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
 from config import Config
-from excel_processor import excel_service
-from file_cleaner import start_file_cleaner, stop_file_cleaner, cleanup_files_now, get_file_stats
+from warmup import record_app_import, record_processor_import, record_upload_latency, get_startup_metrics
+from table_renderer import table_renderer
+from admission_control import admission_control, AdmissionRejected
+import progress
+import log_pipeline
+import profiling
+import downloads
+import storage
+from progressive_report import progressive_reports
+from file_cleaner import (start_file_cleaner, stop_file_cleaner, cleanup_files_now, cleanup_files_in_background,
+                          get_file_stats, get_retention_policy)
+from cold_archive import cold_archive
+from ingest_daemon import start_ingest_daemon, read_status as read_ingest_status
+from history_store import history_store
+from search_index import search_index
 
 def create_app():
     """创建Flask应用"""
@@ -31,22 +51,47 @@ def create_app():
     # 初始化目录
     Config.init_app()
     
-    # 配置日志
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/app.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    # 直接运行本文件（开发环境）时，进程池子进程（forkserver/spawn）会以 __mp_main__ 重新导入本模块，不启动后台服务
+    if __name__ == '__mp_main__':
+        return app
+    
+    # 配置日志：请求线程只写队列，由监听线程批量写文件（gunicorn下由主进程的 on_starting 钩子创建，这里直接返回已有的管道）
+    log_pipeline.setup_logging(logging.INFO)
     
     # 启动文件清理服务
     start_file_cleaner()
     
+    # 启动收件目录处理服务（多个进程同时启动时只有一个获得收件目录锁）
+    if Config.INGEST_ENABLED:
+        start_ingest_daemon()
+    
     return app
 
 app = create_app()
+record_app_import(time.perf_counter() - _APP_IMPORT_START)
+
+def get_excel_service():
+    """延迟加载Excel处理服务：pandas/openpyxl在首次处理（或worker预热）时才导入"""
+    if 'excel_processor' not in sys.modules:
+        start = time.perf_counter()
+        from excel_processor import excel_service
+        record_processor_import(time.perf_counter() - start)
+    return sys.modules['excel_processor'].excel_service
+
+def get_delta_service():
+    """延迟加载增量处理服务（依赖Excel处理服务）"""
+    get_excel_service()
+    from delta_processor import delta_service
+    return delta_service
+
+def is_admin_request():
+    """请求头 X-Admin-Token 与配置的 ADMIN_TOKEN 一致（未配置时一律拒绝）"""
+    token = app.config.get('ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+def download_url_for(filename):
+    """输出文件的下载地址（带有效期的签名令牌）"""
+    return url_for('download_file', token=downloads.make_download_token(filename))
 
 def allowed_file(filename):
     """检查文件类型是否允许"""
@@ -64,9 +109,13 @@ def index():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """文件上传和预览处理接口"""
+    # 进度通道开启前返回时也要写入结束状态，前端在上传前已订阅 /progress/<request_id>
+    request_id = None
     try:
+        request_id = request.form.get('request_id')
         # 检查是否有文件
         if 'file' not in request.files:
+            progress.fail(request_id, '没有选择文件')
             return jsonify({
                 'success': False,
                 'message': '没有选择文件'
@@ -74,6 +123,7 @@ def upload_file():
         
         file = request.files['file']
         if file.filename == '':
+            progress.fail(request_id, '没有选择文件')
             return jsonify({
                 'success': False,
                 'message': '没有选择文件'
@@ -81,9 +131,11 @@ def upload_file():
         
         # 验证文件类型
         if not allowed_file(file.filename):
+            message = f'不支持的文件格式，请上传 {", ".join(app.config["ALLOWED_EXTENSIONS"])} 文件'
+            progress.fail(request_id, message)
             return jsonify({
                 'success': False,
-                'message': f'不支持的文件格式，请上传 {", ".join(app.config["ALLOWED_EXTENSIONS"])} 文件'
+                'message': message
             }), 400
         
         # 保存上传的文件
@@ -95,66 +147,449 @@ def upload_file():
         
         print(f"📁 处理文件: {upload_path}")
         
-        # 处理Excel文件并获取预览数据
-        result = excel_service.process_excel_for_preview(upload_path)
-        print(f"📊 预览处理结果: {result.get('success', False)}")
+        # 准入控制：估算处理开销，主机处理能力饱和时返回429
+        cost = admission_control.estimate_cost(upload_path)
+        incremental = request.form.get('incremental') in ('1', 'true')
+        # 管理员可对单个请求做采样分析（同步处理，保证整个流程都在分析范围内）
+        profile = (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1') and is_admin_request()
+        progressive = request.form.get('progressive') in ('1', 'true') and not incremental and not profile
+        try:
+            with ExitStack() as resources:
+                resources.enter_context(admission_control.admit(cost))
+                start = time.perf_counter()
+                with profiling.profile_request(profile) as profile_session, \
+                        progress.track(request_id) as channel:
+                    if incremental:
+                        # 增量：与上次快照对比，只重新计算受影响的直营中心
+                        result = _process_upload_incremental(upload_path)
+                    elif progressive:
+                        # 渐进式：透视表完成即返回汇总，准入槽位和进度通道移交后台线程
+                        result = _start_progressive_upload(upload_path, resources, channel)
+                    else:
+                        result = _process_upload(upload_path)
+                    if channel is not None and not result['success']:
+                        channel.close('failed', result.get('message'))
+                if not progressive:
+                    record_upload_latency(time.perf_counter() - start)
+                if profile_session is not None:
+                    result['profile'] = {
+                        'profile_id': profile_session.profile_id,
+                        'profile_url': url_for('download_profile', profile_id=profile_session.profile_id),
+                        'summary': profile_session.summary
+                    }
+        except AdmissionRejected as e:
+            progress.fail(request_id, str(e), status='rejected')
+            response = jsonify({
+                'success': False,
+                'message': str(e),
+                'retry_after': e.retry_after
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        finally:
+            # 清理上传的临时文件
+            try:
+                os.remove(upload_path)
+            except Exception:
+                pass  # 忽略删除临时文件的错误
         
-        # 同时生成Excel文件用于下载
-        if result['success']:
-            print("🔄 开始生成Excel文件...")
+        # 处理完成后在后台触发文件清理（转入冷存储的读写不计入请求耗时）
+        try:
+            cleanup_files_in_background()
+        except Exception as e:
+            print(f"⚠️ 文件清理失败: {e}")
+        
+        return jsonify(result)
+        
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'message': f'文件太大，请上传小于 {app.config["MAX_CONTENT_LENGTH"] // (1024*1024)}MB 的文件'
+        }), 413
+    except Exception as e:
+        progress.fail(request_id, f'处理文件时发生错误: {str(e)}')
+        return jsonify({
+            'success': False,
+            'message': f'处理文件时发生错误: {str(e)}',
+            'errors': [str(e), traceback.format_exc()]
+        }), 500
+
+def _process_upload(upload_path):
+    """处理已保存的上传文件：生成预览数据和下载文件"""
+    excel_service = get_excel_service()
+    
+    # 处理Excel文件并获取预览数据
+    result = excel_service.process_excel_for_preview(upload_path)
+    print(f"📊 预览处理结果: {result.get('success', False)}")
+    
+    # 保存各直营中心表格结构，供服务端渲染图片
+    if result['success']:
+        report_id = table_renderer.new_report_id()
+        table_renderer.save_report_tables(report_id, result['preview_data'])
+        result['report_id'] = report_id
+        result['images_url'] = url_for('get_report_images', report_id=report_id)
+        result['images_zip_url'] = url_for('download_report_images', report_id=report_id)
+    
+    # 同时生成Excel文件用于下载（split模式按直营中心拆分为多个工作簿并打包）
+    if result['success']:
+        output_mode = request.form.get('output_mode', 'single')
+        print(f"🔄 开始生成Excel文件（输出模式: {output_mode}）...")
+        if output_mode == 'split':
+            excel_result = excel_service.process_excel_by_center(
+                input_path=upload_path,
+                output_dir=app.config['OUTPUT_FOLDER']
+            )
+        else:
             excel_result = excel_service.process_excel_file(
                 input_path=upload_path, 
                 output_dir=app.config['OUTPUT_FOLDER']
             )
-            print(f"✅ Excel生成结果: {excel_result.get('success', False)}")
-            if excel_result['success']:
-                output_filename = os.path.basename(excel_result['output_file'])
-                result['download_url'] = url_for('download_file', filename=output_filename)
-                result['excel_file_name'] = output_filename
+        print(f"✅ Excel生成结果: {excel_result.get('success', False)}")
+        if excel_result['success']:
+            output_filename = os.path.basename(excel_result['output_file'])
+            result['download_url'] = download_url_for(output_filename)
+            result['excel_file_name'] = output_filename
+    
+    return result
+
+def _process_upload_incremental(upload_path):
+    """增量处理已保存的上传文件：返回预览数据、下载文件和与上次相比的变化摘要"""
+    result = get_delta_service().process_excel_incremental(
+        upload_path,
+        output_dir=app.config['OUTPUT_FOLDER'],
+        output_mode=request.form.get('output_mode', 'single')
+    )
+    print(f"📊 增量处理结果: {result.get('success', False)}")
+    
+    if result['success']:
+        report_id = table_renderer.new_report_id()
+        table_renderer.save_report_tables(report_id, result['preview_data'])
+        output_filename = os.path.basename(result.pop('output_file'))
+        result.update({
+            'report_id': report_id,
+            'images_url': url_for('get_report_images', report_id=report_id),
+            'images_zip_url': url_for('download_report_images', report_id=report_id),
+            'download_url': download_url_for(output_filename),
+            'excel_file_name': output_filename
+        })
+    
+    return result
+
+def _start_progressive_upload(upload_path, resources, channel):
+    """渐进式处理：返回各直营中心汇总，预览表格和下载文件由后台线程继续生成"""
+    excel_service = get_excel_service()
+    
+    result, df, pivot_table, quality = excel_service.process_excel_summary(upload_path)
+    print(f"📊 汇总处理结果: {result.get('success', False)}")
+    if not result['success']:
+        return result
+    
+    report_id = table_renderer.new_report_id()
+    progressive_reports.start(
+        report_id, result, df, pivot_table, excel_service,
+        output_dir=app.config['OUTPUT_FOLDER'],
+        output_mode=request.form.get('output_mode', 'single'),
+        resources=resources.pop_all(),
+        channel=channel,
+        quality=quality
+    )
+    result.update({
+        'progressive': True,
+        'report_id': report_id,
+        'status_url': url_for('get_report_status', report_id=report_id)
+    })
+    return result
+
+# 按Content-Type识别的结构化数据格式
+JSON_CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+    'application/json': 'columns',
+}
+
+@app.route('/api/process', methods=['POST'])
+def api_process():
+    """
+    结构化数据处理接口：请求体为NDJSON（每行一条记录）或列式JSON，不经过Excel编码和解析
+
+    查询参数：format=ndjson|columns（默认按Content-Type），output=both|preview|workbook，
+    output_mode=single|split，source=来源名称，request_id=进度通道ID
+    """
+    request_id = request.args.get('request_id')
+    try:
+        data_format = request.args.get('format') or JSON_CONTENT_TYPES.get(request.mimetype)
+        if data_format not in ('ndjson', 'columns'):
+            message = '请使用 application/x-ndjson（每行一条记录）或 application/json（列式）提交数据'
+            progress.fail(request_id, message)
+            return jsonify({
+                'success': False,
+                'message': message
+            }), 415
+        
+        output = request.args.get('output', 'both')
+        if output not in ('both', 'preview', 'workbook'):
+            progress.fail(request_id, 'output 参数应为 both / preview / workbook')
+            return jsonify({'success': False, 'message': 'output 参数应为 both / preview / workbook'}), 400
+        source = secure_filename(request.args.get('source', '')) or f'api.{data_format}'
         
-        # 清理上传的临时文件
+        # 准入控制：按请求体大小估算（分块传输时按上限估算）
+        cost = admission_control.estimate_payload_cost(request.content_length or app.config['MAX_CONTENT_LENGTH'])
         try:
-            os.remove(upload_path)
-        except Exception:
-            pass  # 忽略删除临时文件的错误
+            with admission_control.admit(cost), progress.track(request_id) as channel:
+                start = time.perf_counter()
+                # 请求体逐行读取（BufferedReader提供高效的readline）
+                result = get_excel_service().process_json(
+                    io.BufferedReader(request.stream, buffer_size=256 * 1024),
+                    data_format,
+                    source=source,
+                    output_dir=app.config['OUTPUT_FOLDER'],
+                    preview=output != 'workbook',
+                    workbook=output != 'preview',
+                    output_mode=request.args.get('output_mode', 'single')
+                )
+                if channel is not None and not result['success']:
+                    channel.close('failed', result.get('message'))
+                result['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+        except AdmissionRejected as e:
+            progress.fail(request_id, str(e), status='rejected')
+            response = jsonify({
+                'success': False,
+                'message': str(e),
+                'retry_after': e.retry_after
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        
+        if not result['success']:
+            return jsonify(result), 400
+        
+        if result['preview_data']:
+            report_id = table_renderer.new_report_id()
+            table_renderer.save_report_tables(report_id, result['preview_data'])
+            result.update({
+                'report_id': report_id,
+                'images_url': url_for('get_report_images', report_id=report_id),
+                'images_zip_url': url_for('download_report_images', report_id=report_id)
+            })
+        else:
+            result.pop('preview_data')
+        output_file = result.pop('output_file')
+        if output_file:
+            output_filename = os.path.basename(output_file)
+            result['download_url'] = download_url_for(output_filename)
+            result['excel_file_name'] = output_filename
         
-        # 处理完成后触发文件清理
         try:
-            cleanup_files_now()
+            cleanup_files_in_background()
         except Exception as e:
             print(f"⚠️ 文件清理失败: {e}")
         
         return jsonify(result)
         
     except RequestEntityTooLarge:
+        progress.fail(request_id, '请求体太大')
         return jsonify({
             'success': False,
-            'message': f'文件太大，请上传小于 {app.config["MAX_CONTENT_LENGTH"] // (1024*1024)}MB 的文件'
+            'message': f'请求体太大，请分批提交小于 {app.config["MAX_CONTENT_LENGTH"] // (1024*1024)}MB 的数据'
         }), 413
     except Exception as e:
+        progress.fail(request_id, f'处理数据时发生错误: {str(e)}')
         return jsonify({
             'success': False,
-            'message': f'处理文件时发生错误: {str(e)}',
+            'message': f'处理数据时发生错误: {str(e)}',
             'errors': [str(e), traceback.format_exc()]
         }), 500
 
-@app.route('/download/<filename>')
-def download_file(filename):
-    """文件下载接口"""
+@app.route('/progress/<request_id>')
+def progress_stream(request_id):
+    """上传处理进度（Server-Sent Events）"""
+    if not progress.is_valid_request_id(request_id):
+        return jsonify({'error': '无效的请求ID'}), 400
+    
+    response = Response(stream_with_context(progress.iter_events(request_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁止nginx缓冲事件流
+    return response
+
+@app.route('/download/<token>')
+def download_file(token):
+    """文件下载接口（按 DOWNLOAD_MODE 由worker发送或交给前置服务器发送）"""
     try:
-        file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-        if os.path.exists(file_path):
-            return send_file(
-                file_path,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-        else:
-            return jsonify({'error': '文件不存在'}), 404
+        filename = downloads.resolve_download_token(token)
+        # 管理员可直接按文件名下载（如收件目录处理的结果）
+        if filename is None and is_admin_request() and downloads.is_safe_filename(token):
+            filename = token
+        if filename is None:
+            return jsonify({'error': '下载链接无效或已过期'}), 403
+        
+        file_path = downloads.output_file_path(filename)
+        if file_path is not None:
+            return downloads.build_download_response(file_path, filename)
+        
+        # 已转入冷存储的报告
+        response = downloads.build_cold_download_response(filename)
+        if response is not None:
+            return response
+        return jsonify({'error': '文件不存在'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/report/<report_id>')
+def get_report_status(report_id):
+    """
+    渐进式报告状态：汇总 -> 预览表格（preview_ready） -> 下载文件（download_url）
+    
+    预览数据较大，只在 ?include=preview 时返回 preview_data，轮询时不重复传输
+    """
+    status = progressive_reports.load_status(report_id)
+    if status is None:
+        return jsonify({'error': '报告不存在或已过期'}), 404
+    
+    status['success'] = status['status'] != 'failed'
+    if status.get('preview_ready'):
+        if 'preview' in request.args.get('include', '').split(','):
+            status['preview_data'] = progressive_reports.load_preview(report_id)
+        status['images_url'] = url_for('get_report_images', report_id=report_id)
+        status['images_zip_url'] = url_for('download_report_images', report_id=report_id)
+    if status.get('excel_file_name'):
+        status['download_url'] = download_url_for(status['excel_file_name'])
+    return jsonify(status)
+
+@app.route('/api/report/<report_id>/images')
+def get_report_images(report_id):
+    """批量渲染报告中所有直营中心表格图片，返回图片地址列表"""
+    try:
+        tables = table_renderer.load_report_tables(report_id)
+        if tables is None:
+            return jsonify({'error': '报告不存在或已过期'}), 404
+        
+        rendered = table_renderer.render_all(tables)
+        return jsonify({
+            'report_id': report_id,
+            'images': [
+                {
+                    'center': center_key,
+                    'url': url_for('get_report_image', report_id=report_id, center_key=center_key)
+                }
+                for center_key, _ in rendered
+            ]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/report/<report_id>/image/<path:center_key>')
+def get_report_image(report_id, center_key):
+    """获取单个直营中心表格图片（按内容哈希缓存）"""
+    try:
+        tables = table_renderer.load_report_tables(report_id)
+        if tables is None or center_key not in tables:
+            return jsonify({'error': '表格不存在'}), 404
+        
+        image_path = table_renderer.render_center(tables[center_key])
+        response = send_file(str(image_path.resolve()), mimetype='image/png', download_name=f"{center_key}_Excel数据表.png")
+        response.headers['Cache-Control'] = 'private, max-age=86400'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/report/<report_id>/images.zip')
+def download_report_images(report_id):
+    """下载报告中所有直营中心表格图片压缩包"""
+    try:
+        tables = table_renderer.load_report_tables(report_id)
+        if tables is None:
+            return jsonify({'error': '报告不存在或已过期'}), 404
+        
+        return send_file(
+            table_renderer.build_zip(tables),
+            as_attachment=True,
+            download_name=f"直营中心表格图片_{report_id}.zip",
+            mimetype='application/zip'
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/history/runs')
+def get_history_runs():
+    """历史运行列表（按时间倒序），支持 start/end 日期范围和 limit"""
+    try:
+        runs = history_store.list_runs(
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+        return jsonify({'success': True, 'runs': runs})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/history/runs/<int:run_id>')
+def get_history_run(run_id):
+    """单次运行的各层级汇总，level 可选 center/team/manager"""
+    run = history_store.get_run(run_id, level=request.args.get('level'))
+    if run is None:
+        return jsonify({'success': False, 'message': '运行记录不存在'}), 404
+    return jsonify({'success': True, 'run': run})
+
+@app.route('/api/history/trend')
+def get_history_trend():
+    """
+    趋势查询：level=center/team/manager 且 name=名称 时返回该直营中心/团队/业务经理的趋势，不带level时返回总体趋势；
+    start/end 为日期范围，bucket=day（默认，每天取最后一次运行）或 run（每次运行）
+    """
+    start = time.perf_counter()
+    try:
+        points = history_store.trend(
+            level=request.args.get('level'),
+            name=request.args.get('name'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            bucket=request.args.get('bucket', 'day')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'level': request.args.get('level'),
+        'name': request.args.get('name'),
+        'points': points,
+        'query_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+@app.route('/api/history/names')
+def get_history_names():
+    """时间范围内出现过的直营中心/团队/业务经理名称，可按 center 过滤"""
+    try:
+        names = history_store.names(
+            level=request.args.get('level', 'center'),
+            center=request.args.get('center'),
+            start=request.args.get('start'),
+            end=request.args.get('end')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'names': names})
+
+@app.route('/api/search')
+def search_report():
+    """在最近一次处理的报告中按客户姓名/业务经理/团队（或其拼音首字母）搜索"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': '请输入搜索内容'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        rows_per_match = min(max(int(request.args.get('rows', 20)), 1), 500)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit/rows 必须是整数'}), 400
+    
+    result = search_index.search(query, limit=limit, rows_per_match=rows_per_match)
+    if result is None:
+        return jsonify({'success': False, 'message': '暂无已处理的报告'}), 404
+    return jsonify({'success': True, 'query': query, **result})
 
 @app.route('/api/stats')
 def get_stats():
@@ -177,7 +612,15 @@ def get_stats():
             'required_columns': app.config['REQUIRED_COLUMNS'],
             'optional_columns': app.config.get('OPTIONAL_COLUMNS', []),
             'file_cleanup_stats': file_stats,
-            'cleanup_retention_days': 1
+            'cleanup_retention_days': get_retention_policy()['cleanup_days'],
+            'retention': get_retention_policy(),
+            'startup': get_startup_metrics(),
+            'progressive_reports': progressive_reports.get_stats(),
+            'logging': log_pipeline.get_stats(),
+            'ingest': read_ingest_status(),
+            'history': history_store.get_stats(),
+            'search': search_index.get_stats(),
+            'storage': storage.get_stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -186,16 +629,16 @@ def get_stats():
 def health_check():
     """健康检查端点 - 用于Docker健康检查和监控"""
     try:
-        # 检查应用基本功能
-        from config import Config
-        from excel_processor import excel_service
-        
         # 简单的状态检查
+        admission_stats = admission_control.get_stats()
         status = {
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
             'service': 'pay-fail-web',
-            'version': '1.0.1'
+            'version': '1.0.1',
+            # 处理能力饱和时仍返回200（避免容器被重启），由编排器根据该字段分流
+            'accepting_uploads': not admission_stats['saturated'],
+            'admission': admission_stats
         }
         
         return jsonify(status)
@@ -206,6 +649,23 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/admin/profile/<profile_id>')
+def download_profile(profile_id):
+    """下载请求采样分析结果（speedscope格式，可在 https://www.speedscope.app 打开）"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': '需要管理员令牌'}), 403
+    if not profiling.is_valid_profile_id(profile_id):
+        return jsonify({'success': False, 'message': '无效的分析ID'}), 400
+    path = profiling.profile_path(profile_id)
+    if not path.exists():
+        return jsonify({'success': False, 'message': '分析结果不存在或已过期'}), 404
+    return send_file(
+        str(path.resolve()),
+        as_attachment=True,
+        download_name=path.name,
+        mimetype='application/json'
+    )
+
 @app.route('/admin/cleanup', methods=['POST'])
 def admin_cleanup():
     """手动清理文件接口"""
@@ -223,6 +683,22 @@ def admin_cleanup():
             'message': f'清理失败: {str(e)}'
         })
 
+@app.route('/admin/archive')
+def admin_archive():
+    """冷存储中的报告列表（按生成时间倒序，附下载链接）"""
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': '需要管理员令牌'}), 403
+    entries = cold_archive.list_entries()
+    for entry in entries:
+        entry['download_url'] = download_url_for(entry['filename'])
+        entry['generated_at'] = datetime.fromtimestamp(entry['mtime']).isoformat(timespec='seconds')
+    return jsonify({
+        'success': True,
+        'retention': get_retention_policy(),
+        'stats': cold_archive.get_stats(),
+        'files': entries
+    })
+
 @app.errorhandler(404)
 def not_found(error):
     """404错误处理"""
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求处理中使用的进程池
+gunicorn worker是多线程进程（请求线程，以及报告心跳、搜索索引、日志等后台线程），直接fork出的子进程
+可能继承其他线程正持有的锁（logging、进度文件写入等）而死锁，还会继承当前请求的进度通道。
+进程池统一按 PROCESS_START_METHOD（默认forkserver，不支持时为spawn）启动子进程，并在子进程初始化时清除进度通道。
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Sequence
+
+from config import Config
+import progress
+
+logger = logging.getLogger(__name__)
+
+# forkserver进程预先导入的模块：子进程由forkserver fork，无需各自重新导入pandas/openpyxl
+FORKSERVER_PRELOAD = ['excel_processor', 'xlsx_reader', 'table_renderer']
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context():
+    """进程池使用的multiprocessing上下文（首次使用时创建）"""
+    global _context
+    with _context_lock:
+        if _context is None:
+            method = Config.PROCESS_START_METHOD
+            if method not in multiprocessing.get_all_start_methods():
+                logger.warning(f"⚠️ 不支持的子进程启动方式 {method}，改用 spawn")
+                method = 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                context.set_forkserver_preload(FORKSERVER_PRELOAD)
+            _context = context
+        return _context
+
+
+def _init_worker(initializer: Optional[Callable], initargs: Sequence):
+    """子进程初始化：不发布所属请求的进度（由父进程按完成的任务汇报），再执行调用方的初始化"""
+    progress.reset_in_child()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def new_process_pool(max_workers: int, initializer: Callable = None, initargs: Sequence = ()) -> ProcessPoolExecutor:
+    """
+    创建进程池
+
+    Args:
+        max_workers (int): 进程数
+        initializer (callable): 子进程初始化函数（须可pickle，即模块级函数）
+        initargs (tuple): 初始化参数，forkserver/spawn 下会序列化传给每个子进程
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=get_context(),
+        initializer=_init_worker,
+        initargs=(initializer, tuple(initargs)),
+    )
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单请求采样分析
+管理员在 /upload 请求上带 X-Profile: 1（或 ?profile=1）时，后台线程按固定间隔采样该请求线程的调用栈，
+统计 ExcelProcessorService 各方法和 pandas/openpyxl 等库内部的耗时，
+结果保存为 speedscope 格式（output/profiles/<profile_id>.speedscope.json），通过 /admin/profile/<profile_id> 下载。
+未开启时不启动采样线程，没有额外开销。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+PROJECT_ROOT = str(Path(__file__).resolve().parent)
+SERVICE_FILE = 'excel_processor.py'
+SERVICE_CLASS = 'ExcelProcessorService.'
+
+# 按栈顶帧所在路径归类耗时
+LIBRARIES = ['pandas', 'openpyxl', 'numpy', 'pypinyin', 'PIL', 'werkzeug', 'flask']
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+def profiles_dir() -> Path:
+    return Path(Config.OUTPUT_FOLDER) / 'profiles'
+
+
+def is_valid_profile_id(profile_id: Optional[str]) -> bool:
+    return bool(profile_id) and bool(PROFILE_ID_PATTERN.match(profile_id))
+
+
+def profile_path(profile_id: str) -> Path:
+    return profiles_dir() / f"{profile_id}.speedscope.json"
+
+
+def _library_of(filename: str) -> str:
+    parts = Path(filename).parts
+    for library in LIBRARIES:
+        if library in parts:
+            return library
+    if filename.startswith(PROJECT_ROOT) and 'site-packages' not in parts:
+        return 'app'
+    return 'other'
+
+
+class SamplingProfiler:
+    """后台线程定期采样目标线程的调用栈，权重为两次采样之间的实际间隔"""
+
+    def __init__(self, thread_id: int, interval: float = None):
+        self.thread_id = thread_id
+        self.interval = interval or Config.PROFILE_SAMPLE_INTERVAL
+        self.frames: List[Tuple[str, str, int]] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        # (栈帧索引元组 根->叶, 权重秒数)，相邻相同的栈合并
+        self.samples: List[List] = []
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.duration = time.perf_counter() - self.started_at
+
+    def _loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                return
+            self._record(self._stack_of(frame), now - last)
+            last = now
+
+    def _stack_of(self, frame) -> Tuple[int, ...]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append(key)
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _record(self, stack: Tuple[int, ...], weight: float):
+        if self.samples and self.samples[-1][0] == stack:
+            self.samples[-1][1] += weight
+        else:
+            self.samples.append([stack, weight])
+
+    def summary(self) -> Dict:
+        """ExcelProcessorService各方法的总耗时（含子调用）和自身耗时（最内层的服务方法），以及按库归类的耗时"""
+        methods: Dict[str, Dict[str, float]] = {}
+        libraries: Dict[str, float] = {}
+        for stack, weight in self.samples:
+            service_methods = []
+            for index in stack:
+                name, filename, _ = self.frames[index]
+                if filename.endswith(SERVICE_FILE) and name.startswith(SERVICE_CLASS) and name not in service_methods:
+                    service_methods.append(name)
+            for name in service_methods:
+                entry = methods.setdefault(name[len(SERVICE_CLASS):], {'total_seconds': 0.0, 'self_seconds': 0.0})
+                entry['total_seconds'] += weight
+            if service_methods:
+                methods[service_methods[-1][len(SERVICE_CLASS):]]['self_seconds'] += weight
+            if stack:
+                library = _library_of(self.frames[stack[-1]][1])
+                libraries[library] = libraries.get(library, 0.0) + weight
+
+        return {
+            'duration_seconds': round(self.duration, 4),
+            'sampled_seconds': round(sum(weight for _, weight in self.samples), 4),
+            'sample_interval': self.interval,
+            'methods': {
+                name: {key: round(value, 4) for key, value in entry.items()}
+                for name, entry in sorted(methods.items(), key=lambda item: -item[1]['total_seconds'])
+            },
+            'libraries': {
+                name: round(value, 4)
+                for name, value in sorted(libraries.items(), key=lambda item: -item[1])
+            },
+        }
+
+    def to_speedscope(self, name: str) -> Dict:
+        end = sum(weight for _, weight in self.samples)
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'pay-fail-web profiling',
+            'activeProfileIndex': 0,
+            'shared': {
+                'frames': [
+                    {'name': frame_name, 'file': filename, 'line': line}
+                    for frame_name, filename, line in self.frames
+                ]
+            },
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': end,
+                'samples': [list(stack) for stack, _ in self.samples],
+                'weights': [weight for _, weight in self.samples],
+            }],
+        }
+
+
+class ProfileSession:
+    """一次请求的分析结果，profile_id 在请求开始时即确定"""
+
+    def __init__(self, name: str):
+        self.profile_id = uuid.uuid4().hex
+        self.name = name
+        self.summary = None
+
+
+@contextmanager
+def profile_request(enabled: bool, name: str = 'upload'):
+    """
+    在当前线程上执行采样分析，结束时保存speedscope文件
+
+    Args:
+        enabled (bool): 未开启时直接返回None
+        name (str): 写入分析文件的名称
+    """
+    if not enabled:
+        yield None
+        return
+
+    session = ProfileSession(name)
+    profiler = SamplingProfiler(threading.get_ident())
+    profiler.start()
+    try:
+        yield session
+    finally:
+        profiler.stop()
+        session.summary = profiler.summary()
+        _save(session, profiler)
+
+
+def _save(session: ProfileSession, profiler: SamplingProfiler):
+    """原子写入speedscope文件"""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = profile_path(session.profile_id)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+    title = f"{session.name} {datetime.now().isoformat(timespec='seconds')}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profiler.to_speedscope(title), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
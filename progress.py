@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传处理进度通道
+处理流程各阶段通过 report() 发布进度，按请求ID写入进度文件（多worker共享），
+/progress/<request_id> 以Server-Sent Events推送给前端
+"""
+
+import os
+import re
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from config import Config
+
+# 请求ID只允许字母数字、下划线和短横线
+REQUEST_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{8,64}$')
+
+# 各阶段在总进度中的起止百分比
+STAGE_PERCENT = {
+    'uploaded': (0, 5),
+    'read': (5, 20),
+    'preprocess': (20, 30),
+    'pivot': (30, 40),
+    'preview': (40, 50),
+    'styling': (50, 95),
+    'saved': (95, 100),
+    'done': (100, 100),
+}
+
+STAGE_TEXT = {
+    'uploaded': '文件上传完成',
+    'read': '正在读取数据',
+    'preprocess': '正在预处理数据',
+    'pivot': '正在生成透视表',
+    'preview': '正在生成预览',
+    'styling': '正在生成Excel样式',
+    'saved': 'Excel文件已保存',
+    'done': '处理完成',
+    'failed': '处理失败',
+    'rejected': '服务器繁忙，未开始处理',
+}
+
+# 当前请求的进度通道（每个请求线程独立）
+_current_channel = contextvars.ContextVar('progress_channel', default=None)
+
+
+def is_valid_request_id(request_id: Optional[str]) -> bool:
+    return bool(request_id) and bool(REQUEST_ID_PATTERN.match(request_id))
+
+
+def _progress_path(request_id: str) -> Path:
+    return Path(Config.OUTPUT_FOLDER) / 'progress' / f'{request_id}.json'
+
+
+class ProgressChannel:
+    """单个请求的进度通道：合并高频更新，按最小间隔落盘"""
+
+    def __init__(self, request_id: str, min_interval: float = None):
+        self.request_id = request_id
+        self.min_interval = Config.PROGRESS_MIN_INTERVAL if min_interval is None else min_interval
+        self.path = _progress_path(request_id)
+        self.state = {'request_id': request_id, 'stage': 'uploaded', 'percent': 0, 'status': 'running', 'seq': 0}
+        self._last_write = 0.0
+        # 已移交后台任务时，请求结束不关闭通道
+        self.detached = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def publish(self, stage: str, force: bool = False, done: int = None, total: int = None, **fields):
+        """
+        发布进度，未到最小间隔的更新只合并到内存状态
+
+        Args:
+            stage (str): 阶段名称，见 STAGE_PERCENT
+            force (bool): 立即写入
+            done/total (int): 阶段内完成量，用于计算阶段内百分比
+        """
+        start, end = STAGE_PERCENT.get(stage, (self.state['percent'], self.state['percent']))
+        if done is not None and total:
+            percent = start + (end - start) * min(1.0, done / total)
+        else:
+            percent = start
+        # 预览和下载文件分两次处理，进度只增不减
+        self.state['percent'] = max(self.state['percent'], round(percent, 1))
+        self.state['stage'] = stage
+        self.state.update(fields)
+
+        now = time.monotonic()
+        if force or now - self._last_write >= self.min_interval:
+            self._flush(now)
+
+    def close(self, status: str = 'done', message: str = None):
+        if status == 'done':
+            self.state['percent'] = 100
+            self.state['stage'] = 'done'
+        else:
+            self.state['stage'] = status
+        self.state['status'] = status
+        if message:
+            self.state['message'] = message
+        self._flush(time.monotonic())
+
+    def _flush(self, now: float):
+        self.state['seq'] += 1
+        self.state['text'] = STAGE_TEXT.get(self.state['stage'], '')
+        tmp_path = self.path.with_name(f'{self.path.stem}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+        self._last_write = now
+
+
+def report(stage: str, force: bool = False, **fields):
+    """处理流程中调用：没有进度通道时（如命令行、子进程）直接返回"""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.publish(stage, force=force, **fields)
+
+
+def reset_in_child():
+    """进程池子进程初始化时调用：清除从父进程继承的进度通道，子进程不写入请求的进度文件"""
+    _current_channel.set(None)
+
+
+@contextmanager
+def track(request_id: Optional[str]):
+    """为当前请求开启进度通道，请求ID无效时不做任何事"""
+    if not is_valid_request_id(request_id):
+        yield None
+        return
+
+    channel = ProgressChannel(request_id)
+    channel.publish('uploaded', force=True)
+    with bind(channel):
+        yield channel
+
+
+def fail(request_id: Optional[str], message: str, status: str = 'failed'):
+    """
+    请求在开启进度通道之前就结束（参数错误、准入拒绝等）时写入结束状态，已订阅的进度流随即停止
+
+    已有进度文件（通道已开启）时不覆盖，请求ID无效时不做任何事
+    """
+    if not is_valid_request_id(request_id) or read_progress(request_id) is not None:
+        return
+    ProgressChannel(request_id).close(status, message)
+
+
+@contextmanager
+def bind(channel: Optional[ProgressChannel], resume: bool = False):
+    """
+    在当前线程中向指定通道发布进度，正常退出时关闭通道
+
+    后台线程接手请求的剩余处理时，请求线程先设置 channel.detached = True（请求结束不关闭通道），
+    后台线程以 resume=True 绑定同一通道，处理结束后关闭
+    """
+    if channel is None:
+        yield None
+        return
+
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    except Exception as e:
+        channel.close('failed', str(e))
+        raise
+    else:
+        if channel.state['status'] == 'running' and (resume or not channel.detached):
+            channel.close('done')
+    finally:
+        _current_channel.reset(token)
+
+
+def read_progress(request_id: str) -> Optional[Dict]:
+    try:
+        with open(_progress_path(request_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def iter_events(request_id: str, poll_interval: float = None, timeout: float = None,
+                start_timeout: float = None) -> Iterator[str]:
+    """
+    轮询进度文件，有变化时生成SSE事件，处理结束或超时后停止
+
+    前端在上传之前订阅，进度文件要等上传完成、通道开启后才出现。start_timeout 秒内没有进度文件时直接结束连接
+    （不发送结束事件，浏览器按 retry 间隔重连），被拒绝或客户端已离开的请求不会一直占用worker线程
+    """
+    poll_interval = poll_interval or Config.PROGRESS_MIN_INTERVAL
+    timeout = timeout or Config.PROGRESS_STREAM_TIMEOUT
+    start_timeout = start_timeout or Config.PROGRESS_START_TIMEOUT
+    started = time.monotonic()
+    deadline = started + timeout
+    last_seq = None
+    last_keepalive = started
+
+    yield 'retry: 2000\n\n'
+    while time.monotonic() < deadline:
+        state = read_progress(request_id)
+        if state is None and last_seq is None and time.monotonic() - started > start_timeout:
+            return
+        if state is not None and state.get('seq') != last_seq:
+            last_seq = state.get('seq')
+            last_keepalive = time.monotonic()
+            yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+            if state.get('status') != 'running':
+                return
+        elif time.monotonic() - last_keepalive > 15:
+            # 注释行保活，防止代理断开空闲连接
+            last_keepalive = time.monotonic()
+            yield ': keepalive\n\n'
+        time.sleep(poll_interval)
+    yield 'event: timeout\ndata: {}\n\n'
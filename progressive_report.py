@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渐进式报告服务
+上传请求在透视表完成后立即返回各直营中心汇总，预览表格和Excel文件在后台线程中继续生成，
+状态通过输出存储后端写入 reports/<report_id>.status.json（多worker共享，STORAGE_BACKEND=s3 时多节点共享），
+前端轮询 /api/report/<report_id>；预览数据单独写入 reports/<report_id>.preview.json，只在请求时返回，轮询响应保持精简。
+后台线程定期在状态中写入心跳，worker退出（超时被杀、max-requests重启）后状态不会停留在 running。
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+import traceback
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import Config
+from table_renderer import table_renderer
+import progress
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressiveReportService:
+    """渐进式报告服务"""
+
+    def __init__(self, output_folder: str = None):
+        """
+        初始化渐进式报告服务
+
+        Args:
+            output_folder (str): 输出目录，默认与表格图片渲染服务共用（报告状态与表格结构在同一存储中）
+        """
+        self.output_folder = output_folder or table_renderer.output_folder
+        self._lock = threading.Lock()
+        # 后台线程和心跳线程共用的状态写入锁
+        self._status_lock = threading.Lock()
+        self._running = 0
+        self.host = socket.gethostname()
+        self.heartbeat_interval = Config.REPORT_HEARTBEAT_INTERVAL
+        self.heartbeat_timeout = Config.REPORT_HEARTBEAT_TIMEOUT
+
+    @property
+    def storage(self):
+        return storage.for_output_dir(self.output_folder)
+
+    @staticmethod
+    def _status_key(report_id: str) -> str:
+        return table_renderer.report_key(report_id, '.status.json')
+
+    @staticmethod
+    def _preview_key(report_id: str) -> str:
+        return table_renderer.report_key(report_id, '.preview.json')
+
+    def _write_status(self, report_id: str, state: Dict, **changes):
+        """更新并原子写入报告状态（state 为后台线程持有的状态字典），同时刷新心跳时间"""
+        with self._status_lock:
+            state.update(changes)
+            state['heartbeat_at'] = time.time()
+            storage.write_json(self.storage, self._status_key(report_id), state)
+
+    def _heartbeat(self, report_id: str, status: Dict, stopped: threading.Event):
+        """心跳线程：后台生成期间每 heartbeat_interval 秒重写一次状态"""
+        while not stopped.wait(self.heartbeat_interval):
+            try:
+                self._write_status(report_id, status)
+            except Exception as e:
+                logger.warning(f"⚠️ 渐进式报告 {report_id} 心跳写入失败: {e}")
+
+    def _is_abandoned(self, status: Dict) -> bool:
+        """running 状态的后台线程是否已不存在：本机进程已退出，或心跳超时"""
+        if status.get('host') == self.host and status.get('pid'):
+            try:
+                os.kill(status['pid'], 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+        heartbeat_at = status.get('heartbeat_at')
+        return heartbeat_at is not None and time.time() - heartbeat_at > self.heartbeat_timeout
+
+    def load_status(self, report_id: str) -> Optional[Dict]:
+        """
+        读取报告状态，不存在时返回None
+
+        running 状态的报告所在进程已退出或心跳超时时按 failed 返回（不修改状态文件）
+        """
+        if not table_renderer.is_valid_report_id(report_id):
+            return None
+        status = storage.read_json(self.storage, self._status_key(report_id))
+        if status is None:
+            return None
+
+        if status.get('status') == 'running' and self._is_abandoned(status):
+            logger.warning(f"⚠️ 渐进式报告 {report_id} 后台生成已中断（{status.get('host')} pid {status.get('pid')}）")
+            status.update({
+                'status': 'failed',
+                'message': '后台生成中断（服务进程已退出），请重新上传文件',
+            })
+        return status
+
+    def load_preview(self, report_id: str) -> Optional[Dict]:
+        """读取报告的预览数据，尚未生成或不存在时返回None"""
+        if not table_renderer.is_valid_report_id(report_id):
+            return None
+        return storage.read_json(self.storage, self._preview_key(report_id))
+
+    def start(self, report_id: str, summary_result: Dict, df, pivot_table, excel_service,
+              output_dir: str, output_mode: str, resources: ExitStack,
+              channel: Optional[progress.ProgressChannel] = None, quality=None):
+        """
+        记录汇总结果并启动后台线程生成预览表格和Excel文件
+
+        Args:
+            report_id (str): 报告ID
+            summary_result (dict): process_excel_summary 的结果
+            df, pivot_table: 预处理后的数据和透视表
+            excel_service: Excel处理服务实例
+            output_dir (str): 输出目录
+            output_mode (str): single 或 split
+            resources (ExitStack): 后台任务结束时释放的资源（准入槽位等），由本服务接管
+            channel (ProgressChannel): 请求的进度通道，由后台线程继续发布并在结束时关闭
+            quality (DataQualityProfile): 预处理时的数据质量检查结果，写入下载文件
+        """
+        status = {
+            'report_id': report_id,
+            'status': 'running',
+            'stage': 'summary',
+            'output_mode': output_mode,
+            'summary': summary_result['summary'],
+            'stats': summary_result['stats'],
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'host': self.host,
+            'pid': os.getpid(),
+        }
+        try:
+            self._write_status(report_id, status)
+            thread = threading.Thread(
+                target=self._run,
+                args=(status, df, pivot_table, excel_service, output_dir, output_mode, resources, channel, quality),
+                name=f'progressive-{report_id}',
+                daemon=True
+            )
+            with self._lock:
+                self._running += 1
+            thread.start()
+        except Exception:
+            # 后台线程未启动，立即释放接管的资源
+            resources.close()
+            raise
+
+        if channel is not None:
+            channel.detached = True
+
+    def _run(self, status: Dict, df, pivot_table, excel_service, output_dir: str, output_mode: str,
+             resources: ExitStack, channel: Optional[progress.ProgressChannel], quality=None):
+        """后台线程：生成预览表格 -> 保存表格结构 -> 生成Excel文件"""
+        report_id = status['report_id']
+        stopped = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(report_id, status, stopped),
+            name=f'progressive-heartbeat-{report_id}',
+            daemon=True
+        )
+        heartbeat.start()
+        try:
+            with resources, progress.bind(channel, resume=True):
+                preview_data = excel_service._generate_preview_data(pivot_table)
+                table_renderer.save_report_tables(report_id, preview_data)
+                storage.write_json(self.storage, self._preview_key(report_id), preview_data)
+                self._write_status(report_id, status, stage='preview', preview_ready=True)
+
+                output_file = excel_service._save_output(df, pivot_table, output_dir, output_mode, quality)
+                self._write_status(
+                    report_id, status,
+                    status='done',
+                    stage='done',
+                    excel_file_name=os.path.basename(output_file),
+                    finished_at=datetime.now().isoformat(timespec='seconds'),
+                )
+                logger.info(f"✅ 渐进式报告 {report_id} 生成完成")
+        except Exception as e:
+            logger.error(f"❌ 渐进式报告 {report_id} 生成失败: {e}")
+            self._write_status(
+                report_id, status,
+                status='failed',
+                message=f'处理文件时发生错误: {str(e)}',
+                errors=[str(e), traceback.format_exc()],
+            )
+        finally:
+            stopped.set()
+            with self._lock:
+                self._running -= 1
+
+    def get_stats(self) -> Dict:
+        """当前worker中正在后台生成的报告数"""
+        with self._lock:
+            return {'running': self._running}
+
+
+# 全局渐进式报告服务实例
+progressive_reports = ProgressiveReportService()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最近一次报告的搜索索引
+透视表完成后，按客户姓名、所属业务经理、所属团队及其拼音首字母建立内存索引（/api/search?q=）：
+- 查询不超过3个字符时直接查n-gram倒排表（索引每个名称和首字母的所有1-3字符子串）
+- 更长的查询取各个3-gram倒排表的交集后再校验子串
+结果按 完全匹配 > 前缀匹配 > 包含 排序，同级按金额降序。
+
+索引数据（透视表行和拼音首字母）通过输出存储后端写入 search/latest.json（STORAGE_BACKEND=s3 时多节点共享），
+其他worker在文件版本变化后重新加载，拼音只在发布报告的进程中计算一次。本模块不导入pandas。
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+MAX_GRAM = 3
+
+# 行数据列（与透视表一致）
+ROW_COLUMNS = ['所属直营中心', '所属团队', '所属业务经理', '客户姓名', '应还款金额']
+
+# 搜索字段：类型 -> (透视表列, 行数据中的位置)，顺序即同级结果的排序优先级
+SEARCH_FIELDS = {
+    'customer': ('客户姓名', 3),
+    'manager': ('所属业务经理', 2),
+    'team': ('所属团队', 1),
+}
+
+# 匹配等级
+EXACT, PREFIX, CONTAINS = 0, 1, 2
+
+
+INDEX_KEY = 'search/latest.json'
+
+# 对象存储每次检查版本需要一次HEAD请求，两次检查之间至少间隔该秒数（本地文件每次查询都检查）
+REMOTE_VERSION_CHECK_INTERVAL = 2.0
+
+
+@lru_cache(maxsize=200000)
+def pinyin_initials(text: str) -> str:
+    """拼音首字母（小写），非汉字部分原样保留；未安装pypinyin时返回空字符串"""
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)).lower()
+
+
+class SearchIndex:
+    """一份报告的内存索引"""
+
+    def __init__(self, rows: List[List], initials: Dict[str, str], source: str = None, created_at: str = None):
+        """
+        Args:
+            rows (list): 透视表行，列顺序见 ROW_COLUMNS
+            initials (dict): 名称 -> 拼音首字母
+            source (str): 来源文件名
+            created_at (str): 报告生成时间
+        """
+        start = time.perf_counter()
+        self.rows = rows
+        self.source = source
+        self.created_at = created_at
+        # 每个 (类型, 名称) 一个条目
+        self.entries: List[Dict] = []
+        self.grams: Dict[str, List[int]] = {}
+
+        entry_ids: Dict[tuple, int] = {}
+        for row_id, row in enumerate(rows):
+            for kind, (_, position) in SEARCH_FIELDS.items():
+                value = row[position]
+                if value is None or value == '':
+                    continue
+                key = (kind, value)
+                entry_id = entry_ids.get(key)
+                if entry_id is None:
+                    entry_id = entry_ids[key] = len(self.entries)
+                    text = str(value).lower()
+                    keys = [text]
+                    initial = initials.get(value, '')
+                    if initial and initial != text:
+                        keys.append(initial)
+                    self.entries.append({'kind': kind, 'name': value, 'keys': keys, 'rows': [], 'total': 0.0})
+                    self._add_grams(entry_id, keys)
+                entry = self.entries[entry_id]
+                entry['rows'].append(row_id)
+                entry['total'] += row[4] or 0
+        self.build_seconds = time.perf_counter() - start
+
+    def _add_grams(self, entry_id: int, keys: List[str]):
+        grams = set()
+        for key in keys:
+            for size in range(1, MAX_GRAM + 1):
+                for i in range(len(key) - size + 1):
+                    grams.add(key[i:i + size])
+        for gram in grams:
+            posting = self.grams.get(gram)
+            if posting is None:
+                self.grams[gram] = [entry_id]
+            else:
+                posting.append(entry_id)
+
+    def _candidates(self, query: str) -> List[int]:
+        if len(query) <= MAX_GRAM:
+            return self.grams.get(query, [])
+        postings = []
+        for i in range(len(query) - MAX_GRAM + 1):
+            posting = self.grams.get(query[i:i + MAX_GRAM])
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                break
+        return list(result)
+
+    def search(self, query: str, limit: int = 20, rows_per_match: int = 20) -> List[Dict]:
+        """
+        搜索客户姓名/业务经理/团队
+
+        Args:
+            query (str): 名称片段或拼音首字母（不区分大小写）
+            limit (int): 最多返回的匹配项数
+            rows_per_match (int): 每个匹配项最多返回的透视表行数
+
+        Returns:
+            list: 匹配项，包含类型、名称、命中方式、行数、金额合计和带直营中心/团队上下文的行
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        kind_order = {kind: i for i, kind in enumerate(SEARCH_FIELDS)}
+        ranked = []
+        for entry_id in self._candidates(query):
+            entry = self.entries[entry_id]
+            best = None
+            for key_index, key in enumerate(entry['keys']):
+                position = key.find(query)
+                if position < 0:
+                    continue
+                level = EXACT if key == query else PREFIX if position == 0 else CONTAINS
+                if best is None or level < best[0]:
+                    best = (level, key_index)
+            if best is not None:
+                ranked.append((best[0], kind_order[entry['kind']], -entry['total'], entry_id, best[1]))
+        ranked.sort()
+
+        matches = []
+        for level, _, _, entry_id, key_index in ranked[:limit]:
+            entry = self.entries[entry_id]
+            matches.append({
+                'type': entry['kind'],
+                'name': entry['name'],
+                'matched_by': 'initials' if key_index else 'name',
+                'match': ('exact', 'prefix', 'contains')[level],
+                'row_count': len(entry['rows']),
+                'total_amount': round(entry['total'], 2),
+                'rows': [dict(zip(ROW_COLUMNS, self.rows[row_id])) for row_id in entry['rows'][:rows_per_match]],
+            })
+        return matches
+
+    def info(self) -> Dict:
+        return {
+            'source': self.source,
+            'created_at': self.created_at,
+            'rows': len(self.rows),
+            'entries': len(self.entries),
+        }
+
+
+class SearchIndexService:
+    """维护最近一次报告的索引：发布时写入共享存储，查询时按文件版本重新加载"""
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path (str): 索引文件路径（基准测试等使用本地文件），默认写入输出存储的 search/latest.json
+        """
+        self._path = Path(path) if path else None
+        self._index: Optional[SearchIndex] = None
+        self._loaded_version = None
+        self._checked_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def storage(self):
+        if self._path is not None:
+            return storage.LocalStorage(str(self._path.parent))
+        return storage.get_storage('output')
+
+    @property
+    def key(self) -> str:
+        return self._path.name if self._path is not None else INDEX_KEY
+
+    def publish(self, pivot_table, source: str = None, background: bool = True):
+        """
+        发布新报告的索引（透视表完成后调用）
+
+        在调用线程中只提取透视表行；拼音首字母、写文件和建立索引在后台线程中完成，不增加处理耗时
+
+        Args:
+            pivot_table: 透视表
+            source (str): 来源文件名
+            background (bool): 是否在后台线程中建立索引
+        """
+        columns = [col if col in pivot_table.columns else None for col in ROW_COLUMNS]
+        values = [
+            pivot_table[col].astype(object).where(pivot_table[col].notna(), None).tolist() if col else [None] * len(pivot_table)
+            for col in columns
+        ]
+        # 名称统一为字符串（JSON键和查询都按字符串处理）
+        for i in range(4):
+            values[i] = [None if value is None else str(value) for value in values[i]]
+        values[4] = [float(amount) if amount is not None else 0.0 for amount in values[4]]
+        rows = [list(row) for row in zip(*values)]
+        created_at = datetime.now().isoformat(timespec='seconds')
+
+        if background:
+            threading.Thread(target=self._build_and_save, args=(rows, source, created_at),
+                             name='search-index', daemon=True).start()
+        else:
+            self._build_and_save(rows, source, created_at)
+
+    def _build_and_save(self, rows: List[List], source: str, created_at: str):
+        try:
+            start = time.perf_counter()
+            names = {row[position] for row in rows for _, position in SEARCH_FIELDS.values() if row[position]}
+            initials = {name: pinyin_initials(name) for name in names}
+            initials = {name: value for name, value in initials.items() if value}
+            index = SearchIndex(rows, initials, source, created_at)
+            index_storage = self.storage
+            storage.write_json(index_storage, self.key, {
+                'version': INDEX_VERSION,
+                'source': source,
+                'created_at': created_at,
+                'rows': rows,
+                'initials': initials,
+            })
+            version = index_storage.version(self.key)
+            with self._lock:
+                self._index = index
+                self._loaded_version = version
+                self._checked_version = version
+                self._checked_at = time.monotonic()
+            logger.info(f"🔎 搜索索引已更新：{len(rows)} 行，{len(index.entries)} 个名称，"
+                        f"耗时 {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"⚠️ 建立搜索索引失败: {e}")
+
+    def _version(self, index_storage) -> Optional[str]:
+        """索引文件当前版本；对象存储在检查间隔内复用上次的结果"""
+        if index_storage.backend != 'local':
+            now = time.monotonic()
+            if now - self._checked_at < REMOTE_VERSION_CHECK_INTERVAL:
+                return self._checked_version
+            self._checked_version = index_storage.version(self.key)
+            self._checked_at = now
+            return self._checked_version
+        return index_storage.version(self.key)
+
+    def current(self) -> Optional[SearchIndex]:
+        """当前索引；其他进程发布了新报告时重新加载，报告文件被清理后返回None"""
+        index_storage = self.storage
+        version = self._version(index_storage)
+        if version is None:
+            return None
+        if version == self._loaded_version and self._index is not None:
+            return self._index
+        with self._lock:
+            if version != self._loaded_version or self._index is None:
+                data = storage.read_json(index_storage, self.key)
+                if data is None:
+                    logger.warning("⚠️ 读取搜索索引失败")
+                    return self._index
+                if data.get('version') != INDEX_VERSION:
+                    return None
+                self._index = SearchIndex(data['rows'], data['initials'], data.get('source'), data.get('created_at'))
+                self._loaded_version = version
+            return self._index
+
+    def search(self, query: str, limit: int = 20, rows_per_match: int = 20) -> Optional[Dict]:
+        """
+        在最近一次报告中搜索
+
+        Returns:
+            dict: {'report': 报告信息, 'matches': 匹配项, 'took_ms': 查询耗时}；没有报告时返回None
+        """
+        index = self.current()
+        if index is None:
+            return None
+        start = time.perf_counter()
+        matches = index.search(query, limit=limit, rows_per_match=rows_per_match)
+        return {
+            'report': index.info(),
+            'matches': matches,
+            'took_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def get_stats(self) -> Dict:
+        index = self.current()
+        if index is None:
+            return {'rows': 0}
+        return {**index.info(), 'build_seconds': round(index.build_seconds, 3)}
+
+
+# 全局搜索索引服务实例
+search_index = SearchIndexService()
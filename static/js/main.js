@@ -45,6 +45,25 @@ function processFile(file) {
     
     const formData = new FormData();
     formData.append('file', file);
+    formData.append('output_mode', $('#splitByCenter').is(':checked') ? 'split' : 'single');
+    // 增量：与上次上传对比，只重新计算变化的直营中心；否则渐进式返回汇总，下载文件在后台生成
+    if ($('#incrementalMode').is(':checked')) {
+        formData.append('incremental', '1');
+    } else {
+        formData.append('progressive', '1');
+    }
+    
+    // 订阅服务端处理进度
+    const requestId = generateRequestId();
+    formData.append('request_id', requestId);
+    let serverPercent = 0;
+    const progressSource = openProgressStream(requestId, function(percent, state) {
+        serverPercent = Math.max(serverPercent, percent);
+        updateProgress(Math.min(serverPercent, 99));
+        if (state.text) {
+            $('.process-subtitle').text(state.text);
+        }
+    });
     
     // Ajax上传和处理
     $.ajax({
@@ -58,9 +77,9 @@ function processFile(file) {
             const xhr = new window.XMLHttpRequest();
             // 上传进度
             xhr.upload.addEventListener('progress', function(evt) {
-                if (evt.lengthComputable) {
-                    const percentComplete = Math.round((evt.loaded / evt.total) * 100);
-                    updateProgress(Math.min(percentComplete, 90));
+                if (evt.lengthComputable && serverPercent === 0) {
+                    const percentComplete = Math.round((evt.loaded / evt.total) * 30);
+                    updateProgress(percentComplete);
                 }
             });
             return xhr;
@@ -68,6 +87,10 @@ function processFile(file) {
         success: function(response) {
             console.log('收到响应:', response);
             updateProgress(100);
+            if (response.success && response.progressive) {
+                showProgressiveResult(response);
+                return;
+            }
             setTimeout(() => {
                 showResult(response);
             }, 500);
@@ -80,6 +103,8 @@ function processFile(file) {
                 errorMessage = xhr.responseJSON.message;
             } else if (xhr.status === 413) {
                 errorMessage = '文件太大，请选择较小的文件';
+            } else if (xhr.status === 429) {
+                errorMessage = `服务器繁忙，请 ${xhr.getResponseHeader('Retry-After') || 10} 秒后重试`;
             } else if (xhr.status === 0) {
                 errorMessage = '网络连接失败，请检查网络';
             } else if (status === 'timeout') {
@@ -87,13 +112,43 @@ function processFile(file) {
             }
             
             showError(errorMessage);
+        },
+        complete: function() {
+            if (progressSource) {
+                progressSource.close();
+            }
         }
     });
 }
 
+// 生成处理进度请求ID
+function generateRequestId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID().replace(/-/g, '');
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2, 12);
+}
+
+// 订阅服务端处理进度（SSE），上传字节占前30%，服务端处理占后70%
+function openProgressStream(requestId, onProgress) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource(`/progress/${requestId}`);
+    source.onmessage = function(event) {
+        const state = JSON.parse(event.data);
+        onProgress(30 + Math.round((state.percent || 0) * 0.7), state);
+        if (state.status && state.status !== 'running') {
+            source.close();
+        }
+    };
+    source.addEventListener('timeout', () => source.close());
+    return source;
+}
+
 // 文件验证
 function validateFile(file) {
-    const allowedTypes = ['.xlsx', '.xls'];
+    const allowedTypes = ['.xlsx', '.xls', '.csv', '.tsv'];
     const maxSize = 16 * 1024 * 1024; // 16MB
     
     // 检查文件类型
@@ -101,7 +156,7 @@ function validateFile(file) {
     const isValidType = allowedTypes.some(type => fileName.endsWith(type));
     
     if (!isValidType) {
-        showAlert('不支持的文件格式，请选择 .xlsx 或 .xls 文件', 'danger');
+        showAlert('不支持的文件格式，请选择 .xlsx、.xls、.csv 或 .tsv 文件', 'danger');
         return false;
     }
     
@@ -114,6 +169,25 @@ function validateFile(file) {
     return true;
 }
 
+// HTML转义（直营中心、客户姓名等来自上传数据，拼接HTML前必须转义；预览表格脚本共用）
+function escapeHtml(value) {
+    return String(value === null || value === undefined ? '' : value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+// 页面顶部提示，3秒后自动关闭
+function showAlert(message, type = 'info') {
+    const alert = $('<div class="page-alert"></div>').addClass(`page-alert-${type}`).text(message);
+    $('body').append(alert);
+    setTimeout(() => {
+        alert.fadeOut(300, () => alert.remove());
+    }, 3000);
+}
+
 // 显示处理状态
 function showProcessing() {
     $('#uploadSection').hide();
@@ -135,14 +209,142 @@ function showResult(result) {
         // 保存下载链接
         window.downloadUrl = result.download_url;
         
+        if (result.changes) {
+            showChangeSummary(result.changes);
+        }
+        showQualityWarning(result.stats);
         $('#resultSection').show();
+        if (result.preview_data) {
+            showPreviewTables(result.preview_data, result.report_id);
+        }
     } else {
         showError(result.message || '处理失败，请重试');
     }
 }
 
+// 数据质量提示：列出发现问题的检查项和数量（示例行见下载文件或接口返回）
+function showQualityWarning(stats) {
+    const quality = stats && stats['数据质量'];
+    if (!quality || !quality['问题数']) {
+        $('#qualityWarning').empty().hide();
+        return;
+    }
+    const items = quality['检查项'].map(issue => $('<li></li>').text(`${issue['说明']}：${issue['数量']}`));
+    $('#qualityWarning').empty().append(
+        $('<div class="quality-warning-title"></div>')
+            .append('<i class="fas fa-exclamation-triangle"></i> ')
+            .append(document.createTextNode(`数据质量检查发现 ${quality['问题数']} 类问题，请核对导出文件：`)),
+        $('<ul></ul>').append(items)
+    ).show();
+}
+
+// 增量处理：显示与上次上传相比的变化
+function showChangeSummary(changes) {
+    if (changes.baseline) {
+        $('.result-subtitle').text('已保存为对比基准，下次上传将只处理变化的数据');
+        return;
+    }
+    
+    const formatAmount = amount => Number(amount).toLocaleString('zh-CN', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+    const rows = changes.centers.map(center => `
+        <tr>
+            <td>${escapeHtml(center.name)}</td>
+            <td>${center.row_delta > 0 ? '+' : ''}${center.row_delta}</td>
+            <td>${center.amount_delta > 0 ? '+' : ''}¥${formatAmount(center.amount_delta)}</td>
+        </tr>`).join('');
+    $('.result-subtitle').text(
+        `与上次（${changes.previous_run}）相比：新增 ${changes.customers_added} 位、减少 ${changes.customers_removed} 位、` +
+        `变化 ${changes.customers_modified} 位客户，重新计算 ${changes.recomputed_centers.length} 个直营中心`
+    );
+    if (rows) {
+        $('#centerSummary').html(`
+            <table class="center-summary-table">
+                <thead><tr><th>直营中心</th><th>行数变化</th><th>金额变化</th></tr></thead>
+                <tbody>${rows}</tbody>
+            </table>`).show();
+    }
+}
+
+// 渐进式结果：先显示各直营中心汇总，轮询报告状态直到下载文件生成
+let reportPollTimer = null;
+let previewShown = false;
+const REPORT_POLL_INTERVAL = 1000;
+// 连续失败次数或总等待时间超过上限时停止轮询并提示错误
+const REPORT_POLL_MAX_ERRORS = 5;
+const REPORT_POLL_DEADLINE = 30 * 60 * 1000;
+
+function showProgressiveResult(result) {
+    $('#processSection').hide();
+    window.downloadUrl = null;
+    
+    const rows = result.summary.map(center => `
+        <tr>
+            <td>${escapeHtml(center.name)}</td>
+            <td>${escapeHtml(center.row_count)}</td>
+            <td>¥${Number(center.total_amount).toLocaleString('zh-CN', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}</td>
+        </tr>`).join('');
+    $('#centerSummary').html(`
+        <table class="center-summary-table">
+            <thead><tr><th>直营中心</th><th>行数</th><th>应还款金额</th></tr></thead>
+            <tbody>${rows}</tbody>
+        </table>`).show();
+    showQualityWarning(result.stats);
+    
+    $('.result-title').text('汇总完成');
+    $('.result-subtitle').text('正在生成下载文件...');
+    $('#downloadBtn').prop('disabled', true);
+    $('#resultSection').show();
+    
+    previewShown = false;
+    pollReportStatus(result.status_url, Date.now() + REPORT_POLL_DEADLINE, 0);
+}
+
+function pollReportStatus(statusUrl, deadline, errorCount) {
+    const scheduleNext = count => {
+        if (Date.now() > deadline) {
+            showError('生成下载文件超时，请重新上传');
+            return;
+        }
+        reportPollTimer = setTimeout(() => pollReportStatus(statusUrl, deadline, count), REPORT_POLL_INTERVAL);
+    };
+    
+    $.getJSON(statusUrl).done(function(status) {
+        // 预览表格就绪后单独获取一次预览数据，下载文件继续在后台生成
+        if (status.preview_ready && !previewShown) {
+            previewShown = true;
+            $.getJSON(statusUrl, { include: 'preview' }).done(function(withPreview) {
+                if (withPreview.preview_data && previewShown) {
+                    showPreviewTables(withPreview.preview_data, withPreview.report_id);
+                }
+            }).fail(function() {
+                previewShown = false;
+            });
+        }
+        if (status.status === 'done') {
+            window.downloadUrl = status.download_url;
+            $('.result-title').text('处理完成！');
+            $('.result-subtitle').text('您的Excel文件已成功处理，可以下载了');
+            $('#downloadBtn').prop('disabled', false);
+        } else if (status.status === 'failed') {
+            showError(status.message || '处理失败，请重试');
+        } else {
+            scheduleNext(0);
+        }
+    }).fail(function(xhr) {
+        if (xhr.status === 404) {
+            showError('报告不存在或已过期，请重新上传');
+        } else if (errorCount + 1 >= REPORT_POLL_MAX_ERRORS) {
+            showError('无法获取处理状态，请检查网络后重新上传');
+        } else {
+            scheduleNext(errorCount + 1);
+        }
+    });
+}
+
 // 显示错误
 function showError(message) {
+    clearTimeout(reportPollTimer);
+    $('#resultSection').hide();
     $('#processSection').hide();
     $('#errorMessage').text(message);
     $('#errorSection').show();
@@ -158,6 +360,16 @@ function resetToUpload() {
     // 清空文件选择
     $('#fileInput').val('');
     window.downloadUrl = null;
+    
+    // 停止渐进式报告轮询并恢复结果区域
+    clearTimeout(reportPollTimer);
+    previewShown = false;
+    $('#centerSummary').empty().hide();
+    $('#qualityWarning').empty().hide();
+    clearPreviewTables();
+    $('.result-title').text('处理完成！');
+    $('.result-subtitle').text('您的Excel文件已成功处理，可以下载了');
+    $('#downloadBtn').prop('disabled', false);
 }
 
 // 设置拖拽上传（简洁版）
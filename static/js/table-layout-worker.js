@@ -0,0 +1,17 @@
+// 表格合并布局计算Worker
+// 计算逻辑见 table-layout.js（页面在不支持Worker时直接调用同一份实现）
+importScripts('table-layout.js');
+
+// 每个请求带ID，回复时原样带回，页面据此匹配并发的多个请求
+self.onmessage = function(event) {
+    const { id, headers, rowCount, mergeInfo } = event.data;
+    const columns = computeRowSpanLayout(headers, rowCount, mergeInfo);
+
+    // 以Transferable方式回传，避免大数组复制
+    const transfer = [];
+    Object.keys(columns).forEach(colIndex => {
+        transfer.push(columns[colIndex].groupStart.buffer, columns[colIndex].groupEnd.buffer);
+    });
+
+    self.postMessage({ id: id, columns: columns }, transfer);
+};
@@ -0,0 +1,34 @@
+// 表格合并布局计算（页面直接加载，合并布局Worker通过importScripts加载同一份实现）
+// 根据服务端返回的merge_info计算每一行在合并列上所属的合并组，避免在主线程上遍历DOM
+
+// 计算合并布局：每个合并列返回两个数组，groupStart[i]/groupEnd[i] 为第i行所在合并组的起止行
+function computeRowSpanLayout(headers, rowCount, mergeInfo) {
+    const columns = {};
+
+    Object.keys(mergeInfo || {}).forEach(colName => {
+        const colIndex = headers.indexOf(colName);
+        if (colIndex === -1) {
+            return;
+        }
+
+        const groupStart = new Int32Array(rowCount);
+        const groupEnd = new Int32Array(rowCount);
+        // 默认每行单独成组
+        for (let i = 0; i < rowCount; i++) {
+            groupStart[i] = i;
+            groupEnd[i] = i;
+        }
+
+        mergeInfo[colName].forEach(group => {
+            const end = Math.min(group.end, rowCount - 1);
+            for (let i = group.start; i <= end; i++) {
+                groupStart[i] = group.start;
+                groupEnd[i] = end;
+            }
+        });
+
+        columns[colIndex] = { groupStart: groupStart, groupEnd: groupEnd };
+    });
+
+    return columns;
+}
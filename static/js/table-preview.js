@@ -1,246 +1,205 @@
 // 表格预览和图片复制功能
+// 由首页在 main.js 之后加载：main.js 拿到预览数据（/upload 响应或渐进式报告状态）后调用 showPreviewTables
 let previewData = {};
-let processStats = {};
-
-$(document).ready(function() {
-    // 文件选择变化
-    $('#fileInput').on('change', function() {
-        const file = this.files[0];
-        if (file) {
-            showFileInfo(file);
-        } else {
-            hideFileInfo();
-        }
-    });
+let currentReportId = null;  // 服务端报告ID，用于获取服务端渲染的表格图片
 
-    // 设置拖拽上传
-    setupDragAndDrop();
-});
+// 虚拟滚动配置：行数超过阈值的表格只渲染可视区域内的行
+const VIRTUAL_ROW_THRESHOLD = 200;
+const VIRTUAL_VIEWPORT_HEIGHT = 360;
+const VIRTUAL_OVERSCAN = 20;
+const DEFAULT_ROW_HEIGHT = 38;
 
-// 显示文件信息并自动上传
-function showFileInfo(file) {
-    if (!validateFile(file)) {
-        hideFileInfo();
-        return;
-    }
+// 每个直营中心的渲染状态：合并布局、行高、当前渲染窗口
+const tableStates = {};
+// 每次显示新的预览数据递增，丢弃上一次尚未完成的渲染
+let previewGeneration = 0;
 
-    // 显示文件信息
-    $('#fileName').text(file.name);
-    $('#fileSize').text(formatFileSize(file.size));
-    $('#fileType').text(file.name.split('.').pop().toUpperCase());
-    
-    $('#fileInfoContainer').fadeIn();
-    $('#autoUploadTip').fadeIn();
-    
-    // 自动上传，无需确认
-    setTimeout(() => {
-        uploadAndPreview();
-    }, 800); // 延迟800ms让用户看到文件信息
-}
+// 合并布局Worker：请求ID -> { table, resolve }，按回复中的ID匹配
+let layoutWorker = null;
+let layoutRequestSeq = 0;
+const layoutRequests = {};
+
+// 显示预览表格
+async function showPreviewTables(data, reportId) {
+    previewData = data || {};
+    currentReportId = reportId || null;
+    const generation = ++previewGeneration;
 
-// 隐藏文件信息
-function hideFileInfo() {
-    $('#fileInfoContainer').fadeOut();
-    $('#autoUploadTip').fadeOut();
+    const layouts = await computeAllLayouts();
+    if (generation !== previewGeneration) {
+        return;
+    }
+    generateTables(layouts);
+    $('.main-action-area').addClass('has-preview');
+    $('#previewSection').show();
 }
 
-// 格式化文件大小
-function formatFileSize(bytes) {
-    if (bytes === 0) return '0 Bytes';
-    const k = 1024;
-    const sizes = ['Bytes', 'KB', 'MB', 'GB'];
-    const i = Math.floor(Math.log(bytes) / Math.log(k));
-    return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
+// 清空预览表格（重新上传时）
+function clearPreviewTables() {
+    previewGeneration += 1;
+    previewData = {};
+    currentReportId = null;
+    Object.keys(tableStates).forEach(key => delete tableStates[key]);
+    $('#tablesContainer').empty();
+    $('#previewSection').hide();
+    $('.main-action-area').removeClass('has-preview');
 }
 
-// 上传并预览文件
-function uploadAndPreview() {
-    const fileInput = document.getElementById('fileInput');
-    const file = fileInput.files[0];
-    
-    if (!file) {
-        showAlert('请选择一个文件', 'warning');
-        return;
+// 获取合并布局Worker（不支持Worker时返回null，在主线程计算）
+function getLayoutWorker() {
+    if (layoutWorker === null && window.Worker) {
+        try {
+            layoutWorker = new Worker('/static/js/table-layout-worker.js');
+            layoutWorker.onmessage = handleLayoutMessage;
+            layoutWorker.onerror = handleLayoutWorkerError;
+        } catch (error) {
+            console.warn('合并布局Worker创建失败，使用主线程计算:', error);
+            layoutWorker = false;
+        }
     }
+    return layoutWorker || null;
+}
 
-    if (!validateFile(file)) {
-        return;
+function handleLayoutMessage(event) {
+    const request = layoutRequests[event.data.id];
+    if (request) {
+        delete layoutRequests[event.data.id];
+        request.resolve(event.data.columns);
     }
+}
 
-    const formData = new FormData();
-    formData.append('file', file);
-
-    // 显示进度条
-    showProgress();
-    updateProgress(10, '正在上传文件...');
-
-    // 禁用上传按钮
-    const uploadBtn = $('#uploadBtn');
-    const originalText = uploadBtn.html();
-    uploadBtn.prop('disabled', true);
-    uploadBtn.html('<i class="fas fa-spinner fa-spin me-2"></i>处理中...');
-
-    // Ajax上传
-    $.ajax({
-        url: '/upload',
-        type: 'POST',
-        data: formData,
-        processData: false,
-        contentType: false,
-        xhr: function() {
-            const xhr = new window.XMLHttpRequest();
-            xhr.upload.addEventListener('progress', function(evt) {
-                if (evt.lengthComputable) {
-                    const percentComplete = Math.round((evt.loaded / evt.total) * 50);
-                    updateProgress(percentComplete, '上传中...');
-                }
-            });
-            return xhr;
-        },
-        success: function(response) {
-            updateProgress(80, '正在生成结果...');
-            setTimeout(() => {
-                hideProgress();
-                if (response.success) {
-                    showResult(response);
-                } else {
-                    showAlert(response.message || '处理失败', 'danger');
-                }
-            }, 1000);
-        },
-        error: function(xhr, status, error) {
-            hideProgress();
-            let errorMessage = '上传失败';
-            
-            if (xhr.responseJSON && xhr.responseJSON.message) {
-                errorMessage = xhr.responseJSON.message;
-            } else if (xhr.status === 413) {
-                errorMessage = '文件太大，请选择较小的文件';
-            } else if (xhr.status === 0) {
-                errorMessage = '网络连接失败，请检查网络';
-            }
-            
-            showAlert(errorMessage, 'danger');
-        },
-        complete: function() {
-            // 恢复上传按钮
-            uploadBtn.prop('disabled', false);
-            uploadBtn.html(originalText);
-        }
+// Worker脚本加载或执行失败：停用Worker，未完成的请求改在主线程计算
+function handleLayoutWorkerError(error) {
+    console.warn('合并布局Worker出错，使用主线程计算:', error.message || error);
+    layoutWorker.terminate();
+    layoutWorker = false;
+    Object.keys(layoutRequests).forEach(id => {
+        const request = layoutRequests[id];
+        delete layoutRequests[id];
+        request.resolve(computeTableLayout(request.table));
     });
 }
 
-// 显示处理结果
-function showResult(response) {
-    processStats = response.stats;
-    
-    // 隐藏上传区域，显示结果区域
-    $('#introCard').hide();
-    $('#resultContainer').show();
-    
-    // 显示Excel下载按钮
-    if (response.download_url) {
-        const downloadBtn = $('#downloadExcelBtn');
-        downloadBtn.show();
-        downloadBtn.off('click').on('click', function() {
-            window.open(response.download_url, '_blank');
-        });
+function computeTableLayout(table) {
+    return computeRowSpanLayout(table.headers, table.rows.length, table.merge_info);
+}
+
+// 计算单个表格的合并布局
+function requestTableLayout(table) {
+    const worker = getLayoutWorker();
+    if (!worker) {
+        return Promise.resolve(computeTableLayout(table));
     }
-    
-    // 显示统计信息
-    showStatsInfo();
-    
-    // 滚动到结果区域
-    $('html, body').animate({
-        scrollTop: $('#resultContainer').offset().top - 100
-    }, 1000);
+    return new Promise(resolve => {
+        const id = ++layoutRequestSeq;
+        layoutRequests[id] = { table: table, resolve: resolve };
+        worker.postMessage({
+            id: id,
+            headers: table.headers,
+            rowCount: table.rows.length,
+            mergeInfo: table.merge_info
+        });
+    });
 }
 
-// 显示统计信息
-function showStatsInfo() {
-    const statsHtml = `
-        <div class="row g-3">
-            <div class="col-md-3">
-                <div class="text-center">
-                    <div class="h4 text-primary mb-1">${processStats['原始数据行数'] || 0}</div>
-                    <small class="text-muted">原始数据行数</small>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="text-center">
-                    <div class="h4 text-info mb-1">${processStats['透视表行数'] || 0}</div>
-                    <small class="text-muted">处理后行数</small>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="text-center">
-                    <div class="h4 text-success mb-1">${processStats['直营中心数量'] || 0}</div>
-                    <small class="text-muted">直营中心数</small>
-                </div>
-            </div>
-            <div class="col-md-3">
-                <div class="text-center">
-                    <div class="h4 text-warning mb-1">¥${formatNumber(processStats['总金额'] || 0)}</div>
-                    <small class="text-muted">总金额</small>
-                </div>
-            </div>
-        </div>
-    `;
-    $('#statsInfo').html(statsHtml);
+// 计算所有直营中心的合并布局，返回 centerKey -> columns
+async function computeAllLayouts() {
+    const centerKeys = Object.keys(previewData).filter(key => previewData[key].excel_table);
+    const columns = await Promise.all(centerKeys.map(key => requestTableLayout(previewData[key].excel_table)));
+    const layouts = {};
+    centerKeys.forEach((key, index) => {
+        layouts[key] = columns[index];
+    });
+    return layouts;
+}
+
+// 替换模板变量（值按原样插入，不解析 $& 等替换模式）
+function fillTemplate(template, values) {
+    return template.replace(/{(\w+)}/g, (match, name) => (name in values ? values[name] : match));
 }
 
 // 生成Excel风格表格
-function generateTables() {
+function generateTables(layouts) {
     const container = $('#tablesContainer');
     container.empty();
-    
+    Object.keys(tableStates).forEach(key => delete tableStates[key]);
+
     const template = $('#excelTableTemplate').html();
-    
-    // 按直营中心顺序生成Excel风格表格
+
+    // 按直营中心顺序生成Excel风格表格（只生成外框，数据行按需渲染）
     Object.keys(previewData).forEach(centerKey => {
         const centerData = previewData[centerKey];
         const excelTable = centerData.excel_table;
-        
+
         if (!excelTable) {
             console.error('Missing excel_table data for', centerKey);
             return;
         }
-        
+
         // 生成表头
-        const headers = excelTable.headers.map(col => `<th>${col}</th>`).join('');
-        
-        // 生成数据行with合并和样式
-        const rows = generateExcelRows(excelTable);
-        
-        // 替换模板变量
-        let tableHtml = template
-            .replace(/{centerTitle}/g, excelTable.center_title)
-            .replace(/{centerKey}/g, centerKey)
-            .replace(/{headers}/g, headers)
-            .replace(/{rows}/g, rows)
-            .replace(/{rowCount}/g, centerData.row_count || centerData.raw_data.length)
-            .replace(/{totalAmount}/g, formatNumber(centerData.total_amount || 0));
-        
-        container.append(tableHtml);
+        const headers = excelTable.headers.map(col => `<th>${escapeHtml(col)}</th>`).join('');
+
+        const tableElement = $(fillTemplate(template.trim(), {
+            centerTitle: escapeHtml(excelTable.center_title),
+            centerKey: escapeHtml(centerKey),
+            headers: headers,
+            rows: '',
+            rowCount: centerData.row_count || centerData.raw_data.length,
+            totalAmount: formatNumber(centerData.total_amount || 0)
+        }));
+        container.append(tableElement);
+
+        const wrapper = tableElement.find('.excel-table-wrapper')[0];
+        const state = {
+            table: excelTable,
+            layout: layouts[centerKey] || {},
+            tbody: wrapper.querySelector('.excel-table tbody'),
+            scroller: wrapper.querySelector('.excel-table-scroll'),
+            virtual: excelTable.rows.length > VIRTUAL_ROW_THRESHOLD,
+            rowHeight: DEFAULT_ROW_HEIGHT,
+            windowStart: -1,
+            windowEnd: -1,
+            frameRequested: false
+        };
+        tableStates[centerKey] = state;
+
+        if (state.virtual) {
+            state.scroller.style.maxHeight = `${VIRTUAL_VIEWPORT_HEIGHT}px`;
+            state.scroller.style.overflowY = 'auto';
+            state.scroller.addEventListener('scroll', () => scheduleVirtualRender(centerKey), { passive: true });
+            renderVirtualWindow(centerKey);
+        } else {
+            renderRowRange(state, 0, excelTable.rows.length);
+        }
     });
-    
-    // 应用单元格合并
-    applyExcelMerging();
-    
+
     console.log('Excel风格表格生成完成');
 }
 
-// 生成Excel风格的数据行
-function generateExcelRows(excelTable) {
-    let rowsHtml = '';
-    
-    excelTable.rows.forEach((row, rowIndex) => {
-        let rowHtml = '<tr>';
-        
-        row.forEach((cell, colIndex) => {
+// 生成指定行范围的数据行，合并单元格在窗口边界处截断
+function generateExcelRows(state, start, end) {
+    const rows = state.table.rows;
+    const layout = state.layout;
+    const parts = [];
+
+    for (let rowIndex = start; rowIndex < end; rowIndex++) {
+        parts.push('<tr>');
+        rows[rowIndex].forEach((cell, colIndex) => {
+            let rowspan = 1;
+            let isMerged = false;
+            const merge = layout[colIndex];
+            if (merge) {
+                const groupStart = merge.groupStart[rowIndex];
+                // 合并组的非首行不生成单元格（窗口首行除外）
+                if (groupStart !== rowIndex && rowIndex !== start) {
+                    return;
+                }
+                isMerged = merge.groupEnd[rowIndex] !== groupStart;
+                rowspan = Math.min(merge.groupEnd[rowIndex], end - 1) - rowIndex + 1;
+            }
+
             let cellClass = '';
-            let cellStyle = '';
-            
+
             // 金额列样式
             if (cell.is_amount) {
                 cellClass += ' amount-cell';
@@ -248,332 +207,266 @@ function generateExcelRows(excelTable) {
                     cellClass += ' highlight-cell';
                 }
             }
-            
-            // 构建单元格
-            rowHtml += `<td class="${cellClass}" data-row="${rowIndex}" data-col="${colIndex}">${cell.value}</td>`;
+            if (isMerged) {
+                cellClass += ' merged-cell';
+            }
+
+            const spanAttr = rowspan > 1 ? ` rowspan="${rowspan}"` : '';
+            parts.push(`<td class="${cellClass}"${spanAttr} data-row="${rowIndex}" data-col="${colIndex}">${escapeHtml(cell.value)}</td>`);
         });
-        
-        rowHtml += '</tr>';
-        rowsHtml += rowHtml;
+        parts.push('</tr>');
+    }
+
+    return parts.join('');
+}
+
+// 渲染指定行范围，上下用占位行撑开滚动高度
+function renderRowRange(state, start, end) {
+    const total = state.table.rows.length;
+    const colCount = state.table.headers.length;
+    const topHeight = start * state.rowHeight;
+    const bottomHeight = (total - end) * state.rowHeight;
+
+    let html = '';
+    if (topHeight > 0) {
+        html += `<tr class="virtual-spacer"><td colspan="${colCount}" style="height:${topHeight}px"></td></tr>`;
+    }
+    html += generateExcelRows(state, start, end);
+    if (bottomHeight > 0) {
+        html += `<tr class="virtual-spacer"><td colspan="${colCount}" style="height:${bottomHeight}px"></td></tr>`;
+    }
+
+    state.tbody.innerHTML = html;
+    state.windowStart = start;
+    state.windowEnd = end;
+}
+
+// 合并滚动事件，每帧最多渲染一次
+function scheduleVirtualRender(centerKey) {
+    const state = tableStates[centerKey];
+    if (!state || state.frameRequested) {
+        return;
+    }
+    state.frameRequested = true;
+    requestAnimationFrame(() => {
+        state.frameRequested = false;
+        renderVirtualWindow(centerKey);
     });
-    
-    return rowsHtml;
 }
 
-// 应用Excel风格的单元格合并
-function applyExcelMerging() {
-    Object.keys(previewData).forEach(centerKey => {
-        const excelTable = previewData[centerKey].excel_table;
-        const tableElement = document.querySelector(`#excel-table-${centerKey} .excel-table tbody`);
-        
-        if (!excelTable || !excelTable.merge_info || !tableElement) {
-            console.warn('Missing merge data for', centerKey);
-            return;
+// 根据滚动位置渲染可视窗口
+function renderVirtualWindow(centerKey) {
+    const state = tableStates[centerKey];
+    if (!state) {
+        return;
+    }
+    const total = state.table.rows.length;
+    const scrollTop = state.scroller.scrollTop;
+    const visibleCount = Math.ceil(VIRTUAL_VIEWPORT_HEIGHT / state.rowHeight);
+
+    const firstVisible = Math.floor(scrollTop / state.rowHeight);
+    const lastVisible = Math.min(total, firstVisible + visibleCount);
+    const start = Math.max(0, firstVisible - VIRTUAL_OVERSCAN);
+    const end = Math.min(total, lastVisible + VIRTUAL_OVERSCAN);
+
+    // 可视区域距已渲染窗口边界仍有余量时无需重绘
+    const margin = VIRTUAL_OVERSCAN / 2;
+    if (state.windowStart !== -1 &&
+        (state.windowStart === 0 || firstVisible - state.windowStart >= margin) &&
+        (state.windowEnd === total || state.windowEnd - lastVisible >= margin)) {
+        return;
+    }
+
+    renderRowRange(state, start, end);
+
+    // 首次渲染后按实际行高校准
+    const firstRow = state.tbody.querySelector('tr:not(.virtual-spacer)');
+    if (firstRow && firstRow.offsetHeight > 0 && firstRow.offsetHeight !== state.rowHeight) {
+        state.rowHeight = firstRow.offsetHeight;
+        renderRowRange(state, start, end);
+    }
+}
+
+// 临时渲染完整表格（用于生成图片），完成后恢复虚拟滚动
+async function withFullTable(centerKey, callback) {
+    const state = tableStates[centerKey];
+    if (!state || !state.virtual) {
+        return await callback();
+    }
+
+    const scrollTop = state.scroller.scrollTop;
+    renderRowRange(state, 0, state.table.rows.length);
+    state.scroller.style.maxHeight = 'none';
+    state.scroller.style.overflowY = 'visible';
+    try {
+        return await callback();
+    } finally {
+        state.scroller.style.maxHeight = `${VIRTUAL_VIEWPORT_HEIGHT}px`;
+        state.scroller.style.overflowY = 'auto';
+        state.windowStart = -1;
+        state.scroller.scrollTop = scrollTop;
+        renderVirtualWindow(centerKey);
+    }
+}
+
+// 表格图片按钮（事件委托，表格随预览数据重新生成）
+$(function() {
+    $(document).on('click', '.copy-table-btn', function() {
+        copyTableAsImage($(this).closest('.excel-table-container').attr('data-center'), this);
+    });
+    $(document).on('click', '.download-table-btn', function() {
+        downloadTableAsImage($(this).closest('.excel-table-container').attr('data-center'), this);
+    });
+    $(document).on('click', '#downloadAllImagesBtn', function() {
+        downloadAllTableImages(this);
+    });
+});
+
+// 获取服务端渲染的表格图片
+async function fetchServerTableImage(centerKey) {
+    const url = `/api/report/${encodeURIComponent(currentReportId)}/image/${encodeURIComponent(centerKey)}`;
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`服务端图片生成失败 (${response.status})`);
+    }
+    return await response.blob();
+}
+
+// 生成表格图片：优先使用服务端渲染的图片，失败时回退到浏览器端html2canvas
+async function renderTableImage(centerKey) {
+    if (currentReportId) {
+        try {
+            return await fetchServerTableImage(centerKey);
+        } catch (error) {
+            console.warn('服务端图片不可用，使用浏览器渲染:', error);
         }
-        
-        // 获取列索引映射
-        const headers = excelTable.headers;
-        const columnMapping = {};
-        headers.forEach((header, index) => {
-            columnMapping[header] = index;
-        });
-        
-        // 处理每一列的合并
-        Object.keys(excelTable.merge_info).forEach(colName => {
-            const colIndex = columnMapping[colName];
-            const mergeGroups = excelTable.merge_info[colName];
-            
-            if (colIndex === undefined) {
-                console.warn('Column not found:', colName);
-                return;
+    }
+
+    const tableWrapper = document.getElementById(`excel-table-${centerKey}`);
+    if (!tableWrapper) {
+        throw new Error('未找到表格元素');
+    }
+    if (typeof html2canvas === 'undefined') {
+        throw new Error('浏览器端图片渲染不可用');
+    }
+
+    // 使用html2canvas生成高质量Excel风格图片（虚拟表格先完整渲染）
+    const canvas = await withFullTable(centerKey, () => html2canvas(tableWrapper, {
+        backgroundColor: '#ffffff',
+        scale: 3, // 提高分辨率，确保清晰度
+        useCORS: true,
+        logging: false,
+        width: tableWrapper.offsetWidth,
+        height: tableWrapper.offsetHeight,
+        allowTaint: false,
+        foreignObjectRendering: false,
+        imageTimeout: 5000,
+        // 确保字体正确渲染
+        onclone: function(clonedDoc) {
+            const clonedElement = clonedDoc.getElementById(`excel-table-${centerKey}`);
+            if (clonedElement) {
+                clonedElement.style.fontFamily = '微软雅黑, Microsoft YaHei, sans-serif';
             }
-            
-            mergeGroups.forEach(group => {
-                if (group.start !== group.end) {
-                    // 需要合并的单元格组
-                    const startCell = tableElement.querySelector(`tr:nth-child(${group.start + 1}) td:nth-child(${colIndex + 1})`);
-                    
-                    if (startCell) {
-                        // 设置rowspan
-                        const rowspan = group.end - group.start + 1;
-                        startCell.rowSpan = rowspan;
-                        startCell.classList.add('merged-cell');
-                        
-                        // 隐藏其他需要合并的单元格
-                        for (let i = group.start + 1; i <= group.end; i++) {
-                            const cellToHide = tableElement.querySelector(`tr:nth-child(${i + 1}) td:nth-child(${colIndex + 1})`);
-                            if (cellToHide) {
-                                cellToHide.style.display = 'none';
-                            }
-                        }
-                        
-                        console.log(`合并 ${colName} 列: 行 ${group.start + 1} 到 ${group.end + 1}, rowspan=${rowspan}`);
-                    }
-                }
-            });
-        });
-    });
+        }
+    }));
+    return await new Promise(resolve => canvas.toBlob(resolve, 'image/png', 1.0));
+}
+
+function tableImageName(centerKey) {
+    return `${previewData[centerKey].name}_Excel数据表.png`;
+}
+
+// 按钮显示生成中，返回恢复函数
+function setButtonBusy(btn) {
+    if (!btn) {
+        return () => {};
+    }
+    const originalHtml = btn.innerHTML;
+    btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> 生成中...';
+    btn.disabled = true;
+    return () => {
+        btn.innerHTML = originalHtml;
+        btn.disabled = false;
+    };
 }
 
 // 复制Excel风格表格为图片
-async function copyTableAsImage(centerKey) {
+async function copyTableAsImage(centerKey, btn) {
+    const restore = setButtonBusy(btn);
     try {
-        const tableWrapper = document.getElementById(`excel-table-${centerKey}`);
-        
-        if (!tableWrapper) {
-            showAlert('未找到表格元素', 'danger');
-            return;
+        const blob = await renderTableImage(centerKey);
+        try {
+            // 使用Clipboard API复制图片
+            await navigator.clipboard.write([
+                new ClipboardItem({ 'image/png': blob })
+            ]);
+            showAlert('表格图片已复制到剪贴板', 'success');
+            console.log(`Excel表格图片复制成功: ${previewData[centerKey].name}`);
+        } catch (err) {
+            console.error('复制到剪贴板失败:', err);
+            // 回退方案：下载图片
+            downloadBlob(blob, tableImageName(centerKey));
+            showAlert('图片已下载到本地，请手动发送', 'info');
         }
-        
-        // 显示loading状态
-        const container = tableWrapper.closest('.excel-table-container');
-        const btn = container.querySelector('button[onclick*="copyTableAsImage"]');
-        const originalHtml = btn.innerHTML;
-        btn.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>生成中...';
-        btn.disabled = true;
-        
-        // 使用html2canvas生成高质量Excel风格图片
-        const canvas = await html2canvas(tableWrapper, {
-            backgroundColor: '#ffffff',
-            scale: 3, // 提高分辨率，确保清晰度
-            useCORS: true,
-            logging: false,
-            width: tableWrapper.offsetWidth,
-            height: tableWrapper.offsetHeight,
-            allowTaint: false,
-            foreignObjectRendering: false,
-            imageTimeout: 5000,
-            // 确保字体正确渲染
-            onclone: function(clonedDoc) {
-                // 确保克隆文档中的样式正确
-                const clonedElement = clonedDoc.getElementById(`excel-table-${centerKey}`);
-                if (clonedElement) {
-                    clonedElement.style.fontFamily = '微软雅黑, Microsoft YaHei, sans-serif';
-                }
-            }
-        });
-        
-        // 将canvas转换为blob
-        canvas.toBlob(async (blob) => {
-            try {
-                // 使用Clipboard API复制图片
-                await navigator.clipboard.write([
-                    new ClipboardItem({ 'image/png': blob })
-                ]);
-                
-                // 显示成功提示
-                showCopySuccessToast();
-                console.log(`Excel表格图片复制成功: ${previewData[centerKey].name}`);
-                
-            } catch (err) {
-                console.error('复制到剪贴板失败:', err);
-                // 回退方案：下载图片
-                downloadImageFromCanvas(canvas, `${previewData[centerKey].name}_Excel数据表.png`);
-                showAlert('图片已下载到本地，请手动发送', 'info');
-            } finally {
-                // 恢复按钮状态
-                btn.innerHTML = originalHtml;
-                btn.disabled = false;
-            }
-        }, 'image/png', 1.0); // 最高质量
-        
     } catch (error) {
         console.error('生成Excel风格图片失败:', error);
         showAlert('生成图片失败: ' + error.message, 'danger');
-        
-        // 恢复按钮状态
-        const container = document.querySelector(`[data-center="${centerKey}"]`);
-        const btn = container.querySelector('button[onclick*="copyTableAsImage"]');
-        if (btn) {
-            btn.innerHTML = '<i class="fas fa-image me-1"></i>复制图片';
-            btn.disabled = false;
-        }
+    } finally {
+        restore();
     }
 }
 
 // 下载Excel风格表格图片
-async function downloadTableAsImage(centerKey) {
+async function downloadTableAsImage(centerKey, btn) {
+    const restore = setButtonBusy(btn);
     try {
-        const tableWrapper = document.getElementById(`excel-table-${centerKey}`);
-        
-        const canvas = await html2canvas(tableWrapper, {
-            backgroundColor: '#ffffff',
-            scale: 3,
-            useCORS: true,
-            onclone: function(clonedDoc) {
-                const clonedElement = clonedDoc.getElementById(`excel-table-${centerKey}`);
-                if (clonedElement) {
-                    clonedElement.style.fontFamily = '微软雅黑, Microsoft YaHei, sans-serif';
-                }
-            }
-        });
-        
-        downloadImageFromCanvas(canvas, `${previewData[centerKey].name}_Excel数据表.png`);
-        
+        downloadBlob(await renderTableImage(centerKey), tableImageName(centerKey));
     } catch (error) {
         console.error('下载Excel风格图片失败:', error);
         showAlert('下载图片失败: ' + error.message, 'danger');
+    } finally {
+        restore();
     }
 }
 
-// 从canvas下载图片
-function downloadImageFromCanvas(canvas, filename) {
+// 下载Blob文件
+function downloadBlob(blob, filename) {
     const link = document.createElement('a');
     link.download = filename;
-    link.href = canvas.toDataURL('image/png');
+    link.href = URL.createObjectURL(blob);
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
+    setTimeout(() => URL.revokeObjectURL(link.href), 1000);
 }
 
-// 复制所有表格
-async function copyAllTables() {
-    const btn = event.target;
-    const originalHtml = btn.innerHTML;
-    btn.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>生成中...';
-    btn.disabled = true;
-    
+// 下载所有表格图片
+async function downloadAllTableImages(btn) {
+    const restore = setButtonBusy(btn);
     try {
+        // 服务端并行渲染所有表格，一次性打包下载
+        if (currentReportId) {
+            const response = await fetch(`/api/report/${encodeURIComponent(currentReportId)}/images.zip`);
+            if (response.ok) {
+                downloadBlob(await response.blob(), `直营中心表格图片_${currentReportId}.zip`);
+                showAlert('所有表格图片已打包下载', 'success');
+                return;
+            }
+            console.warn('服务端批量图片不可用，使用浏览器逐个渲染');
+        }
+
         for (const centerKey of Object.keys(previewData)) {
-            await copyTableAsImage(centerKey);
+            await downloadTableAsImage(centerKey);
             await new Promise(resolve => setTimeout(resolve, 1000)); // 延迟1秒
         }
-        showAlert('所有表格已复制完成', 'success');
+        showAlert('所有表格图片已下载', 'success');
     } catch (error) {
-        showAlert('复制过程中出现错误', 'danger');
+        showAlert('下载过程中出现错误', 'danger');
     } finally {
-        btn.innerHTML = originalHtml;
-        btn.disabled = false;
-    }
-}
-
-// 显示复制成功提示
-function showCopySuccessToast() {
-    const toast = new bootstrap.Toast(document.getElementById('copySuccessToast'));
-    toast.show();
-}
-
-// 重新显示上传表单
-function showUploadForm() {
-    $('#resultContainer').hide();
-    $('#introCard').show();
-    $('#fileInput').val('');
-    $('#downloadExcelBtn').hide();
-    hideFileInfo();
-    
-    // 滚动到顶部
-    $('html, body').animate({scrollTop: 0}, 500);
-}
-
-// 文件验证
-function validateFile(file) {
-    const allowedTypes = ['.xlsx', '.xls'];
-    const maxSize = 16 * 1024 * 1024; // 16MB
-    
-    const fileName = file.name.toLowerCase();
-    const isValidType = allowedTypes.some(type => fileName.endsWith(type));
-    
-    if (!isValidType) {
-        showAlert('不支持的文件格式，请选择 .xlsx 或 .xls 文件', 'danger');
-        return false;
-    }
-    
-    if (file.size > maxSize) {
-        showAlert('文件太大，请选择小于16MB的文件', 'danger');
-        return false;
-    }
-    
-    return true;
-}
-
-// 显示进度条
-function showProgress() {
-    $('#progressContainer').slideDown();
-    updateProgress(0, '准备处理...');
-}
-
-// 更新进度条
-function updateProgress(percent, text) {
-    $('#progressBar').css('width', percent + '%');
-    $('#progressText').text(text);
-}
-
-// 隐藏进度条
-function hideProgress() {
-    $('#progressContainer').slideUp();
-}
-
-// 显示警告提示
-function showAlert(message, type = 'info') {
-    const iconMap = {
-        'info': 'fa-info-circle',
-        'success': 'fa-check-circle',
-        'warning': 'fa-exclamation-triangle',
-        'danger': 'fa-times-circle'
-    };
-    
-    const alertHtml = `
-        <div class="alert alert-${type} alert-dismissible fade show">
-            <i class="fas ${iconMap[type] || 'fa-info-circle'} me-2"></i>
-            ${message}
-            <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
-        </div>
-    `;
-    
-    $('.container').prepend(alertHtml);
-    
-    // 3秒后自动关闭
-    setTimeout(() => {
-        $('.alert').alert('close');
-    }, 3000);
-}
-
-// 设置拖拽上传
-function setupDragAndDrop() {
-    const fileInput = $('#fileInput')[0];
-    const uploadArea = fileInput.closest('.card-body');
-    
-    ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
-        uploadArea.addEventListener(eventName, preventDefaults, false);
-        document.body.addEventListener(eventName, preventDefaults, false);
-    });
-    
-    ['dragenter', 'dragover'].forEach(eventName => {
-        uploadArea.addEventListener(eventName, highlight, false);
-    });
-    
-    ['dragleave', 'drop'].forEach(eventName => {
-        uploadArea.addEventListener(eventName, unhighlight, false);
-    });
-    
-    uploadArea.addEventListener('drop', handleDrop, false);
-    
-    function preventDefaults(e) {
-        e.preventDefault();
-        e.stopPropagation();
-    }
-    
-    function highlight(e) {
-        uploadArea.classList.add('drag-over');
-    }
-    
-    function unhighlight(e) {
-        uploadArea.classList.remove('drag-over');
-    }
-    
-    function handleDrop(e) {
-        const dt = e.dataTransfer;
-        const files = dt.files;
-        
-        if (files.length > 0) {
-            fileInput.files = files;
-            showFileInfo(files[0]);
-        }
+        restore();
     }
 }
 
-// 简化的布局处理（如需要可以在这里添加）
-
 // 格式化数字
 function formatNumber(num) {
     return new Intl.NumberFormat('zh-CN', {
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出文件和快照的存储后端
+- local: 本地目录（OUTPUT_FOLDER / SNAPSHOT_FOLDER，默认）
+- s3: S3兼容对象存储（AWS S3、MinIO等），多个节点共用同一份输出和快照，下载请求可以落到任意节点
+
+写入为流式：local先写临时文件再原子替换；s3按 STORAGE_PART_SIZE_MB 分片上传（multipart），
+文件小于一个分片时直接上传。读取时s3对象下载到本地缓存目录，按ETag判断是否需要重新下载，
+缓存超过 STORAGE_CACHE_MAX_MB 时按最近使用时间淘汰。
+报告状态、表格结构和搜索索引等小JSON文件用 write_json / read_json 直接读写，不经过本地缓存。
+"""
+
+import io
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ('local', 's3')
+
+# 存储区域 -> 本地目录配置项
+AREAS = {
+    'output': 'OUTPUT_FOLDER',
+    'snapshots': 'SNAPSHOT_FOLDER',
+}
+
+
+def _check_key(key: str) -> str:
+    """键为区域内的相对路径，不允许绝对路径和 .."""
+    parts = Path(key).parts
+    if not key or Path(key).is_absolute() or '..' in parts or '\\' in key:
+        raise ValueError(f'无效的存储键: {key}')
+    return '/'.join(parts)
+
+
+class LocalStorage:
+    """本地目录存储"""
+
+    backend = 'local'
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def location(self, key: str) -> str:
+        return str(self._path(key))
+
+    @contextmanager
+    def open_write(self, key: str):
+        """写入临时文件，成功后原子替换，失败时删除临时文件"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                yield f
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def write_bytes(self, key: str, data: bytes):
+        with self.open_write(key) as f:
+            f.write(data)
+
+    def read_bytes(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def put_file(self, local_path: str, key: str):
+        """把本地文件移入存储"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(local_path, path)
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """可直接读取的本地文件路径，不存在时返回None"""
+        path = self._path(key)
+        return path if path.is_file() else None
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def version(self, key: str) -> Optional[str]:
+        """文件版本（修改时间），不存在时返回None；用于判断其他进程是否已更新文件"""
+        try:
+            return str(self._path(key).stat().st_mtime_ns)
+        except OSError:
+            return None
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        if not self.root.exists():
+            return []
+        keys = []
+        for root, _, files in os.walk(self.root):
+            for file in files:
+                key = Path(root, file).relative_to(self.root).as_posix()
+                if key.startswith(prefix) and not file.endswith('.tmp'):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, key: str):
+        """删除文件，并删除因此变空的上级目录"""
+        path = self._path(key)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        parent = path.parent
+        while parent != self.root and self.root in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    只能顺序写入的S3对象流：缓冲满一个分片就上传，关闭时完成上传
+
+    不支持seek，zipfile/openpyxl会改用数据描述符写入，无需先在本地生成完整文件
+    """
+
+    def __init__(self, client, bucket: str, key: str, part_size: int):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts: List[Dict] = []
+        self.upload_id = None
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError('写入已关闭的对象流')
+        view = memoryview(data)
+        size = view.nbytes
+        self.buffer += view
+        self.position += size
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return size
+
+    def _upload_part(self, data: bytes):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)['UploadId']
+        number = len(self.parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=number, Body=data)
+        self.parts.append({'PartNumber': number, 'ETag': response['ETag']})
+
+    def commit(self):
+        """完成上传（小于一个分片时直接上传整个对象）"""
+        if self.upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                  MultipartUpload={'Parts': self.parts})
+        self.buffer = bytearray()
+        super().close()
+
+    def abort(self):
+        """放弃上传，删除已上传的分片"""
+        if self.upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 取消分片上传失败 {self.key}: {e}")
+        self.buffer = bytearray()
+        super().close()
+
+
+class S3Storage:
+    """S3兼容对象存储，读取经本地缓存"""
+
+    backend = 's3'
+
+    def __init__(self, bucket: str, prefix: str, endpoint_url: str = None, region: str = None,
+                 part_size: int = None, cache_dir: str = None, cache_max_bytes: int = None):
+        """
+        Args:
+            bucket (str): 存储桶
+            prefix (str): 键前缀（如 pay-fail-web/output/）
+            endpoint_url (str): S3兼容服务地址（MinIO等），为空时使用AWS
+            region (str): 区域
+            part_size (int): 分片大小（字节，S3要求至少5MB）
+            cache_dir (str): 本地缓存目录
+            cache_max_bytes (int): 本地缓存上限（字节）
+        """
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('使用S3存储需要安装boto3: pip install boto3')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = max(part_size or 8 * 1024 * 1024, 5 * 1024 * 1024)
+        self.cache_dir = Path(cache_dir or Config.STORAGE_CACHE_DIR) / prefix.strip('/')
+        self.cache_max_bytes = cache_max_bytes if cache_max_bytes is not None else Config.STORAGE_CACHE_MAX_MB * 1024 * 1024
+        self._cache_lock = threading.Lock()
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{_check_key(key)}"
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    @contextmanager
+    def open_write(self, key: str):
+        writer = S3MultipartWriter(self.client, self.bucket, self._object_key(key), self.part_size)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def write_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+
+    def read_bytes(self, key: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.location(key))
+
+    def put_file(self, local_path: str, key: str):
+        """上传本地文件（大文件由boto3自动分片）后删除本地文件"""
+        self.client.upload_file(str(local_path), self.bucket, self._object_key(key))
+        os.remove(local_path)
+
+    def _head(self, key: str) -> Optional[Dict]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def version(self, key: str) -> Optional[str]:
+        """对象版本（ETag），不存在时返回None"""
+        head = self._head(key)
+        return head['ETag'] if head is not None else None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """
+        下载到本地缓存后返回路径，对象不存在时返回None
+
+        缓存文件旁的 .etag 记录下载时的ETag，与对象当前ETag一致时直接使用缓存
+        """
+        head = self._head(key)
+        if head is None:
+            return None
+        etag = head['ETag']
+        path = self.cache_dir / _check_key(key)
+        etag_path = path.with_name(f"{path.name}.etag")
+        try:
+            if path.is_file() and etag_path.read_text() == etag:
+                os.utime(path)
+                return path
+        except OSError:
+            pass
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.client.download_file(self.bucket, self._object_key(key), str(tmp_path))
+            os.replace(tmp_path, path)
+            etag_path.write_text(etag)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._evict_cache(keep=path)
+        return path
+
+    def _evict_cache(self, keep: Path):
+        """缓存超过上限时按最近使用时间删除文件"""
+        with self._cache_lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for file in files:
+                    if file.endswith('.etag') or file.endswith('.tmp'):
+                        continue
+                    path = Path(root, file)
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            for _, size, path in sorted(entries):
+                if total <= self.cache_max_bytes:
+                    break
+                if path == keep:
+                    continue
+                for stale in (path, path.with_name(f"{path.name}.etag")):
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        pass
+                total -= size
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{prefix}"):
+            keys.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+        return sorted(keys)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+
+_storages: Dict[str, object] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(area: str):
+    """
+    获取存储区域（output / snapshots）的后端实例
+
+    local 后端对应 OUTPUT_FOLDER / SNAPSHOT_FOLDER 目录；s3 后端对应 STORAGE_S3_PREFIX 下的 <区域>/ 前缀
+    """
+    if area not in AREAS:
+        raise ValueError(f'未知的存储区域: {area}')
+    with _storages_lock:
+        storage = _storages.get(area)
+        if storage is None:
+            backend = Config.STORAGE_BACKEND
+            if backend == 's3':
+                if not Config.STORAGE_S3_BUCKET:
+                    raise RuntimeError('STORAGE_BACKEND=s3 时必须设置 STORAGE_S3_BUCKET')
+                storage = S3Storage(
+                    bucket=Config.STORAGE_S3_BUCKET,
+                    prefix=f"{Config.STORAGE_S3_PREFIX}{area}/",
+                    endpoint_url=Config.STORAGE_S3_ENDPOINT,
+                    region=Config.STORAGE_S3_REGION,
+                    part_size=Config.STORAGE_PART_SIZE_MB * 1024 * 1024,
+                )
+            elif backend == 'local':
+                storage = LocalStorage(getattr(Config, AREAS[area]))
+            else:
+                raise ValueError(f'不支持的存储后端: {backend}')
+            _storages[area] = storage
+        return storage
+
+
+def for_output_dir(output_dir: str):
+    """
+    输出目录对应的存储：配置的 OUTPUT_FOLDER 使用输出存储后端，其他目录（基准测试、临时目录）按本地目录写入
+    """
+    if output_dir is None or os.path.abspath(output_dir) == os.path.abspath(Config.OUTPUT_FOLDER):
+        return get_storage('output')
+    return LocalStorage(output_dir)
+
+
+def unique_key(storage, name: str) -> str:
+    """存储中已有同名文件时追加序号"""
+    key = name
+    counter = 1
+    while storage.exists(key):
+        stem, suffix = os.path.splitext(name)
+        key = f"{stem}_{counter}{suffix}"
+        counter += 1
+    return key
+
+
+def write_json(storage, key: str, data):
+    """写入JSON（local为原子替换，s3为单次上传），供多个节点读取的小文件（报告状态、搜索索引等）使用"""
+    storage.write_bytes(key, json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def read_json(storage, key: str):
+    """读取JSON，不存在或内容不完整时返回None"""
+    try:
+        return json.loads(storage.read_bytes(key).decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def get_stats() -> Dict:
+    stats = {'backend': Config.STORAGE_BACKEND}
+    if Config.STORAGE_BACKEND == 's3':
+        stats.update({
+            'bucket': Config.STORAGE_S3_BUCKET,
+            'prefix': Config.STORAGE_S3_PREFIX,
+            'endpoint': Config.STORAGE_S3_ENDPOINT or None,
+        })
+    return stats
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直营中心表格图片渲染服务
+直接根据透视表预览结构在服务端生成Excel风格PNG，按内容哈希缓存
+
+报告表格结构通过输出存储后端保存（reports/<report_id>.json，STORAGE_BACKEND=s3 时各节点共享），
+PNG缓存是各节点本地的 png_cache/ 目录，缺失时由表格结构重新渲染。
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import zipfile
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from archive_names import unique_archive_name
+import process_pool
+import storage
+
+logger = logging.getLogger(__name__)
+
+# 渲染逻辑变化时递增，使旧缓存失效
+RENDER_VERSION = 1
+
+# 报告ID只允许字母数字和下划线，防止路径穿越
+REPORT_ID_PATTERN = re.compile(r'^[0-9A-Za-z_]+$')
+
+# 与 _apply_excel_styles_full 保持一致的样式
+TITLE_FILL = '#E6F3FF'
+HIGHLIGHT_FILL = '#FFB6C1'
+HIGHLIGHT_TEXT = '#8B0000'
+TEXT_COLOR = '#000000'
+BORDER_COLOR = '#000000'
+
+# Excel列宽（字符数）和行高（磅），与Excel输出保持一致
+COLUMN_WIDTHS = {1: 18, 2: 16, 3: 14}
+LAST_COLUMN_WIDTH = 15
+DEFAULT_COLUMN_WIDTH = 12
+ROW_HEIGHTS = {'center_title': 25, 'header': 22, 'data': 20}
+
+# 常见中文字体位置（Windows / Debian字体包）
+FONT_CANDIDATES = [
+    'C:/Windows/Fonts/msyh.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+]
+
+
+def _find_font_path() -> Optional[str]:
+    """查找可用的中文字体"""
+    configured = Config.IMAGE_FONT_PATH
+    if configured and os.path.exists(configured):
+        return configured
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _load_font(font_path: Optional[str], size: int):
+    """加载字体，找不到中文字体时退回Pillow默认字体"""
+    from PIL import ImageFont
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size=size)
+
+
+def _render_table_png(excel_table: Dict, font_path: Optional[str], scale: int) -> bytes:
+    """
+    将 _generate_excel_style_table 生成的表格结构渲染为PNG字节
+
+    子进程入口：只依赖传入的表格结构，不访问全局状态
+    """
+    from PIL import Image, ImageDraw
+
+    headers = excel_table['headers']
+    rows = excel_table['rows']
+    num_columns = len(headers)
+
+    # Excel字号为磅，按 1磅≈1.33像素 换算后再乘以缩放倍数
+    px = lambda points: int(round(points * 4 / 3 * scale))
+    title_font = _load_font(font_path, px(12))
+    header_font = _load_font(font_path, px(12))
+    content_font = _load_font(font_path, px(10))
+
+    # 列宽：Excel字符宽度约7像素，同时保证内容不溢出
+    padding = px(6)
+    column_widths = []
+    for col in range(1, num_columns + 1):
+        if col == num_columns:
+            width_chars = LAST_COLUMN_WIDTH
+        else:
+            width_chars = COLUMN_WIDTHS.get(col, DEFAULT_COLUMN_WIDTH)
+        width = int(width_chars * 7 * scale)
+        header_width = header_font.getlength(str(headers[col - 1])) + padding * 2
+        content_width = max((content_font.getlength(str(row[col - 1]['value'])) for row in rows), default=0) + padding * 2
+        column_widths.append(int(max(width, header_width, content_width)))
+
+    table_width = sum(column_widths)
+    title_height = px(ROW_HEIGHTS['center_title'])
+    header_height = px(ROW_HEIGHTS['header'])
+    row_height = px(ROW_HEIGHTS['data'])
+    table_height = title_height + header_height + row_height * len(rows)
+    line_width = max(1, scale)
+
+    image = Image.new('RGB', (table_width + line_width, table_height + line_width), '#FFFFFF')
+    draw = ImageDraw.Draw(image)
+
+    def draw_cell(x0, y0, x1, y1, text, font, fill=None, color=TEXT_COLOR, bold=False):
+        if fill:
+            draw.rectangle([x0, y0, x1, y1], fill=fill)
+        draw.rectangle([x0, y0, x1, y1], outline=BORDER_COLOR, width=line_width)
+        if text:
+            draw.text(((x0 + x1) / 2, (y0 + y1) / 2), text, font=font, fill=color, anchor='mm',
+                      stroke_width=1 if bold else 0, stroke_fill=color)
+
+    # 直营中心标题行（整行合并）
+    draw_cell(0, 0, table_width, title_height, str(excel_table['center_title']), title_font,
+              fill=TITLE_FILL, bold=True)
+
+    # 表头
+    y = title_height
+    x = 0
+    for col_idx, header in enumerate(headers):
+        draw_cell(x, y, x + column_widths[col_idx], y + header_height, str(header), header_font, bold=True)
+        x += column_widths[col_idx]
+
+    # 合并信息：列索引 -> {起始行: 结束行}，被合并覆盖的行记入skip
+    merge_starts = {}
+    merge_skips = set()
+    for col_name, groups in excel_table.get('merge_info', {}).items():
+        if col_name not in headers:
+            continue
+        col_idx = headers.index(col_name)
+        for group in groups:
+            if group['end'] > group['start']:
+                merge_starts[(group['start'], col_idx)] = group['end']
+                for row_idx in range(group['start'] + 1, group['end'] + 1):
+                    merge_skips.add((row_idx, col_idx))
+
+    # 数据行
+    data_top = title_height + header_height
+    for row_idx, row in enumerate(rows):
+        x = 0
+        for col_idx, cell in enumerate(row):
+            width = column_widths[col_idx]
+            if (row_idx, col_idx) not in merge_skips:
+                end_row = merge_starts.get((row_idx, col_idx), row_idx)
+                y0 = data_top + row_height * row_idx
+                y1 = data_top + row_height * (end_row + 1)
+                if cell.get('is_highlight'):
+                    draw_cell(x, y0, x + width, y1, cell['value'], content_font,
+                              fill=HIGHLIGHT_FILL, color=HIGHLIGHT_TEXT)
+                else:
+                    draw_cell(x, y0, x + width, y1, cell['value'], content_font)
+            x += width
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+class TableImageRenderer:
+    """直营中心表格图片渲染服务"""
+
+    def __init__(self, output_folder: str = None, max_workers: int = None, scale: int = None):
+        """
+        初始化渲染服务
+
+        Args:
+            output_folder (str): 输出目录，默认 Config.OUTPUT_FOLDER（使用输出存储后端，其他目录按本地目录保存报告结构）
+            max_workers (int): 并行渲染进程数，默认 Config.IMAGE_RENDER_WORKERS
+            scale (int): 图片缩放倍数，默认 Config.IMAGE_SCALE
+        """
+        self.output_folder = output_folder or Config.OUTPUT_FOLDER
+        self.max_workers = max_workers or Config.IMAGE_RENDER_WORKERS
+        self.scale = scale or Config.IMAGE_SCALE
+        self.font_path = _find_font_path()
+        if not self.font_path:
+            logger.warning("⚠️  未找到中文字体，表格图片将使用默认字体渲染")
+
+    @property
+    def storage(self):
+        """报告结构所在的存储（首次使用时才创建存储后端，导入本模块不连接对象存储）"""
+        return storage.for_output_dir(self.output_folder)
+
+    @staticmethod
+    def report_key(report_id: str, suffix: str = '.json') -> str:
+        """报告文件在输出存储中的键：reports/<report_id><suffix>"""
+        return f"reports/{report_id}{suffix}"
+
+    @property
+    def cache_dir(self) -> Path:
+        return Path(self.output_folder) / 'png_cache'
+
+    @staticmethod
+    def new_report_id() -> str:
+        """生成报告ID"""
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
+
+    @staticmethod
+    def is_valid_report_id(report_id: str) -> bool:
+        return bool(report_id) and bool(REPORT_ID_PATTERN.match(report_id))
+
+    def save_report_tables(self, report_id: str, preview_data: Dict):
+        """保存报告中各直营中心的表格结构，供之后渲染图片"""
+        tables = {
+            center_key: center_data['excel_table']
+            for center_key, center_data in preview_data.items()
+            if 'excel_table' in center_data
+        }
+        storage.write_json(self.storage, self.report_key(report_id), tables)
+
+    def load_report_tables(self, report_id: str) -> Optional[Dict]:
+        """读取报告表格结构，不存在时返回None"""
+        if not self.is_valid_report_id(report_id):
+            return None
+        return storage.read_json(self.storage, self.report_key(report_id))
+
+    def _content_hash(self, excel_table: Dict) -> str:
+        """按表格内容和渲染参数计算缓存键"""
+        payload = json.dumps(
+            [RENDER_VERSION, self.scale, self.font_path, excel_table],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _cache_path(self, excel_table: Dict) -> Path:
+        return self.cache_dir / f"{self._content_hash(excel_table)}.png"
+
+    def _store(self, cache_path: Path, content: bytes):
+        """原子写入缓存文件，多个worker同时渲染同一表格时互不影响"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, cache_path)
+
+    def render_center(self, excel_table: Dict) -> Path:
+        """渲染单个直营中心表格，命中缓存时直接返回"""
+        cache_path = self._cache_path(excel_table)
+        if not cache_path.exists():
+            self._store(cache_path, _render_table_png(excel_table, self.font_path, self.scale))
+        return cache_path
+
+    def render_all(self, tables: Dict) -> List[Tuple[str, Path]]:
+        """并行渲染所有直营中心表格，只渲染未命中缓存的部分，返回(直营中心, 图片路径)列表"""
+        paths = {center_key: self._cache_path(table) for center_key, table in tables.items()}
+        missing = [center_key for center_key, path in paths.items() if not path.exists()]
+
+        if missing:
+            max_workers = max(1, min(self.max_workers, len(missing)))
+            logger.info(f"🖼️  正在并行渲染 {len(missing)} 张表格图片（{max_workers} 个进程）")
+            if max_workers == 1:
+                for center_key in missing:
+                    self._store(paths[center_key], _render_table_png(tables[center_key], self.font_path, self.scale))
+            else:
+                with process_pool.new_process_pool(max_workers) as executor:
+                    futures = {
+                        center_key: executor.submit(_render_table_png, tables[center_key], self.font_path, self.scale)
+                        for center_key in missing
+                    }
+                    for center_key, future in futures.items():
+                        self._store(paths[center_key], future.result())
+
+        return [(center_key, paths[center_key]) for center_key in tables]
+
+    def build_zip(self, tables: Dict) -> io.BytesIO:
+        """渲染所有表格并打包为zip"""
+        buffer = io.BytesIO()
+        used_names = set()
+        # PNG本身已压缩，zip只做存储
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for center_key, path in self.render_all(tables):
+                zf.write(path, unique_archive_name(center_key, used_names, '_Excel数据表.png'))
+        buffer.seek(0)
+        return buffer
+
+
+# 全局渲染服务实例
+table_renderer = TableImageRenderer()
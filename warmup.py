@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker预热和启动延迟统计
+在gunicorn的post_fork中用极小的模拟数据跑一遍完整处理流程，
+提前加载pandas/openpyxl/pypinyin，避免新worker的第一个上传请求承担冷启动开销
+"""
+
+import io
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 当前进程的启动和延迟统计
+_metrics_lock = threading.Lock()
+startup_metrics = {
+    'pid': os.getpid(),
+    'app_import_seconds': None,
+    'processor_import_seconds': None,
+    'warmup_seconds': None,
+    'warmup_at': None,
+    'first_upload_seconds': None,
+    'warm_upload_avg_seconds': None,
+    'warm_upload_count': 0,
+}
+
+
+def _sample_dataframe():
+    """构造覆盖所有处理分支的极小数据集（含客户UID和贷后BP）"""
+    import pandas as pd
+    return pd.DataFrame({
+        '所属直营中心': ['北京直营中心', '北京直营中心', '上海直营中心', '上海直营中心'],
+        '所属团队': ['北京一队', '北京贷后BP团队', '上海一队', '上海一队'],
+        '所属业务经理': ['张三', '李四', '王五', '王五'],
+        '客户姓名': ['客户甲', '客户乙', '客户丙', '客户丁'],
+        '客户UID': ['U1', 'U2', 'U3', 'U4'],
+        '应还款金额': [1200.5, 15000, '3000', 800],
+        '贷后BP': ['无', '赵六', '', '无'],
+    })
+
+
+def warm_up() -> Dict:
+    """
+    用模拟数据执行一次完整处理流程（读取、预处理、排序、透视表、预览、保存）
+
+    Returns:
+        dict: 各步骤耗时
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    step = time.perf_counter()
+    from excel_processor import ExcelProcessorService
+    timings['import'] = time.perf_counter() - step
+
+    service = ExcelProcessorService()
+    # 处理流程的print输出在预热时没有意义
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        with tempfile.TemporaryDirectory(prefix='pay-fail-warmup-') as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'warmup.xlsx')
+            _sample_dataframe().to_excel(input_path, index=False)
+
+            step = time.perf_counter()
+            df, validation = service._read_and_validate_excel(input_path)
+            if not validation['success']:
+                raise RuntimeError(validation['message'])
+            timings['read'] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            df = service._preprocess_data(df)
+            timings['preprocess'] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            pivot_table = service._create_pivot_table_full_logic(df)
+            service._generate_preview_data(pivot_table)
+            timings['pivot_preview'] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            service._save_to_excel_full_style(df, pivot_table, tmp_dir)
+            timings['save'] = time.perf_counter() - step
+    finally:
+        sys.stdout = stdout
+
+    timings['total'] = time.perf_counter() - start
+    with _metrics_lock:
+        startup_metrics['warmup_seconds'] = round(timings['total'], 3)
+        startup_metrics['warmup_at'] = datetime.now().isoformat(timespec='seconds')
+        if startup_metrics['processor_import_seconds'] is None:
+            startup_metrics['processor_import_seconds'] = round(timings['import'], 3)
+    return timings
+
+
+def warm_up_worker():
+    """gunicorn post_fork入口：按配置预热，失败不影响worker启动"""
+    if not Config.WARMUP_ENABLED:
+        return
+    startup_metrics['pid'] = os.getpid()
+    try:
+        timings = warm_up()
+        logger.info(f"🔥 worker {os.getpid()} 预热完成，耗时 {timings['total']:.2f}s")
+    except Exception as e:
+        logger.warning(f"⚠️  worker {os.getpid()} 预热失败: {e}")
+
+
+def record_app_import(seconds: float):
+    with _metrics_lock:
+        startup_metrics['app_import_seconds'] = round(seconds, 3)
+
+
+def record_processor_import(seconds: float):
+    with _metrics_lock:
+        if startup_metrics['processor_import_seconds'] is None:
+            startup_metrics['processor_import_seconds'] = round(seconds, 3)
+
+
+def record_upload_latency(seconds: float):
+    """记录上传处理耗时：本进程第一个请求为冷启动延迟，其后为预热后延迟"""
+    with _metrics_lock:
+        if startup_metrics['first_upload_seconds'] is None:
+            startup_metrics['first_upload_seconds'] = round(seconds, 3)
+            return
+        count = startup_metrics['warm_upload_count']
+        avg = startup_metrics['warm_upload_avg_seconds'] or 0
+        startup_metrics['warm_upload_avg_seconds'] = round((avg * count + seconds) / (count + 1), 3)
+        startup_metrics['warm_upload_count'] = count + 1
+
+
+def get_startup_metrics() -> Dict:
+    with _metrics_lock:
+        return {**startup_metrics, 'pid': os.getpid(), 'warmup_enabled': Config.WARMUP_ENABLED}
+
+
+def main():
+    """冷/热延迟报告：在全新进程中测量导入耗时、首次处理耗时和预热后的处理耗时"""
+    print(f"🐍 Python {sys.version.split()[0]}")
+    first = warm_up()
+    second = warm_up()
+    print(f"\n{'步骤':<16}{'冷启动(s)':>12}{'预热后(s)':>12}")
+    for key in ['import', 'read', 'preprocess', 'pivot_preview', 'save', 'total']:
+        print(f"{key:<16}{first[key]:>12.3f}{second[key]:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xlsx工作表分片并行解析
+pd.read_excel 读取xlsx时由openpyxl在单个进程中逐行解析工作表XML，50万行的导出文件解析耗时占整个处理流程的大头。
+这里把第一个工作表的XML从压缩包中边解压边按 <row> 边界切成若干分片，由多个进程并行解析：
+- 共享字符串表、日期样式和日期基准由主进程通过openpyxl读取一次，子进程启动时随初始化参数传入，按索引查表
+- 每个分片套上原工作表的根元素后交给openpyxl自身的工作表解析器，单元格取值（数字、日期、布尔、错误、内联字符串）与read_excel一致
+- 主进程按行号拼接各分片，补齐缺失的行，再经过与read_excel相同的TextParser推断类型，得到的DataFrame与read_excel完全一致
+
+工作表使用带前缀的命名空间、行没有行号等少见格式时自动回退到 pd.read_excel。
+"""
+
+import io
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+import process_pool
+
+CHUNK_SIZE = 1024 * 1024
+# 每个进程平均分到的分片数（分片越多负载越均衡，但每个分片都要单独传输和解析）
+SHARDS_PER_WORKER = 4
+MIN_SHARD_BYTES = 1024 * 1024
+SHEET_DATA_END = b'</sheetData>'
+
+# 子进程中的解析参数（由 _init_worker 设置；进程池由 process_pool 以forkserver启动，初始化时先清除进度通道）
+_worker_state = {}
+
+
+class UnsupportedLayout(Exception):
+    """工作表格式不适合分片解析（调用方应回退到 pd.read_excel）"""
+
+
+def _init_worker(prefix: bytes, shared_strings: list, epoch, date_formats: set, timedelta_formats: set):
+    _worker_state.update(
+        prefix=prefix,
+        shared_strings=shared_strings,
+        epoch=epoch,
+        date_formats=date_formats,
+        timedelta_formats=timedelta_formats,
+    )
+
+
+def _convert_row(cells: List[dict]) -> list:
+    """按 read_excel（openpyxl引擎）的规则转换一行单元格，并去掉行尾的空单元格"""
+    if not cells:
+        return []
+    row = [''] * cells[-1]['column']
+    for cell in cells:
+        column = cell['column']
+        if column < 1 or column > len(row):
+            continue
+        value = cell['value']
+        if value is None:
+            value = ''
+        elif cell['data_type'] == 'e':
+            value = np.nan
+        elif cell['data_type'] == 'n':
+            integer = int(value)
+            value = integer if integer == value else float(value)
+        row[column - 1] = value
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def _parse_shard(body: bytes) -> List[Tuple[int, list]]:
+    """子进程入口：解析一个分片（若干完整的 <row> 元素），返回 [(行号, 行数据), ...]"""
+    from openpyxl.worksheet._reader import WorkSheetParser
+
+    state = _worker_state
+    source = io.BytesIO(state['prefix'] + body + SHEET_DATA_END + b'</worksheet>')
+    parser = WorkSheetParser(source, state['shared_strings'], data_only=True, epoch=state['epoch'],
+                             date_formats=state['date_formats'], timedelta_formats=state['timedelta_formats'])
+    return [(row_number, _convert_row(cells)) for row_number, cells in parser.parse()]
+
+
+def _is_row_start(buffer: bytes, pos: int) -> bool:
+    return buffer[pos + 4:pos + 5] in (b' ', b'>', b'/', b'\n', b'\r', b'\t')
+
+
+def _last_row_start(buffer: bytes) -> int:
+    """缓冲区中最后一个 <row 开始标签的位置（之前的内容都是完整的行），没有时返回-1"""
+    pos = len(buffer)
+    while True:
+        pos = buffer.rfind(b'<row', 0, pos)
+        if pos <= 0 or _is_row_start(buffer, pos):
+            return pos
+
+
+def _check_row_number(body: bytes):
+    """非第一个分片必须以带行号的 <row r="..."> 开始，否则子进程无法知道分片的起始行"""
+    tag_end = body.find(b'>')
+    if b' r="' not in body[:tag_end] and b" r='" not in body[:tag_end]:
+        raise UnsupportedLayout('工作表的行没有行号')
+
+
+def _read_header(source) -> Tuple[bytes, Optional[bytes]]:
+    """读到 <sheetData> 开始标签为止，返回 (分片XML前缀, 已读出的行数据)；空工作表的行数据为None"""
+    buffer = b''
+    while True:
+        pos = buffer.find(b'<sheetData')
+        if pos >= 0:
+            tag_end = buffer.find(b'>', pos)
+            if tag_end >= 0:
+                break
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            raise UnsupportedLayout('工作表中没有 <sheetData>')
+        buffer += chunk
+
+    root_start = buffer.find(b'<worksheet')
+    if root_start < 0 or root_start > pos:
+        raise UnsupportedLayout('工作表根元素使用了命名空间前缀')
+    root_end = buffer.find(b'>', root_start)
+    prefix = buffer[root_start:root_end + 1] + b'<sheetData>'
+    if buffer[tag_end - 1:tag_end] == b'/':
+        return prefix, None
+    return prefix, buffer[tag_end + 1:]
+
+
+def iter_shards(source, shard_bytes: int):
+    """
+    从工作表XML流中边读边切出分片
+
+    Yields:
+        bytes: 第一个为分片XML前缀（原工作表根元素 + <sheetData>），之后依次为各分片（若干完整的 <row> 元素）
+    """
+    prefix, buffer = _read_header(source)
+    yield prefix
+    if buffer is None:
+        return
+
+    first = True
+    finished = False
+    while not finished:
+        end = buffer.find(SHEET_DATA_END)
+        if end < 0:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                raise UnsupportedLayout('工作表XML不完整')
+            scanned = len(buffer)
+            buffer += chunk
+            end = buffer.find(SHEET_DATA_END, max(0, scanned - len(SHEET_DATA_END)))
+        if end >= 0:
+            buffer = buffer[:end]
+            finished = True
+
+        shards = []
+        if finished:
+            shards.append(buffer)
+        else:
+            # 在最后一个 <row 之前切开，之后的内容（可能不完整的一行）留到下一个分片
+            while len(buffer) >= shard_bytes:
+                cut = _last_row_start(buffer)
+                if cut <= 0:
+                    break
+                shards.append(buffer[:cut])
+                buffer = buffer[cut:]
+        for shard in shards:
+            shard = shard.strip()
+            if not shard:
+                continue
+            if not first:
+                _check_row_number(shard)
+            first = False
+            yield shard
+
+
+def _sheet_metadata(file_path: str):
+    """用openpyxl读取第一个工作表的路径、共享字符串表和日期样式（只读模式不解析工作表）"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if not workbook.worksheets:
+            raise UnsupportedLayout('工作簿中没有工作表')
+        sheet = workbook.worksheets[0]
+        return (sheet._worksheet_path, list(workbook.shared_strings), workbook.epoch,
+                set(workbook._date_formats), set(workbook._timedelta_formats))
+    finally:
+        workbook.close()
+
+
+def _assemble(results: List[List[Tuple[int, list]]]) -> list:
+    """按行号拼接各分片，补齐缺失的行，去掉末尾空行并补齐行宽（与read_excel的 get_sheet_data 一致）"""
+    data = []
+    counter = 1
+    for rows in results:
+        for row_number, row in rows:
+            while counter < row_number:
+                data.append([])
+                counter += 1
+            if counter <= row_number:
+                data.append(row)
+                counter += 1
+
+    last_row_with_data = len(data) - 1
+    while last_row_with_data >= 0 and not data[last_row_with_data]:
+        last_row_with_data -= 1
+    data = data[:last_row_with_data + 1]
+    if data:
+        max_width = max(len(row) for row in data)
+        if min(len(row) for row in data) < max_width:
+            data = [row + [''] * (max_width - len(row)) for row in data]
+    return data
+
+
+def _to_dataframe(data: list) -> pd.DataFrame:
+    """与read_excel相同地用TextParser推断各列类型（默认参数：第一行为表头）"""
+    from pandas.errors import EmptyDataError
+    from pandas.io.parsers import TextParser
+
+    if not data:
+        return pd.DataFrame()
+    try:
+        parser = TextParser(data, header=0, index_col=None, has_index_names=False,
+                            skip_blank_lines=False, parse_dates=False)
+        return parser.read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def read_sheet_sharded(file_path: str, workers: int = None, shard_bytes: int = None,
+                       on_progress: Optional[Callable[[int], None]] = None) -> pd.DataFrame:
+    """
+    分片并行解析xlsx的第一个工作表
+
+    Args:
+        file_path (str): xlsx文件路径
+        workers (int): 解析进程数，默认 XLSX_PARSE_WORKERS；为1时在当前进程中逐个解析分片
+        shard_bytes (int): 分片大小（解压后的XML字节数），默认按进程数把工作表分成 进程数×4 片
+        on_progress (callable): 每解析完一个分片调用一次，参数为已解析的行数
+
+    Returns:
+        pd.DataFrame: 与 pd.read_excel(file_path) 相同
+
+    Raises:
+        UnsupportedLayout: 工作表格式不适合分片解析
+    """
+    workers = max(1, workers or Config.XLSX_PARSE_WORKERS)
+    worksheet_path, shared_strings, epoch, date_formats, timedelta_formats = _sheet_metadata(file_path)
+
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_size = archive.getinfo(worksheet_path.lstrip('/')).file_size
+        if not shard_bytes:
+            shard_bytes = max(MIN_SHARD_BYTES, -(-sheet_size // (workers * SHARDS_PER_WORKER)))
+        with archive.open(worksheet_path.lstrip('/')) as source:
+            shards = iter_shards(source, shard_bytes)
+            prefix = next(shards)
+            init_args = (prefix, shared_strings, epoch, date_formats, timedelta_formats)
+
+            results = []
+            rows_parsed = 0
+            if workers == 1:
+                _init_worker(*init_args)
+                try:
+                    for shard in shards:
+                        results.append(_parse_shard(shard))
+                        rows_parsed += len(results[-1])
+                        if on_progress:
+                            on_progress(rows_parsed)
+                finally:
+                    _worker_state.clear()
+            else:
+                with process_pool.new_process_pool(workers, initializer=_init_worker, initargs=init_args) as executor:
+                    futures = []
+                    pending = set()
+                    for shard in shards:
+                        # 限制排队中的分片数，解析跟不上解压时不把整个工作表XML读进内存
+                        while len(pending) >= workers * 2:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                rows_parsed += len(future.result())
+                                if on_progress:
+                                    on_progress(rows_parsed)
+                        future = executor.submit(_parse_shard, shard)
+                        futures.append(future)
+                        pending.add(future)
+                    for future in futures:
+                        results.append(future.result())
+                        if future in pending:
+                            rows_parsed += len(results[-1])
+                            if on_progress:
+                                on_progress(rows_parsed)
+
+    return _to_dataframe(_assemble(results))
+
+
+def read_excel(file_path: str, on_progress: Optional[Callable[[int], None]] = None) -> pd.DataFrame:
+    """
+    读取Excel文件的第一个工作表（结果与 pd.read_excel(file_path) 相同）
+
+    XLSX_READER=sharded、解析进程数大于1且工作表XML不小于 XLSX_SHARD_MIN_MB 时分片并行解析，否则使用 pd.read_excel
+    """
+    workers = Config.XLSX_PARSE_WORKERS
+    if Config.XLSX_READER == 'sharded' and workers > 1 and os.path.splitext(file_path)[1].lower() == '.xlsx' \
+            and _worksheet_bytes(file_path) >= Config.XLSX_SHARD_MIN_MB * 1024 * 1024:
+        try:
+            print(f"   使用 {workers} 个进程分片解析工作表...")
+            return read_sheet_sharded(file_path, workers=workers, on_progress=on_progress)
+        except UnsupportedLayout as e:
+            print(f"   ⚠️  {e}，改用 read_excel 解析")
+    return pd.read_excel(file_path)
+
+
+def _worksheet_bytes(file_path: str) -> int:
+    """工作表XML解压后的最大大小（只读取压缩包目录），不是xlsx时返回0"""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            return max((info.file_size for info in archive.infolist()
+                        if info.filename.startswith('xl/worksheets/') and info.filename.endswith('.xml')), default=0)
+    except zipfile.BadZipFile:
+        return 0